@@ -5,18 +5,29 @@ from dotenv import load_dotenv
 import warnings
 import sys
 import uuid
+from functools import partial
 
 sys.path.append("src")
 from chatbot_agents import create_agent
-from text_normalizer import TextNormalizer
+from memory_budget import load_memory_budget
+from execution_backend import PooledAgent, create_process_pool_backend, execution_mode
+from session_manager import SessionManager
+from startup_profile import start_warm_up
 
 warnings.filterwarnings("ignore")
 
 load_dotenv()
 
+# Mensagens exibidas por vez no chat e respostas cujo debug fica guardado
+CHAT_WINDOW = int(os.getenv("AGENT_CHAT_WINDOW", "20"))
+DEBUG_HISTORY = int(os.getenv("AGENT_DEBUG_HISTORY", "20"))
+
 # Page configuration
 st.set_page_config(page_title="Agente IA Target v0.2", page_icon="🤖", layout="wide")
 
+# Importar agno/DuckDB/pandas em segundo plano enquanto a interface é renderizada
+start_warm_up()
+
 
 def format_sql_query(query):
     """
@@ -83,15 +94,43 @@ def format_sql_query(query):
     return "\n".join(formatted_lines)
 
 
-@st.cache_data
-def load_parquet_data():
-    """Carrega arquivo Parquet com tratamento robusto de codificação"""
-    data_path = "data/raw/DadosComercial_resumido.parquet"
+@st.cache_data(max_entries=1)
+def load_parquet_data(dataset_fingerprint: str = ""):
+    """Carrega arquivo Parquet com tratamento robusto de codificação
+
+    Lê o arquivo principal e os arquivos incrementais, como o agente. O fingerprint
+    do dataset faz parte da chave do cache: quando o agente ingere dados novos, a
+    próxima execução recarrega os dados em vez de usar a cópia antiga, que sai do
+    cache (apenas a versão atual fica em memória).
+    """
+    from dataset_catalog import load_catalog
+    from dataset_refresh import IncrementalIngestor
+
+    source = load_catalog().default_source
+    data_path = source.path
+    data_paths = [
+        path
+        for path in IncrementalIngestor.from_env(
+            data_path, incremental_glob=source.incremental_glob
+        ).source_paths()
+        if os.path.exists(path)
+    ]
+
+    # No modo de memória limitada apenas o schema é carregado (DataFrame vazio)
+    if load_memory_budget().bounded:
+        try:
+            import pyarrow.parquet as pq
+
+            return pq.read_schema(data_path).empty_table().to_pandas(), None
+        except Exception as e:
+            return None, f"Erro ao carregar dados: {str(e)}"
 
     # Method 1: Try direct pandas loading
     try:
         with st.spinner("🔄 Carregando dados..."):
-            df = pd.read_parquet(data_path)
+            df = pd.concat(
+                [pd.read_parquet(path) for path in data_paths], ignore_index=True
+            )
 
             # Process string columns for encoding issues
             string_cols = df.select_dtypes(include=["object"]).columns
@@ -133,19 +172,235 @@ def load_parquet_data():
 
 
 @st.cache_resource
-def initialize_agent():
-    """Inicializa o agente DuckDB configurado com memória temporária baseada em sessão"""
+def initialize_session_manager():
+    """Gerenciador das sessões do modo "inline": um agente por sessão, com TTL e limite LRU"""
+    # Só o agente fica na sessão: o DataFrame bruto devolvido por create_agent não é
+    # usado e não entraria na memória estimada da sessão
+    return SessionManager.from_env(
+        lambda session_id: create_agent(session_user_id=session_id)[0]
+    )
+
+
+@st.cache_resource
+def initialize_process_pool():
+    """Inicia o pool de processos worker (modo de execução "pooled")"""
+    return create_process_pool_backend()
+
+
+# Sessões obtidas nesta execução do script (liberadas ao final, ver __main__)
+acquired_sessions = []
+
+
+def get_agent():
+    """Retorna o agente da sessão conforme o modo de execução configurado"""
     try:
         # Gerar um ID único para a sessão do Streamlit se não existir
         if "session_user_id" not in st.session_state:
             st.session_state.session_user_id = str(uuid.uuid4())
-
-        agent, df_agent = create_agent(session_user_id=st.session_state.session_user_id)
-        return agent, df_agent, None
+        if execution_mode() != "pooled":
+            # A sessão fica marcada em uso (não é despejada) até o fim desta execução
+            session = initialize_session_manager().get(st.session_state.session_user_id)
+            acquired_sessions.append(session)
+            return session.agent, None, None
+
+        # No modo "pooled" cada sessão fala com o seu worker (afinidade por sessão)
+        if "pooled_agent" not in st.session_state:
+            st.session_state.pooled_agent = PooledAgent(
+                initialize_process_pool(), st.session_state.session_user_id
+            )
+        return st.session_state.pooled_agent, None, None
     except Exception as e:
         return None, None, str(e)
 
 
+def session_metrics():
+    """Métricas das sessões vivas (uma entrada por worker no modo "pooled")"""
+    if execution_mode() == "pooled":
+        return initialize_process_pool().session_metrics()
+    return [initialize_session_manager().metrics()]
+
+
+def _read_export(path):
+    """Lê um arquivo exportado (chamado apenas quando o usuário clica em baixar)"""
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def render_exports(exports, message_index):
+    """Exibe os botões de download dos arquivos exportados em uma resposta"""
+    for export in exports or []:
+        if not os.path.exists(export["path"]):
+            st.caption(f"📎 {export['file_name']} (arquivo não está mais disponível)")
+            continue
+        st.download_button(
+            f"📥 Baixar {export['file_name']} ({export['rows']:,} linhas)",
+            data=partial(_read_export, export["path"]),
+            file_name=export["file_name"],
+            mime=(
+                "text/csv" if export["format"] == "csv" else "application/octet-stream"
+            ),
+            key=f"export-{message_index}-{export['file_name']}",
+        )
+
+
+def build_debug_markdown(debug_info, sessions):
+    """Monta o bloco de debug de uma resposta (chamado só quando o usuário o expande)"""
+    debug_content = "\n\n---\n\n## **INFORMAÇÕES DE DEBUG**\n\n"
+
+    # Original vs Processed Query
+    if debug_info.get("processed_query") != debug_info.get("original_query"):
+        debug_content += (
+            f"**📝 Query Original:** `{debug_info.get('original_query', 'N/A')}`\n\n"
+        )
+        debug_content += (
+            f"**🔄 Query Processada:** `{debug_info.get('processed_query', 'N/A')}`\n\n"
+        )
+
+    # SQL Queries executed
+    if debug_info.get("sql_queries"):
+        debug_content += "**💾 Queries SQL Executadas:**\n"
+        for i, query in enumerate(debug_info["sql_queries"], 1):
+            # Format SQL query for better readability
+            formatted_query = format_sql_query(query)
+            debug_content += f"```sql\n{formatted_query}\n```\n"
+
+            # Plan summary from DuckDB profiling
+            profile = debug_info.get("query_profiles", {}).get(query)
+            if profile:
+                debug_content += f"*📈 Plano:* `{profile['summary']}`\n\n"
+
+            # Query shape (same query with other literals) and prepared statement reuse
+            shape = debug_info.get("query_shapes", {}).get(query)
+            if shape:
+                debug_content += (
+                    f"*🧩 Formato:* `{shape['shape_id']}` "
+                    f"({shape['params']} parâmetros"
+                    + (", prepared statement reutilizado" if shape["prepared"] else "")
+                    + ")\n\n"
+                )
+
+    # SQL guard rejections and rewrites
+    if debug_info.get("sql_guard"):
+        debug_content += "**🛡️ Guard SQL:**\n"
+        for event in debug_info["sql_guard"]:
+            debug_content += f"- `{event['detail']}`\n"
+        debug_content += "\n"
+
+    # Complexity route (light or full agent configuration)
+    route = debug_info.get("route")
+    if route:
+        debug_content += f"**🧭 Rota:** `{route['route']}`"
+        if route.get("reasons"):
+            debug_content += f" ({', '.join(route['reasons'])})"
+        debug_content += "\n\n"
+
+    # Conversation context compaction (tokens before and after)
+    context_tokens = debug_info.get("context_tokens")
+    if context_tokens:
+        debug_content += (
+            f"**🧠 Contexto da conversa:** {context_tokens['tokens_before']} → "
+            f"{context_tokens['tokens_after']} tokens (turnos completos: "
+            f"{context_tokens['turns_included']}/{context_tokens['turns_total']})\n\n"
+        )
+
+    # LLM calls (retries, hedged requests, circuit breaker)
+    llm_stats = debug_info.get("llm")
+    if llm_stats:
+        debug_content += "**🤖 Chamadas ao Modelo:** " + ", ".join(
+            f"{name}: {value}" for name, value in llm_stats.items()
+        )
+        debug_content += "\n\n"
+
+    # Session lifecycle (live sessions, evictions, memory cost)
+    evictions = {}
+    for worker in sessions:
+        for reason, count in worker["evictions"].items():
+            evictions[reason] = evictions.get(reason, 0) + count
+    debug_content += (
+        f"**🗂️ Sessões:** vivas: {sum(w['live_sessions'] for w in sessions)}, "
+        f"memória: {sum(w['total_memory_bytes'] for w in sessions) / 1024**2:.1f} MB, "
+        + ", ".join(
+            f"despejos {reason}: {count}" for reason, count in evictions.items()
+        )
+        + "\n\n"
+    )
+
+    # Tool calls
+    if debug_info.get("tool_calls"):
+        debug_content += "**🔧 Ferramentas Utilizadas:**\n"
+        for tool_call in debug_info["tool_calls"]:
+            debug_content += f"- **{tool_call.get('tool', 'Unknown')}**\n"
+            debug_content += f"  - *Args:* `{tool_call.get('args', 'N/A')}`\n"
+            if tool_call.get("result"):
+                debug_content += (
+                    f"  - *Resultado:* `{tool_call.get('result', 'N/A')}`\n"
+                )
+            debug_content += "\n"
+
+    return debug_content
+
+
+def build_profile_markdown(request_profile):
+    """Monta o bloco de profiling de uma resposta"""
+    profile_content = "\n\n---\n\n## **🔥 PROFILING**\n\n"
+    profile_content += f"```\n{request_profile['summary']}\n```\n"
+    if request_profile.get("path"):
+        profile_content += f"*Pilhas (collapsed):* `{request_profile['path']}`\n"
+    return profile_content
+
+
+def store_debug_payload(message_index, payload):
+    """Guarda o debug de uma resposta fora do histórico (apenas os mais recentes)"""
+    payloads = st.session_state.setdefault("debug_payloads", {})
+    payloads[message_index] = payload
+    while len(payloads) > DEBUG_HISTORY:
+        oldest = next(iter(payloads))
+        del payloads[oldest]
+        st.session_state.setdefault("debug_rendered", {}).pop(oldest, None)
+
+
+def render_debug(message_index):
+    """Exibe o debug de uma resposta apenas quando o usuário pede (markdown em cache)"""
+    payload = st.session_state.get("debug_payloads", {}).get(message_index)
+    if payload is None:
+        return
+    if not st.toggle("🔍 Debug", key=f"debug-{message_index}"):
+        return
+    rendered = st.session_state.setdefault("debug_rendered", {})
+    if message_index not in rendered:
+        content = ""
+        if payload.get("debug_info"):
+            content += build_debug_markdown(
+                payload["debug_info"], payload.get("sessions", [])
+            )
+        if payload.get("profile"):
+            content += build_profile_markdown(payload["profile"])
+        rendered[message_index] = content
+    st.markdown(rendered[message_index])
+
+
+def _show_older_messages():
+    st.session_state.chat_window += CHAT_WINDOW
+
+
+@st.fragment
+def render_chat_history():
+    """Exibe a janela de mensagens recentes (as anteriores são carregadas sob demanda)"""
+    messages = st.session_state.messages
+    window = st.session_state.setdefault("chat_window", CHAT_WINDOW)
+    first = max(0, len(messages) - window)
+    if first:
+        st.button(
+            f"⬆️ Carregar mensagens anteriores ({first})", on_click=_show_older_messages
+        )
+    for index in range(first, len(messages)):
+        message = messages[index]
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+            render_exports(message.get("exports"), index)
+            render_debug(index)
+
+
 def main():
     # Enhanced CSS for professional styling
     st.markdown(
@@ -403,8 +658,10 @@ def main():
     )
 
     # Load data and agent silently
-    df, data_error = load_parquet_data()
-    agent, df_agent, agent_error = initialize_agent()
+    agent, df_agent, agent_error = get_agent()
+    df, data_error = load_parquet_data(
+        agent.dataset_fingerprint if agent is not None else ""
+    )
 
     # Enhanced Chat interface
     if agent is not None and df is not None:
@@ -412,17 +669,24 @@ def main():
         chat_col1, chat_col2, chat_col3 = st.columns([1, 3, 1])
 
         with chat_col2:
-            # Debug mode toggle
-            debug_col1, debug_col2 = st.columns([3, 1])
+            # Debug and profiling toggles
+            debug_col1, debug_col2, debug_col3 = st.columns([2, 1, 1])
             with debug_col2:
                 debug_mode = st.toggle(
                     "Debug",
                     value=False,
                     help="Ativar modo debug para exibir queries SQL e raciocínio do agente",
                 )
+            with debug_col3:
+                profile_mode = st.toggle(
+                    "Profiler",
+                    value=False,
+                    help="Amostrar as pilhas Python durante a resposta e exibir as funções mais quentes",
+                )
 
-            # Store debug mode in session state
+            # Store debug and profiling modes in session state
             st.session_state.debug_mode = debug_mode
+            st.session_state.profile_mode = profile_mode
             # Initialize chat history
             if "messages" not in st.session_state:
                 st.session_state.messages = []
@@ -447,10 +711,12 @@ Como posso ajudá-lo hoje?"""
             col1, col2 = st.columns([1, 4])
             with col1:
                 if st.button("🗑️ Limpar", type="secondary"):
-                    # Clear all session state related to chat
+                    # Clear chat messages and the session's memory, run history and debug state
                     st.session_state.messages = []
-                    if "session_user_id" in st.session_state:
-                        del st.session_state.session_user_id
+                    st.session_state.debug_payloads = {}
+                    st.session_state.debug_rendered = {}
+                    st.session_state.chat_window = CHAT_WINDOW
+                    agent.clear_session()
                     # Force app rerun to refresh everything
                     st.rerun()
 
@@ -459,9 +725,7 @@ Como posso ajudá-lo hoje?"""
             # Display chat messages with improved styling
             chat_container = st.container()
             with chat_container:
-                for message in st.session_state.messages:
-                    with st.chat_message(message["role"]):
-                        st.markdown(message["content"])
+                render_chat_history()
 
             # Process user input first
             if prompt := st.chat_input(
@@ -476,53 +740,31 @@ Como posso ajudá-lo hoje?"""
                         # Get debug mode from session state
                         debug_mode = st.session_state.get("debug_mode", False)
 
-                        # Run agent with debug mode
-                        response = agent.run(prompt, debug_mode=debug_mode)
-
-                        # Prepare response content
-                        response_content = response.content
-
-                        # If debug mode is active, add debug information
-                        if (
-                            debug_mode
-                            and hasattr(agent, "debug_info")
-                            and agent.debug_info
-                        ):
-                            debug_content = "\n\n---\n\n## **INFORMAÇÕES DE DEBUG**\n\n"
-
-                            # Original vs Processed Query
-                            if agent.debug_info.get(
-                                "processed_query"
-                            ) != agent.debug_info.get("original_query"):
-                                debug_content += f"**📝 Query Original:** `{agent.debug_info.get('original_query', 'N/A')}`\n\n"
-                                debug_content += f"**🔄 Query Processada:** `{agent.debug_info.get('processed_query', 'N/A')}`\n\n"
-
-                            # SQL Queries executed
-                            if agent.debug_info.get("sql_queries"):
-                                debug_content += "**💾 Queries SQL Executadas:**\n"
-                                for i, query in enumerate(
-                                    agent.debug_info["sql_queries"], 1
-                                ):
-                                    # Format SQL query for better readability
-                                    formatted_query = format_sql_query(query)
-                                    debug_content += f"```sql\n{formatted_query}\n```\n"
-
-                            # Tool calls
-                            if agent.debug_info.get("tool_calls"):
-                                debug_content += "**🔧 Ferramentas Utilizadas:**\n"
-                                for tool_call in agent.debug_info["tool_calls"]:
-                                    debug_content += (
-                                        f"- **{tool_call.get('tool', 'Unknown')}**\n"
-                                    )
-                                    debug_content += f"  - *Args:* `{tool_call.get('args', 'N/A')}`\n"
-                                    if tool_call.get("result"):
-                                        debug_content += f"  - *Resultado:* `{tool_call.get('result', 'N/A')}`\n"
-                                    debug_content += "\n"
-
-                            response_content += debug_content
+                        profile_mode = st.session_state.get("profile_mode", False)
+
+                        # Run agent with debug mode (and per-request profiling if enabled)
+                        response = agent.run(
+                            prompt, debug_mode=debug_mode, profile=profile_mode
+                        )
+
+                        # Debug and profiling payloads are kept apart from the
+                        # chat history and rendered only when expanded
+                        debug_info = getattr(agent, "debug_info", None) or {}
+                        payload = {}
+                        if debug_mode and debug_info:
+                            payload["debug_info"] = debug_info
+                            payload["sessions"] = session_metrics()
+                        if profile_mode and debug_info.get("profile"):
+                            payload["profile"] = debug_info["profile"]
+                        if payload:
+                            store_debug_payload(len(st.session_state.messages), payload)
 
                         st.session_state.messages.append(
-                            {"role": "assistant", "content": response_content}
+                            {
+                                "role": "assistant",
+                                "content": response.content,
+                                "exports": debug_info.get("exports", []),
+                            }
                         )
                     except Exception as e:
                         error_msg = f"❌ Erro ao processar: {str(e)}"
@@ -547,10 +789,6 @@ Como posso ajudá-lo hoje?"""
     footer_col1, footer_col2, footer_col3 = st.columns([1, 2, 1])
 
     with footer_col2:
-        from PIL import Image
-        import base64
-        import io
-
         # Texto do footer
         # Fallback caso a imagem não seja encontrada
         st.markdown(
@@ -571,4 +809,9 @@ Como posso ajudá-lo hoje?"""
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        # Também em st.rerun/st.stop, que interrompem o script com exceções
+        while acquired_sessions:
+            initialize_session_manager().release(acquired_sessions.pop())
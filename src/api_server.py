@@ -0,0 +1,281 @@
+"""
+Serviço HTTP (headless) para acesso programático ao agente.
+Expõe endpoints para pergunta única e para lotes de perguntas, executados em um
+pool de agentes com limite de concorrência e resultados enviados conforme concluem.
+
+Uso:
+    python src/api_server.py
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+try:
+    from fastapi import FastAPI, HTTPException
+    from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+    from pydantic import BaseModel, Field
+except ImportError:
+    raise ImportError(
+        "`fastapi` not installed. Please install using `pip install fastapi uvicorn`"
+    )
+
+from chatbot_agents import create_agent
+from llm_resilience import CircuitOpenError, LlmDeadlineExceeded, get_resilience
+from query_shapes import get_shape_stats
+from question_router import get_route_metrics
+from result_export import ResultExporter
+
+
+class QuestionRequest(BaseModel):
+    question: str
+    debug: bool = False
+
+
+class BatchRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1)
+    debug: bool = False
+
+
+class AgentPool:
+    """Pool de agentes reutilizáveis com limite de concorrência."""
+
+    def __init__(self, size: int = 2, max_batch_size: int = 50):
+        """
+        Inicializa o pool (os agentes são criados em `warm_up`).
+
+        Args:
+            size: Número de agentes (e de perguntas executadas em paralelo)
+            max_batch_size: Número máximo de perguntas por lote
+        """
+        self.size = size
+        self.max_batch_size = max_batch_size
+        self.executor = ThreadPoolExecutor(
+            max_workers=size, thread_name_prefix="agent-worker"
+        )
+        self.agents: Optional[asyncio.Queue] = None
+        self.ready_agents = 0
+        self.dataset_loaded = False
+        self.duckdb_warm = False
+        self.warm_up_error: Optional[str] = None
+
+    @classmethod
+    def from_env(cls) -> "AgentPool":
+        """
+        Cria o pool a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_API_WORKERS: número de agentes no pool
+            AGENT_API_MAX_BATCH: número máximo de perguntas por lote
+
+        Returns:
+            Instância de AgentPool
+        """
+        return cls(
+            size=int(os.getenv("AGENT_API_WORKERS", "2")),
+            max_batch_size=int(os.getenv("AGENT_API_MAX_BATCH", "50")),
+        )
+
+    @property
+    def ready(self) -> bool:
+        """Indica se todos os agentes foram criados e o DuckDB está aquecido."""
+        return self.ready_agents == self.size and self.duckdb_warm
+
+    def readiness(self) -> Dict[str, Any]:
+        """Estado de prontidão do serviço."""
+        return {
+            "ready": self.ready,
+            "dataset_loaded": self.dataset_loaded,
+            "duckdb_warm": self.duckdb_warm,
+            "agents_ready": self.ready_agents,
+            "agents_total": self.size,
+            "error": self.warm_up_error,
+        }
+
+    async def warm_up(self):
+        """Cria os agentes em segundo plano, carregando o dataset e aquecendo o DuckDB."""
+        loop = asyncio.get_running_loop()
+        self.agents = asyncio.Queue()
+        try:
+            for i in range(self.size):
+                agent = await loop.run_in_executor(
+                    self.executor, self._create_warm_agent, f"api-worker-{i}"
+                )
+                self.dataset_loaded = True
+                self.ready_agents += 1
+                await self.agents.put(agent)
+            self.duckdb_warm = True
+        except Exception as e:
+            self.warm_up_error = str(e)
+
+    def _create_warm_agent(self, session_user_id: str):
+        """Cria um agente e executa uma consulta leve para aquecer o DuckDB."""
+        agent, _ = create_agent(session_user_id=session_user_id)
+        agent.duckdb_tools.connection.execute(
+            f"SELECT COUNT(*) FROM {agent.catalog.default}"
+        ).fetchall()
+        return agent
+
+    def close(self):
+        """Encerra o pool liberando os recursos dos agentes (memória e conexões DuckDB)."""
+        self.executor.shutdown(wait=False)
+        while self.agents is not None and not self.agents.empty():
+            self.agents.get_nowait().close()
+
+    async def ask(self, question: str, debug: bool = False) -> Dict[str, Any]:
+        """
+        Executa uma pergunta no primeiro agente livre do pool.
+
+        Args:
+            question: Pergunta em linguagem natural
+            debug: Inclui as informações de debug na resposta
+
+        Returns:
+            Dicionário com a resposta, o tempo de execução e o debug opcional
+        """
+        loop = asyncio.get_running_loop()
+        agent = await self.agents.get()
+        start_time = time.perf_counter()
+
+        def run_isolated():
+            # Os agentes atendem qualquer chamador: memória, resumo da conversa e
+            # debug do pedido anterior não podem vazar para o próximo
+            agent.clear_session()
+            return agent.run(question, debug_mode=debug)
+
+        try:
+            response = await loop.run_in_executor(self.executor, run_isolated)
+            result = {
+                "question": question,
+                "answer": response.content,
+                "elapsed_ms": round((time.perf_counter() - start_time) * 1000, 1),
+                "exports": [
+                    f"/exports/{export['file_name']}"
+                    for export in agent.debug_info.get("exports", [])
+                ],
+            }
+            if debug:
+                result["debug_info"] = agent.debug_info
+            return result
+        finally:
+            await self.agents.put(agent)
+
+    async def ask_batch(self, questions: List[str], debug: bool = False):
+        """
+        Executa um lote de perguntas em paralelo, produzindo cada resultado ao concluir.
+
+        Args:
+            questions: Lista de perguntas
+            debug: Inclui as informações de debug nas respostas
+
+        Yields:
+            Linhas NDJSON com índice, pergunta e resposta (ou erro)
+        """
+
+        async def run_indexed(index: int, question: str) -> Dict[str, Any]:
+            try:
+                result = await self.ask(question, debug=debug)
+            except Exception as e:
+                result = {"question": question, "error": str(e)}
+            result["index"] = index
+            return result
+
+        tasks = [
+            asyncio.create_task(run_indexed(i, question))
+            for i, question in enumerate(questions)
+        ]
+        for task in asyncio.as_completed(tasks):
+            result = await task
+            yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+
+
+def create_app(pool: Optional[AgentPool] = None) -> FastAPI:
+    """
+    Cria a aplicação FastAPI com os endpoints do agente.
+
+    Args:
+        pool: Pool de agentes (opcional, criado a partir do ambiente)
+
+    Returns:
+        Aplicação FastAPI
+    """
+    pool = pool or AgentPool.from_env()
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # O aquecimento roda em segundo plano; /ready informa quando terminar
+        app.state.warm_up_task = asyncio.create_task(pool.warm_up())
+        yield
+        app.state.warm_up_task.cancel()
+        pool.close()
+
+    app = FastAPI(title="Agente IA Target API", lifespan=lifespan)
+    app.state.pool = pool
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.get("/ready")
+    async def ready():
+        status = pool.readiness()
+        return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
+    @app.post("/ask")
+    async def ask(request: QuestionRequest):
+        if not pool.ready:
+            raise HTTPException(status_code=503, detail=pool.readiness())
+        try:
+            return await pool.ask(request.question, debug=request.debug)
+        except (CircuitOpenError, LlmDeadlineExceeded) as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    @app.get("/exports/{file_name}")
+    async def download_export(file_name: str):
+        path = ResultExporter.from_env().resolve(file_name)
+        if path is None:
+            raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+        return FileResponse(path, filename=file_name)
+
+    @app.get("/metrics")
+    async def metrics():
+        return {
+            "llm": get_resilience().snapshot(),
+            "routes": get_route_metrics().snapshot(),
+            "query_shapes": get_shape_stats().snapshot(),
+        }
+
+    @app.post("/batch")
+    async def batch(request: BatchRequest):
+        if not pool.ready:
+            raise HTTPException(status_code=503, detail=pool.readiness())
+        if len(request.questions) > pool.max_batch_size:
+            raise HTTPException(
+                status_code=413,
+                detail=f"Lote com {len(request.questions)} perguntas; máximo {pool.max_batch_size}.",
+            )
+        return StreamingResponse(
+            pool.ask_batch(request.questions, debug=request.debug),
+            media_type="application/x-ndjson",
+        )
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    host = os.getenv("AGENT_API_HOST", "0.0.0.0")
+    port = (
+        int(sys.argv[1])
+        if len(sys.argv) > 1
+        else int(os.getenv("AGENT_API_PORT", "8000"))
+    )
+    uvicorn.run(create_app(), host=host, port=port)
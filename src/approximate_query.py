@@ -0,0 +1,287 @@
+"""
+Módulo de consultas aproximadas para perguntas exploratórias.
+Mantém uma amostra estratificada do dataset (por UF e mês) e calcula estimativas
+de somas, contagens e médias com intervalo de confiança de 95%, além de contagens
+distintas (HyperLogLog) e quantis (t-digest) aproximados com seus limites de erro.
+"""
+
+import math
+import os
+from typing import Any, List, Optional
+
+# Valor crítico da normal para intervalos de 95%
+Z_95 = 1.96
+
+# Erro padrão relativo do HyperLogLog do DuckDB (64 registradores): 1.04 / sqrt(64)
+HLL_RELATIVE_ERROR_95 = Z_95 * 1.04 / math.sqrt(64)
+
+# Distância de posição (em quantil) usada como limite de erro dos quantis aproximados
+QUANTILE_RANK_ERROR = 0.01
+
+AGGREGATES = ("sum", "count", "avg", "count_distinct", "quantile")
+
+
+class StratifiedSample:
+    """Amostra estratificada do dataset com estimadores e limites de erro."""
+
+    def __init__(
+        self,
+        table_name: str = "dados_comerciais",
+        sample_table: str = "dados_comerciais_amostra",
+        strata: Optional[List[str]] = None,
+        fraction: float = 0.02,
+        min_per_stratum: int = 30,
+        seed: float = 0.42,
+    ):
+        """
+        Inicializa a amostra (criada em `build`).
+
+        Args:
+            table_name: Tabela (ou view) com o dataset completo
+            sample_table: Tabela onde a amostra é materializada
+            strata: Expressões SQL que definem os estratos (padrão: UF e mês)
+            fraction: Fração de linhas amostradas em cada estrato
+            min_per_stratum: Mínimo de linhas por estrato (estratos menores são copiados inteiros)
+            seed: Semente do gerador aleatório do DuckDB
+        """
+        self.table_name = table_name
+        self.sample_table = sample_table
+        self.strata = strata or [
+            "UF_Cliente",
+            "date_trunc('month', Data_Emissao)",
+        ]
+        self.fraction = fraction
+        self.min_per_stratum = min_per_stratum
+        self.seed = seed
+        self.fingerprint: Optional[str] = None
+        self.population_rows = 0
+        self.sample_rows = 0
+        self.n_strata = 0
+
+    @classmethod
+    def from_env(
+        cls, table_name: str = "dados_comerciais"
+    ) -> Optional["StratifiedSample"]:
+        """
+        Cria a amostra a partir das variáveis de ambiente.
+
+        Args:
+            table_name: Tabela (ou view) com o dataset completo
+
+        Variáveis suportadas:
+            AGENT_APPROX_QUERIES: "0"/"false" desativa o modo aproximado
+            AGENT_APPROX_SAMPLE_FRACTION: fração amostrada em cada estrato
+            AGENT_APPROX_MIN_PER_STRATUM: mínimo de linhas por estrato
+
+        Returns:
+            Instância de StratifiedSample ou None se o modo estiver desativado
+        """
+        if os.getenv("AGENT_APPROX_QUERIES", "1").strip().lower() in (
+            "0",
+            "false",
+            "no",
+        ):
+            return None
+        return cls(
+            table_name=table_name,
+            sample_table=f"{table_name}_amostra",
+            fraction=float(os.getenv("AGENT_APPROX_SAMPLE_FRACTION", "0.02")),
+            min_per_stratum=int(os.getenv("AGENT_APPROX_MIN_PER_STRATUM", "30")),
+        )
+
+    def build(self, connection, fingerprint: Optional[str] = None):
+        """
+        Materializa a amostra estratificada com os tamanhos do estrato (N_h) e da amostra (n_h).
+
+        Args:
+            connection: Conexão do DuckDB
+            fingerprint: Fingerprint do dataset no momento da amostragem
+        """
+        strata = ", ".join(self.strata)
+        connection.execute(f"SELECT setseed({self.seed})")
+        connection.execute(f"""
+            CREATE OR REPLACE TABLE {self.sample_table} AS
+            WITH ordenado AS (
+                SELECT
+                    *,
+                    hash({strata}) AS _estrato,
+                    COUNT(*) OVER (PARTITION BY {strata}) AS _estrato_n,
+                    ROW_NUMBER() OVER (PARTITION BY {strata} ORDER BY random()) AS _ordem
+                FROM {self.table_name}
+            )
+            SELECT
+                * EXCLUDE (_ordem),
+                LEAST(_estrato_n, GREATEST({self.min_per_stratum}, CEIL(_estrato_n * {self.fraction})))::BIGINT AS _amostra_n
+            FROM ordenado
+            WHERE _ordem <= GREATEST({self.min_per_stratum}, CEIL(_estrato_n * {self.fraction}))
+            """)
+        self.attach(connection, fingerprint)
+
+    def attach(self, connection, fingerprint: Optional[str] = None):
+        """
+        Usa uma amostra já materializada (ex: banco compartilhado somente leitura).
+
+        Args:
+            connection: Conexão do DuckDB onde a amostra existe
+            fingerprint: Fingerprint do dataset no momento da amostragem
+        """
+        self.population_rows, self.sample_rows, self.n_strata = connection.execute(f"""
+            SELECT SUM(_estrato_n), SUM(_amostra_n), COUNT(*)
+            FROM (SELECT ANY_VALUE(_estrato_n) AS _estrato_n, ANY_VALUE(_amostra_n) AS _amostra_n
+                  FROM {self.sample_table} GROUP BY _estrato)
+            """).fetchone()
+        self.fingerprint = fingerprint
+
+    def is_stale(self, fingerprint: Optional[str]) -> bool:
+        """Indica se a amostra precisa ser refeita (ainda não criada ou dataset alterado)."""
+        return self.fingerprint is None or self.fingerprint != fingerprint
+
+    def estimate_sql(
+        self,
+        aggregate: str,
+        column: Optional[str] = None,
+        group_by: Optional[str] = None,
+        where: Optional[str] = None,
+        quantile: float = 0.5,
+    ) -> str:
+        """
+        Monta a consulta que calcula a estimativa e o intervalo de confiança.
+
+        Args:
+            aggregate: sum, count, avg, count_distinct ou quantile
+            column: Coluna (ou expressão) agregada
+            group_by: Expressão de agrupamento (opcional)
+            where: Filtro SQL (opcional)
+            quantile: Quantil desejado quando aggregate = quantile
+
+        Returns:
+            Consulta SQL com as colunas grupo, estimativa, limite_inferior e limite_superior
+        """
+        group = group_by or "'total'"
+        condition = where or "TRUE"
+
+        if aggregate == "count_distinct":
+            # HyperLogLog sobre o dataset completo: uma passada sem tabela hash
+            return f"""
+            SELECT {group} AS grupo,
+                   approx_count_distinct({column}) AS estimativa,
+                   estimativa * (1 - {HLL_RELATIVE_ERROR_95}) AS limite_inferior,
+                   estimativa * (1 + {HLL_RELATIVE_ERROR_95}) AS limite_superior
+            FROM {self.table_name} WHERE {condition}
+            GROUP BY ALL ORDER BY estimativa DESC"""
+
+        if aggregate == "quantile":
+            # t-digest sobre o dataset completo; o intervalo cobre ±1 ponto percentual de posição
+            low = max(quantile - QUANTILE_RANK_ERROR, 0.0)
+            high = min(quantile + QUANTILE_RANK_ERROR, 1.0)
+            return f"""
+            SELECT grupo, q[2] AS estimativa, q[1] AS limite_inferior, q[3] AS limite_superior
+            FROM (
+                SELECT {group} AS grupo,
+                       approx_quantile({column}, [{low}, {quantile}, {high}]) AS q
+                FROM {self.table_name} WHERE {condition}
+                GROUP BY ALL
+            ) ORDER BY estimativa DESC"""
+
+        value = "1" if aggregate == "count" else f"COALESCE(({column})::DOUBLE, 0)"
+        totals = f"""
+            estratos AS (
+                SELECT _estrato, ANY_VALUE(_estrato_n)::DOUBLE AS pop_n, COUNT(*)::DOUBLE AS amostra_n
+                FROM {self.sample_table} GROUP BY _estrato
+            ),
+            dominio AS (
+                SELECT _estrato, {group} AS grupo,
+                       SUM({value}) AS sy, SUM({value} * {value}) AS sy2,
+                       COUNT(*)::DOUBLE AS sx
+                FROM {self.sample_table} WHERE {condition}
+                GROUP BY ALL
+            )"""
+
+        if aggregate in ("sum", "count"):
+            # Estimador estratificado do total e sua variância (com correção de população finita)
+            return f"""
+            WITH {totals}
+            SELECT grupo, estimativa,
+                   estimativa - {Z_95} * sqrt(variancia) AS limite_inferior,
+                   estimativa + {Z_95} * sqrt(variancia) AS limite_superior
+            FROM (
+                SELECT grupo,
+                       SUM(pop_n * sy / amostra_n) AS estimativa,
+                       SUM(pop_n * pop_n * (1 - amostra_n / pop_n) * greatest(sy2 - sy * sy / amostra_n, 0) / greatest(amostra_n - 1, 1) / amostra_n) AS variancia
+                FROM dominio JOIN estratos USING (_estrato)
+                GROUP BY grupo
+            ) ORDER BY estimativa DESC"""
+
+        # Média do domínio: razão entre o total de valores e o total de linhas,
+        # com variância pela linearização (resíduos y - R·x dentro de cada estrato)
+        return f"""
+        WITH {totals},
+        razao AS (
+            SELECT grupo, SUM(pop_n * sy / amostra_n) / SUM(pop_n * sx / amostra_n) AS R, SUM(pop_n * sx / amostra_n) AS X
+            FROM dominio JOIN estratos USING (_estrato)
+            GROUP BY grupo
+        ),
+        residuos AS (
+            SELECT d._estrato, d.grupo,
+                   SUM({value} - r.R) AS sz,
+                   SUM(({value} - r.R) * ({value} - r.R)) AS sz2
+            FROM (SELECT *, {group} AS grupo FROM {self.sample_table} WHERE {condition}) AS d
+            JOIN razao AS r ON d.grupo IS NOT DISTINCT FROM r.grupo
+            GROUP BY ALL
+        )
+        SELECT grupo, estimativa,
+               estimativa - {Z_95} * sqrt(variancia) AS limite_inferior,
+               estimativa + {Z_95} * sqrt(variancia) AS limite_superior
+        FROM (
+            SELECT r.grupo, r.R AS estimativa,
+                   SUM(pop_n * pop_n * (1 - amostra_n / pop_n) * greatest(sz2 - sz * sz / amostra_n, 0) / greatest(amostra_n - 1, 1) / amostra_n) / (r.X * r.X) AS variancia
+            FROM residuos AS z
+            JOIN estratos USING (_estrato)
+            JOIN razao AS r ON z.grupo IS NOT DISTINCT FROM r.grupo
+            GROUP BY r.grupo, r.R, r.X
+        ) ORDER BY estimativa DESC"""
+
+    def describe(self, aggregate: str) -> str:
+        """Nota sobre o método usado, anexada ao resultado para o modelo."""
+        if aggregate == "count_distinct":
+            return (
+                "Contagem distinta aproximada (HyperLogLog) sobre todas as linhas; "
+                f"limites de ±{HLL_RELATIVE_ERROR_95:.0%} (95%)."
+            )
+        if aggregate == "quantile":
+            return (
+                "Quantil aproximado (t-digest) sobre todas as linhas; limites "
+                f"correspondem a ±{QUANTILE_RANK_ERROR:.0%} de posição."
+            )
+        return (
+            f"Estimativa por amostra estratificada (UF × mês): {self.sample_rows:,} de "
+            f"{self.population_rows:,} linhas em {self.n_strata:,} estratos; "
+            "intervalo de confiança de 95%."
+        )
+
+
+def format_estimates(rows: List[Any], max_rows: int = 50) -> str:
+    """
+    Formata as estimativas em CSV com o erro relativo de cada linha.
+
+    Args:
+        rows: Linhas (grupo, estimativa, limite_inferior, limite_superior)
+        max_rows: Número máximo de grupos exibidos
+
+    Returns:
+        Texto CSV no mesmo formato das demais ferramentas SQL
+    """
+    lines = ["grupo,estimativa,limite_inferior,limite_superior,erro_relativo_pct"]
+    for group, estimate, lower, upper in rows[:max_rows]:
+        relative = (
+            (upper - lower) / 2 / abs(estimate) * 100
+            if estimate not in (None, 0) and upper is not None and lower is not None
+            else None
+        )
+        values: List[Any] = [group]
+        for number in (estimate, lower, upper, relative):
+            values.append("" if number is None else f"{number:.2f}")
+        lines.append(",".join(str(v) for v in values))
+    if len(rows) > max_rows:
+        lines.append(f"... {len(rows) - max_rows} grupos omitidos")
+    return "\n".join(lines)
@@ -1,18 +1,12 @@
-from agno.agent import Agent
-from agno.models.openai import OpenAIChat
-from agno.tools.reasoning import ReasoningTools
-from agno.tools.duckdb import DuckDbTools
-from agno.knowledge import AgentKnowledge
-from agno.memory.v2.memory import Memory
-from agno.memory.v2.db.sqlite import SqliteMemoryDb
-from agno.tools.calculator import CalculatorTools
-from agno.tools.python import PythonTools
-
+import copy
 import os
-import pandas as pd
-import tempfile
+import time
+from typing import List, Optional
 from dotenv import load_dotenv
-from text_normalizer import TextNormalizer, load_alias_mapping
+
+# Os módulos pesados (agno, OpenAI, DuckDB, pandas e ferramentas) são importados
+# dentro de create_agent: importar este módulo é barato e não atrasa a interface.
+# Veja startup_profile.py para o aquecimento em segundo plano e o relatório de imports.
 
 load_dotenv()
 selected_model = "gpt-5-nano-2025-08-07"
@@ -20,18 +14,84 @@ selected_model = "gpt-5-nano-2025-08-07"
 
 def create_agent(session_user_id=None, debug_mode=False):
     """Cria e configura o agente DuckDB com acesso aos dados comerciais e memória temporária"""
+    from agno.agent import Agent
+    from agno.tools.reasoning import ReasoningTools
+    from agno.tools import Toolkit
+    from agno.tools.duckdb import DuckDbTools
+    from agno.knowledge import AgentKnowledge
+    from agno.memory.v2.memory import Memory
+    from agno.memory.v2.db.sqlite import SqliteMemoryDb
+
+    from concurrent.futures import ThreadPoolExecutor
+    import duckdb
+    import pandas as pd
+    from text_normalizer import TextNormalizer, load_alias_mapping
+    from dataset_profile import DatasetProfile
+    from dataset_catalog import CatalogSession, load_catalog
+    from dataset_refresh import IncrementalIngestor
+    from memory_budget import load_memory_budget, stream_query_result
+    from sql_guard import WRITE_TOOLS, SqlGuard, guard_error
+    from query_profiler import QueryProfiler, get_query_activity
+    from query_shapes import PreparedStatementCache, get_shape_stats, normalize_query
+    from expression_tools import ExpressionTools
+    from approximate_query import AGGREGATES, StratifiedSample, format_estimates
+    from execution_backend import SharedDatabase
+    from llm_resilience import create_model, get_resilience
+    from request_profiler import SamplingProfiler, profiled
+    from query_rewriter import load_query_rewriter
+    from result_export import EXPORT_FORMATS, ResultExporter
+    from session_manager import memory_db_path
+    from context_compactor import ContextCompactor
+    from question_router import (
+        FULL,
+        LIGHT,
+        QuestionRouter,
+        RouteDecision,
+        get_route_metrics,
+    )
+
     os.environ["OPENAI_API_KEY"] = os.getenv("OPENAI_API_KEY")
 
-    # Carregar dados do parquet
-    data_path = "data/raw/DadosComercial_resumido.parquet"
-    df = pd.read_parquet(data_path)
+    # Carregar orçamento de memória (modo "standard" ou "bounded")
+    memory_budget = load_memory_budget()
+    duckdb_config = memory_budget.duckdb_config()
 
-    # Aplicar normalização de texto aos dados
+    # Fonte principal declarada no catálogo de datasets (as demais são registradas sob demanda)
+    catalog = load_catalog()
+    source = catalog.default_source
+    data_path = source.path
     normalizer = TextNormalizer()
-    text_columns = normalizer.identify_text_columns(df)
 
-    # Criar versão normalizada do DataFrame para buscas
-    df_normalized = normalizer.normalize_dataframe(df, text_columns)
+    # Worker do pool de processos: banco DuckDB e caches preparados pelo processo principal
+    shared_database = SharedDatabase.attached()
+
+    if shared_database is not None:
+        df = None
+        profile = shared_database.load_profile()
+        df_normalized = shared_database.load_normalized()
+        text_columns = profile.text_columns
+    elif memory_budget.bounded:
+        # Modo de memória limitada: nenhuma cópia pandas do dataset é mantida,
+        # o perfil é calculado pelo próprio DuckDB a partir do parquet
+        df = None
+        df_normalized = None
+        profile_connection = duckdb.connect(config=duckdb_config)
+        try:
+            # Cópia do perfil em cache no catálogo: o refresh incremental altera o perfil do agente
+            profile = copy.deepcopy(catalog.profile(source.name, profile_connection))
+        finally:
+            profile_connection.close()
+        text_columns = profile.text_columns
+    else:
+        # Carregar dados do parquet
+        df = pd.read_parquet(data_path)
+
+        # Aplicar normalização de texto aos dados
+        text_columns = normalizer.identify_text_columns(df)
+
+        # Criar versão normalizada do DataFrame para buscas
+        df_normalized = normalizer.normalize_dataframe(df, text_columns)
+        profile = DatasetProfile.from_dataframe(df, df_normalized, text_columns)
 
     # Carregar mapeamento de aliases
     alias_mapping = load_alias_mapping()
@@ -41,11 +101,11 @@ def create_agent(session_user_id=None, debug_mode=False):
 
     # Adicionar informações sobre o dataset
     dataset_info = f"""
-Dataset: DadosComercial_resumido.parquet
+Dataset: {source.name} ({source.description})
 Localização: {data_path}
-Número de linhas: {len(df)}
-Número de colunas: {len(df.columns)}
-Colunas disponíveis: {", ".join(df.columns.tolist())}
+Número de linhas: {profile.n_rows}
+Número de colunas: {len(profile.columns)}
+Colunas disponíveis: {", ".join(profile.columns)}
 
 IMPORTANTE: Os dados passaram por normalização de texto para garantir consistência:
 - Colunas de texto normalizadas: {", ".join(text_columns)}
@@ -53,54 +113,392 @@ IMPORTANTE: Os dados passaram por normalização de texto para garantir consist
 - Aliases disponíveis para consultas: {", ".join(alias_mapping.keys()) if alias_mapping else "Nenhum"}
 
 Primeiras 5 linhas do dataset original:
-{df.head().to_string()}
+{profile.head_text}
 
 Primeiras 5 linhas com normalização aplicada (colunas de texto):
-{df_normalized[text_columns].head().to_string() if text_columns else "Nenhuma coluna de texto para normalizar"}
+{profile.head_normalized_text}
 
 Informações estatísticas:
-{df.describe().to_string()}
+{profile.describe_text}
 
 Tipos de dados:
-{df.dtypes.to_string()}
+{profile.dtypes_text}
 """
 
     knowledge.load_text(dataset_info)
 
     # Configurar memória temporária (em memória, efêmera)
-    # Criar um arquivo temporário único para esta sessão
-    temp_dir = tempfile.gettempdir()
-    temp_db_path = os.path.join(
-        temp_dir, f"temp_memory_{session_user_id or 'default'}.db"
-    )
+    # Criar um arquivo temporário único para esta sessão (removido em close())
+    temp_db_path = memory_db_path(session_user_id)
 
     memory_db = SqliteMemoryDb(table_name="temp_memory", db_file=temp_db_path)
-    memory = Memory(model=OpenAIChat(id=selected_model), db=memory_db)
+    memory = Memory(model=create_model(selected_model), db=memory_db)
 
     # Criar classe customizada de DuckDbTools para capturar queries
     class DebugDuckDbTools(DuckDbTools):
-        def __init__(self, debug_info_ref=None, *args, **kwargs):
+        def __init__(
+            self,
+            debug_info_ref=None,
+            memory_budget=None,
+            sql_guard=None,
+            query_profiler=None,
+            approximate_sample=None,
+            catalog_session=None,
+            result_exporter=None,
+            prepared_statements=None,
+            *args,
+            **kwargs,
+        ):
+            # Somente leitura: sem as ferramentas herdadas que criam tabelas e índices
+            kwargs.setdefault("exclude_tools", WRITE_TOOLS)
             super().__init__(*args, **kwargs)
             self.debug_info_ref = debug_info_ref
+            self.memory_budget = memory_budget
+            self.sql_guard = sql_guard or SqlGuard.from_env()
+            self.query_profiler = query_profiler or QueryProfiler.from_env()
+            self.approximate_sample = approximate_sample
+            self.catalog_session = catalog_session or CatalogSession(
+                catalog, lambda: self.connection
+            )
+            self.catalog_session.mark_registered(catalog.default)
+            self.result_exporter = result_exporter or ResultExporter.from_env()
+            # Arquivos exportados nesta sessão (apagados quando ela é encerrada)
+            self.exported_paths = []
+            self.prepared_statements = (
+                prepared_statements or PreparedStatementCache.from_env()
+            )
+            self.register(self.run_queries)
+            self.register(self.export_query_result)
+            if len(catalog.names()) > 1:
+                self.register(self.describe_dataset)
+            if approximate_sample is not None:
+                self.register(self.estimate_aggregate)
 
         def run_query(self, query: str) -> str:
             """Override do método run_query para capturar queries SQL executadas"""
-            if self.debug_info_ref is not None and hasattr(
-                self.debug_info_ref, "debug_info"
-            ):
-                if "sql_queries" not in self.debug_info_ref.debug_info:
-                    self.debug_info_ref.debug_info["sql_queries"] = []
+            self._record_sql_query(query)
+            return self._run_guarded_query(query, self.connection)
+
+        def run_queries(self, queries: List[str]) -> str:
+            """Executa várias consultas SQL independentes em paralelo e retorna todos os resultados de uma vez.
+            Use no lugar de chamadas sequenciais de run_query quando as consultas não dependem umas das outras
+            (ex: totais por UF, totais por segmento e o total geral).
+
+            :param queries: Lista de consultas SQL independentes
+            :return: Resultado de cada consulta, na mesma ordem
+            """
+            if not queries:
+                return "No queries"
+
+            max_queries = self.sql_guard.max_batch_queries
+            if len(queries) > max_queries:
+                return guard_error(
+                    "TOO_MANY_QUERIES",
+                    f"Foram enviadas {len(queries)} consultas; o máximo por lote é {max_queries}.",
+                    "Divida as consultas em lotes menores ou combine-as com GROUP BY.",
+                )
+
+            for query in queries:
+                self._record_sql_query(query)
+
+            def run_on_cursor(query: str) -> str:
+                # Cada consulta usa seu próprio cursor para executar em paralelo
+                cursor = self.connection.cursor()
+                try:
+                    return self._run_guarded_query(query, cursor)
+                finally:
+                    cursor.close()
+
+            with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+                results = list(executor.map(profiled(run_on_cursor), queries))
+
+            return "\n\n".join(
+                f"### Consulta {i}\n{query.strip()}\n{result}"
+                for i, (query, result) in enumerate(zip(queries, results), 1)
+            )
+
+        def estimate_aggregate(
+            self,
+            aggregate: str,
+            column: Optional[str] = None,
+            group_by: Optional[str] = None,
+            where: Optional[str] = None,
+            quantile: float = 0.5,
+        ) -> str:
+            """Estima um agregado de forma aproximada e rápida, com intervalo de confiança de 95%.
+            Use para perguntas exploratórias (visões gerais, ordens de grandeza, rankings aproximados).
+            Não use quando o usuário pedir valores exatos: nesse caso use run_query.
+
+            :param aggregate: "sum", "count", "avg", "count_distinct" ou "quantile"
+            :param column: Coluna ou expressão agregada (ex: "Valor_Vendido"); dispensável para "count"
+            :param group_by: Expressão de agrupamento opcional (ex: "UF_Cliente")
+            :param where: Filtro SQL opcional (ex: "Data_Emissao >= DATE '2024-01-01'")
+            :param quantile: Quantil entre 0 e 1 quando aggregate = "quantile" (0.5 = mediana)
+            :return: Estimativas por grupo em CSV com limites inferior/superior e erro relativo
+            """
+            if aggregate not in AGGREGATES:
+                return guard_error(
+                    "INVALID_AGGREGATE",
+                    f"Agregado '{aggregate}' não suportado no modo aproximado.",
+                    f"Use um de: {', '.join(AGGREGATES)}; ou run_query para SQL livre.",
+                )
+            if aggregate != "count" and not column:
+                return guard_error(
+                    "MISSING_COLUMN",
+                    f"O agregado '{aggregate}' exige uma coluna.",
+                    "Informe `column`, ex: column='Valor_Vendido'.",
+                )
+
+            # A amostra é criada no primeiro uso e refeita quando o dataset muda
+            # (fingerprint diferente)
+            fingerprint = getattr(self.debug_info_ref, "dataset_fingerprint", None)
+            if self.approximate_sample.is_stale(fingerprint):
+                self.approximate_sample.build(self.connection, fingerprint)
+
+            query = self.approximate_sample.estimate_sql(
+                aggregate, column, group_by, where, quantile
+            )
+            self._record_sql_query(query)
+            guard_result = self.sql_guard.validate(self.connection, query)
+            if not guard_result.allowed:
+                self._record_guard_event(query, guard_result.error)
+                return guard_result.error
+
+            try:
+                with get_query_activity().track():
+                    rows = self.sql_guard.execute(
+                        self.connection,
+                        lambda: self.connection.execute(guard_result.sql).fetchall(),
+                    )
+            except Exception as e:
+                return str(e)
+            if isinstance(rows, str):
+                return rows
+
+            return (
+                format_estimates(rows)
+                + "\n"
+                + self.approximate_sample.describe(aggregate)
+            )
+
+        def export_query_result(self, query: str, file_format: str = "csv") -> str:
+            """Exporta o resultado COMPLETO de uma consulta SQL para um arquivo CSV ou Parquet disponível para download.
+            Use quando o usuário pedir a lista completa por trás de uma resposta (ex: todos os clientes de um segmento)
+            ou um arquivo com os dados. Não reproduza o conteúdo do arquivo na resposta: informe o nome do arquivo
+            e o número de linhas; o link de download é exibido junto da resposta.
+
+            :param query: Consulta SELECT cujo resultado completo será exportado (sem LIMIT)
+            :param file_format: "csv" (padrão) ou "parquet"
+            :return: Nome do arquivo exportado com o número de linhas e colunas
+            """
+            if file_format not in EXPORT_FORMATS:
+                return guard_error(
+                    "INVALID_FORMAT",
+                    f"Formato '{file_format}' não suportado para exportação.",
+                    f"Use um de: {', '.join(EXPORT_FORMATS)}.",
+                )
+            self._record_sql_query(query)
+            try:
+                self.catalog_session.ensure_for_query(query)
+            except Exception as e:
+                return str(e)
+
+            # Mesmas validações das consultas, sem o LIMIT automático
+            guard_result = self.sql_guard.validate(
+                self.connection, query, add_limit=False
+            )
+            if not guard_result.allowed:
+                self._record_guard_event(query, guard_result.error)
+                return guard_result.error
+
+            try:
+                with get_query_activity().track():
+                    result = self.sql_guard.execute(
+                        self.connection,
+                        lambda: self.result_exporter.export(
+                            self.connection, guard_result.sql, file_format
+                        ),
+                        timeout_seconds=self.result_exporter.timeout_s,
+                    )
+            except Exception as e:
+                return str(e)
+            if result is None or isinstance(result, str):
+                return result or "Exportação interrompida"
+
+            self.exported_paths.append(result.path)
+            debug_info = self._debug_info()
+            if debug_info is not None:
+                debug_info.setdefault("exports", []).append(result.to_dict())
+            return (
+                f"Arquivo exportado: {result.file_name} ({result.rows:,} linhas, "
+                f"{result.columns} colunas). O link de download é exibido junto da resposta."
+            )
+
+        def describe_dataset(self, name: str) -> str:
+            """Descreve um dataset do catálogo (linhas, colunas, tipos, estatísticas e valores normalizados).
+            Use antes de consultar um dataset do catálogo diferente do principal.
+
+            :param name: Nome do dataset no catálogo (também é o nome da view SQL)
+            :return: Perfil do dataset
+            """
+            try:
+                self.catalog_session.ensure(name)
+                return catalog.describe(name, self.connection)
+            except Exception as e:
+                return str(e)
+
+        def _run_guarded_query(self, query: str, connection) -> str:
+            """Executa a query contando-a entre as consultas DuckDB em execução"""
+            with get_query_activity().track():
+                return self._execute_guarded_query(query, connection)
+
+        def _execute_guarded_query(self, query: str, connection) -> str:
+            """Valida, executa com timeout e perfila uma query na conexão informada"""
+            # Registrar como view os datasets do catálogo citados pela primeira vez
+            try:
+                self.catalog_session.ensure_for_query(query)
+            except Exception as e:
+                return str(e)
+
+            # Formatos repetidos (mesma consulta com outros literais) usam o prepared
+            # statement da conexão principal: sem novo parsing, EXPLAIN e planejamento
+            normalized = normalize_query(query)
+            prepared_cache = (
+                self.prepared_statements if connection is self.connection else None
+            )
+            statement = (
+                prepared_cache.get(connection, normalized) if prepared_cache else None
+            )
+            if statement is not None:
+                try:
+                    return self._run_prepared(query, normalized, statement, connection)
+                except Exception:
+                    # Ex: parâmetro com tipo incompatível; segue pelo caminho literal
+                    prepared_cache.invalidate(normalized)
+
+            # Validar a query antes de executar (somente leitura, EXPLAIN, limites)
+            guard_result = self.sql_guard.validate(connection, query)
+            if not guard_result.allowed:
+                self._record_guard_event(query, guard_result.error)
+                get_shape_stats().record(normalized, 0.0, error=True)
+                return guard_result.error
+            if guard_result.notes:
+                self._record_guard_event(query, " ".join(guard_result.notes))
+
+            # Executar com limite de tempo (a conexão é interrompida no timeout)
+            self.query_profiler.prepare(connection)
+            start_time = time.perf_counter()
+            try:
+                result = self.sql_guard.execute(
+                    connection,
+                    lambda: self._stream_result(guard_result.sql, connection),
+                )
+                failed = result is None
+            except Exception as e:
+                result, failed = str(e), True
+            wall_ms = (time.perf_counter() - start_time) * 1000
+            get_shape_stats().record(normalized, wall_ms, error=failed)
+            self._record_query_shape(query, normalized, prepared=False)
+            if prepared_cache and not failed:
+                prepared_cache.observe(
+                    connection,
+                    normalized,
+                    guard_result.sql,
+                    guard_result.notes,
+                    capped=bool(guard_result.notes),
+                )
+
+            self._collect_profile(query, guard_result.sql, connection, wall_ms)
+            if guard_result.notes and result is not None:
+                result = f"{result}\n" + "\n".join(guard_result.notes)
+            return result
+
+        def _run_prepared(self, query: str, normalized, statement, connection):
+            """Executa um formato já validado pelo prepared statement (levanta se falhar)"""
+            # Sem o EXPLAIN do guard, consultas não limitadas por ele têm as linhas
+            # limitadas na leitura
+            max_rows = None if statement.capped else self.sql_guard.max_result_rows
+            self.query_profiler.prepare(connection)
+            start_time = time.perf_counter()
+            result = self.sql_guard.execute(
+                connection,
+                lambda: self._stream_result(
+                    normalized.execute_sql(statement.name), connection, max_rows
+                ),
+            )
+            wall_ms = (time.perf_counter() - start_time) * 1000
+            get_shape_stats().record(normalized, wall_ms, prepared=True)
+            self._record_query_shape(query, normalized, prepared=True)
+            self._collect_profile(query, query, connection, wall_ms)
+            if statement.notes and result is not None:
+                result = f"{result}\n" + "\n".join(statement.notes)
+            return result
+
+        def _collect_profile(self, query: str, sql: str, connection, wall_ms: float):
+            """Captura o perfil do DuckDB e registra consultas lentas"""
+            debug_info = self._debug_info()
+            profile = self.query_profiler.collect(
+                connection,
+                sql,
+                wall_ms,
+                question=debug_info.get("original_query") if debug_info else None,
+            )
+            if profile is not None and debug_info is not None:
+                debug_info.setdefault("query_profiles", {})[query.strip()] = profile
+
+        def _stream_result(
+            self, query: str, connection, max_rows: Optional[int] = None
+        ) -> str:
+            """Executa uma query já validada pelo guard (levanta a exceção do DuckDB)"""
+            # No modo de memória limitada o resultado é lido em lotes e truncado
+            bounded = self.memory_budget is not None and self.memory_budget.bounded
+            if bounded:
+                limit = self.memory_budget.max_result_rows
+                max_rows = limit if max_rows is None else min(max_rows, limit)
+            return stream_query_result(
+                connection,
+                query,
+                max_rows=max_rows,
+                batch_size=(self.memory_budget.result_batch_size if bounded else 1000),
+            )
+
+        def _record_query_shape(self, query: str, normalized, prepared: bool):
+            """Registra o formato da query e se ela usou o prepared statement"""
+            debug_info = self._debug_info()
+            if debug_info is not None:
+                debug_info.setdefault("query_shapes", {})[query.strip()] = {
+                    "shape_id": normalized.shape_id,
+                    "params": len(normalized.params),
+                    "prepared": prepared,
+                }
+
+        def _record_sql_query(self, query: str):
+            """Registra a query SQL nas informações de debug"""
+            debug_info = self._debug_info()
+            if debug_info is not None:
+                if "sql_queries" not in debug_info:
+                    debug_info["sql_queries"] = []
 
                 # Limpar e formatar a query
                 clean_query = query.strip()
-                if (
-                    clean_query
-                    and clean_query not in self.debug_info_ref.debug_info["sql_queries"]
-                ):
-                    self.debug_info_ref.debug_info["sql_queries"].append(clean_query)
+                if clean_query and clean_query not in debug_info["sql_queries"]:
+                    debug_info["sql_queries"].append(clean_query)
 
-            # Executar a query original
-            return super().run_query(query)
+        def _debug_info(self):
+            """Retorna o dicionário de debug do agente associado, se houver"""
+            if self.debug_info_ref is not None and hasattr(
+                self.debug_info_ref, "debug_info"
+            ):
+                return self.debug_info_ref.debug_info
+            return None
+
+        def _record_guard_event(self, query: str, detail: str):
+            """Registra rejeições e reescritas do guard nas informações de debug"""
+            debug_info = self._debug_info()
+            if debug_info is not None:
+                debug_info.setdefault("sql_guard", []).append(
+                    {"query": query.strip(), "detail": detail}
+                )
 
     # Criar classe customizada de agent que aplica normalização às consultas
     class NormalizedAgent(Agent):
@@ -113,13 +511,186 @@ Tipos de dados:
             self.memory = memory
             self.session_user_id = session_user_id or "default_user"
             self.debug_info = {}  # Para armazenar informações de debug
+            self.catalog = catalog
+            self.profile = profile
+            self.ingestor = None
+            self.refresh_interval = float(os.getenv("AGENT_REFRESH_INTERVAL_S", "60"))
+            self.last_refresh = None
+            self.memory_db_path = temp_db_path
+            self.context_compactor = ContextCompactor.from_env()
+            self.router = QuestionRouter.from_env()
 
             # Substituir DuckDbTools por versão debug
+            self.duckdb_tools = None
             for i, tool in enumerate(self.tools):
                 if isinstance(tool, DuckDbTools):
-                    self.tools[i] = DebugDuckDbTools(debug_info_ref=self)
+                    self.tools[i] = DebugDuckDbTools(
+                        debug_info_ref=self,
+                        memory_budget=memory_budget,
+                        approximate_sample=StratifiedSample.from_env(source.name),
+                        config=duckdb_config,
+                        db_path=(shared_database.db_path if shared_database else None),
+                        read_only=shared_database is not None,
+                    )
+                    self.duckdb_tools = self.tools[i]
+
+            # Configurações por rota: perguntas simples usam menos ferramentas,
+            # instruções curtas e (opcionalmente) um modelo mais leve
+            light_model_id = os.getenv("AGENT_LIGHT_MODEL", selected_model)
+            light_duckdb_tools = Toolkit(
+                name="duckdb_tools_light",
+                tools=[
+                    function.entrypoint
+                    for name, function in self.duckdb_tools.functions.items()
+                    if name in ("run_query", "describe_table", "describe_dataset")
+                ],
+            )
+            self.routes = {
+                FULL: (list(self.tools), build_instructions, self.model),
+                LIGHT: (
+                    [t for t in self.tools if isinstance(t, ExpressionTools)]
+                    + [light_duckdb_tools],
+                    build_light_instructions,
+                    (
+                        self.model
+                        if light_model_id == selected_model
+                        else create_model(light_model_id)
+                    ),
+                ),
+            }
+
+        @property
+        def dataset_fingerprint(self) -> str:
+            """Impressão digital dos dados carregados (muda a cada ingestão)"""
+            return self.profile.fingerprint
+
+        def refresh_dataset(self, force=False):
+            """Ingere novos arquivos/row groups se o intervalo de verificação tiver passado"""
+            if self.ingestor is None:
+                return None
+            now = time.monotonic()
+            if not force and (
+                self.refresh_interval <= 0
+                or (
+                    self.last_refresh is not None
+                    and now - self.last_refresh < self.refresh_interval
+                )
+            ):
+                return None
+            self.last_refresh = now
+
+            result, self.df_normalized = self.ingestor.refresh(
+                self.duckdb_tools.connection, self.profile, self.df_normalized
+            )
+            return result
+
+        def attach_shared_database(self, shared):
+            """
+            Passa a ler uma nova versão do banco compartilhado (worker do pool),
+            mantendo a memória, o contexto e o debug da sessão.
+
+            Args:
+                shared: SharedDatabase da nova versão
+            """
+            tools = self.duckdb_tools
+            if tools._connection is not None:
+                tools._connection.close()
+                tools._connection = None
+            tools.prepared_statements.clear()
+            tools.db_path = shared.db_path
+
+            # Atualização no lugar: as instruções usam o mesmo objeto de perfil
+            vars(self.profile).update(vars(shared.load_profile()))
+            self.df_normalized = shared.load_normalized()
+            self.text_columns = self.profile.text_columns
+            if tools.approximate_sample is not None:
+                tools.approximate_sample.attach(
+                    tools.connection, self.dataset_fingerprint
+                )
+
+        def clear_session(self):
+            """Descarta memórias, histórico de execuções e debug da sessão (botão "Limpar")"""
+            # O inspector do SQLAlchemy guarda que a tabela de memórias não existia na
+            # criação do agente; sem limpar esse cache, memory.clear() não apaga nada
+            inspector = getattr(self.memory.db, "inspector", None)
+            if inspector is not None and hasattr(inspector, "clear_cache"):
+                inspector.clear_cache()
+            self.memory.clear()
+            self.context_compactor.clear()
+            self.debug_info = {}
+
+        def close(self):
+            """Libera os recursos da sessão: banco de memória, conexão DuckDB, caches e arquivos exportados"""
+            engine = getattr(self.memory.db, "db_engine", None)
+            self.memory.memories = {}
+            self.memory.summaries = {}
+            self.memory.runs = {}
+            if engine is not None:
+                engine.dispose()
+            if os.path.exists(self.memory_db_path):
+                os.remove(self.memory_db_path)
+            if self.duckdb_tools is not None:
+                if self.duckdb_tools._connection:
+                    self.duckdb_tools._connection.close()
+                    self.duckdb_tools._connection = None
+                    self.duckdb_tools.prepared_statements.clear()
+                self.duckdb_tools.result_exporter.remove(
+                    self.duckdb_tools.exported_paths
+                )
+                self.duckdb_tools.exported_paths = []
+            self.df_normalized = None
+            self.debug_info = {}
+
+        def resource_usage(self) -> dict:
+            """Memória estimada da sessão em bytes, por componente"""
+            usage = {
+                "memory_db": (
+                    os.path.getsize(self.memory_db_path)
+                    if os.path.exists(self.memory_db_path)
+                    else 0
+                ),
+                "duckdb": 0,
+                "dataframe": 0,
+                "debug_state": len(repr(self.debug_info)),
+            }
+            connection = (
+                self.duckdb_tools._connection if self.duckdb_tools is not None else None
+            )
+            if connection is not None:
+                # Cursor próprio: execute() na conexão principal substituiria o
+                # resultado pendente de uma consulta em andamento nesta sessão
+                try:
+                    cursor = connection.cursor()
+                    try:
+                        usage["duckdb"] = int(
+                            cursor.execute(
+                                "SELECT SUM(memory_usage_bytes) FROM duckdb_memory()"
+                            ).fetchone()[0]
+                            or 0
+                        )
+                    finally:
+                        cursor.close()
+                except duckdb.Error:
+                    pass
+            if self.df_normalized is not None:
+                usage["dataframe"] = int(
+                    self.df_normalized.memory_usage(deep=True).sum()
+                )
+            return usage
+
+        def run(self, query: str, debug_mode=False, profile=False, **kwargs):
+            if not profile:
+                return self._run_normalized(query, **kwargs)
+
+            # Profiling por amostragem desta requisição (arquivo collapsed + resumo)
+            with SamplingProfiler.from_env().profile(
+                self.session_user_id or "default"
+            ) as request_profile:
+                response = self._run_normalized(query, **kwargs)
+            self.debug_info["profile"] = request_profile.to_dict()
+            return response
 
-        def run(self, query: str, debug_mode=False, **kwargs):
+        def _run_normalized(self, query: str, route: Optional[str] = None, **kwargs):
             # Limpar debug info anterior
             self.debug_info = {
                 "original_query": query,
@@ -128,37 +699,76 @@ Tipos de dados:
                 "memory_context": "",
             }
 
-            # Normalizar a consulta do usuário
-            query_analysis = self.normalizer.normalize_query_terms(
-                query, self.alias_mapping
-            )
+            # Incorporar dados novos antes de responder (perfil e fingerprint atualizados)
+            refresh_result = self.refresh_dataset()
+            if refresh_result is not None and refresh_result.changed:
+                self.debug_info["dataset_refresh"] = refresh_result.to_dict()
 
-            # Substituir aliases na query original se necessário
-            processed_query = query
-            for alias, mapping_info in query_analysis["mapped_terms"].items():
-                processed_query = processed_query.replace(
-                    mapping_info["original_alias"], mapping_info["mapped_column"]
-                )
+            # Reescrever a pergunta com o alias.json compilado (colunas, métricas e
+            # convenções de UF), recompilado apenas quando o arquivo muda
+            rewrite = load_query_rewriter().rewrite(query)
+            processed_query = rewrite.with_hints()
+            if rewrite.hints:
+                self.debug_info["rewrite_hints"] = rewrite.hints
 
             self.debug_info["processed_query"] = processed_query
 
+            # Rotear pela complexidade da pergunta (atributos locais, sem chamar o modelo)
+            decision = (
+                RouteDecision(route, {}, ["rota forçada"])
+                if route is not None
+                else self.router.classify(query, rewrite, self.profile.columns)
+            )
+            tools, instructions, model = self.routes[decision.route]
+            self.set_tools(list(tools))
+            self.instructions = instructions
+            self.model = model
+            self.debug_info["route"] = decision.to_dict()
+
             # Recuperar memórias relevantes antes de processar a query
             relevant_memories = self.memory.search_user_memories(
-                user_id=self.session_user_id, query=processed_query, limit=5
+                user_id=self.session_user_id, query=rewrite.query, limit=5
             )
 
-            # Adicionar contexto da memória se houver memórias relevantes
-            if relevant_memories:
-                memory_context = "\n".join(
-                    [f"Lembrança: {mem.memory}" for mem in relevant_memories]
-                )
-                processed_query = f"Contexto da conversa anterior:\n{memory_context}\n\nPergunta atual: {processed_query}"
-                self.debug_info["memory_context"] = memory_context
+            # Contexto compactado: resumo estruturado da sessão e apenas os turnos
+            # completos mais recentes que cabem no orçamento de tokens
+            context = self.context_compactor.build(
+                [mem.memory for mem in relevant_memories]
+            )
+            # Contagens registradas mesmo sem contexto (ex: primeira pergunta da sessão)
+            self.debug_info["context_tokens"] = context.to_dict()
+            if context.text:
+                processed_query = f"Contexto da conversa anterior:\n{context.text}\n\nPergunta atual: {processed_query}"
+                self.debug_info["memory_context"] = context.text
 
             # Executar a consulta processada - queries serão capturadas automaticamente pelo DebugDuckDbTools
-            response = super().run(processed_query, **kwargs)
-
-            # Armazenar a interação na memória
+            # (chamadas ao modelo com prazo, novas tentativas, hedging e circuit breaker)
+            resilience = get_resilience()
+            llm_counts = resilience.metrics.counts()
+            start_time = time.perf_counter()
+            failed = True
+            try:
+                response = super().run(processed_query, **kwargs)
+                failed = False
+            finally:
+                get_route_metrics().record(
+                    decision.route, time.perf_counter() - start_time, error=failed
+                )
+                self.debug_info["llm"] = {
+                    name: value - llm_counts[name]
+                    for name, value in resilience.metrics.counts().items()
+                    if value != llm_counts[name]
+                }
+                self.debug_info["llm"]["breaker_state"] = resilience.breaker.state
+
+            # Atualizar o resumo da sessão e armazenar a interação na memória
+            self.context_compactor.record_turn(
+                query,
+                response.content or "",
+                hints=rewrite.hints,
+                sql_queries=self.debug_info.get("sql_queries"),
+                columns=self.profile.columns,
+            )
             try:
                 from agno.memory.v2.schema import UserMemory
 
@@ -183,20 +793,22 @@ Tipos de dados:
 
             return response
 
-    agent = NormalizedAgent(
-        model=OpenAIChat(id=selected_model),
-        description="Você é um assistente especializado em análise de dados comerciais. Você tem acesso ao dataset DadosComercial_resumido.parquet com normalização de texto aplicada e pode responder perguntas baseadas nesse conteúdo. Você também tem memória contextual para lembrar de conversas anteriores na mesma sessão.",
-        tools=[
-            ReasoningTools(add_instructions=True),
-            CalculatorTools(
-                add=True, subtract=True, multiply=True, divide=True, exponentiate=True
-            ),
-            PythonTools(run_code=True, pip_install=False),
-            DuckDbTools(),
-        ],
-        knowledge=knowledge,
-        enable_user_memories=True,
-        instructions=f"""
+    # Demais fontes do catálogo: apenas nome e descrição (perfil calculado sob demanda)
+    other_sources = [
+        catalog.get(name) for name in catalog.names() if name != source.name
+    ]
+    other_datasets = (
+        "- Outros datasets do catálogo (views SQL com o mesmo nome; use `describe_dataset` antes de consultá-los, e só quando a pergunta pedir explicitamente):\n"
+        + "\n".join(
+            f"  - `{other.name}`: {other.description}" for other in other_sources
+        )
+        if other_sources
+        else ""
+    )
+
+    def build_instructions():
+        """Monta as instruções com o perfil atual do dataset (reavaliadas a cada execução)"""
+        return f"""
 ## ESCOPO E IDENTIDADE
 Você é um especialista em análise de dados comerciais com foco exclusivo no dataset `DadosComercial_resumido.parquet`. Suas competências incluem análises estatísticas, interpretação semântica de consultas e geração de insights baseados em dados.
 
@@ -207,7 +819,7 @@ Você é um especialista em análise de dados comerciais com foco exclusivo no d
 ### Processo Interno (não exibir ao usuário):
 1. **ANÁLISE**: Decomponha a pergunta e identifique dados relevantes. **Para perguntas vagas (ex: 'fale sobre as vendas'), planeje uma análise geral (ex: total, top 5 categorias) e prepare-se para sugerir um aprofundamento na resposta final.**
 2. **PLANEJAMENTO**: Defina consultas SQL e cálculos necessários.
-3. **EXECUÇÃO**: Use ferramentas apropriadas (DuckDB, CalculatorTools, PythonTools).
+3. **EXECUÇÃO**: Use ferramentas apropriadas (DuckDB, ExpressionTools).
 4. **VALIDAÇÃO**: Verifique consistência e coerência dos resultados, seguindo o protocolo abaixo.
 
 ### Apresentação ao Usuário:
@@ -218,13 +830,29 @@ Você é um especialista em análise de dados comerciais com foco exclusivo no d
 ## CONFIGURAÇÕES TÉCNICAS
 
 ### Acesso aos Dados:
-- Dataset: `{data_path}` ({len(df)} linhas, {len(df.columns)} colunas)
-- **Obrigatório**: Use `read_parquet('{data_path}')` para todas as consultas SQL.
-- Exemplo: `SELECT * FROM read_parquet('{data_path}') WHERE coluna = 'valor'`
+- Dataset: tabela `{source.name}` ({profile.n_rows} linhas, {len(profile.columns)} colunas), carregada de `{data_path}` e atualizada automaticamente quando chegam novos dados.
+- **Obrigatório**: Use a tabela `{source.name}` para todas as consultas SQL.
+- Exemplo: `SELECT * FROM {source.name} WHERE coluna = 'valor'`
+{other_datasets}
+
+### Consultas Independentes em Lote:
+- Quando a análise exigir várias consultas que **não dependem umas das outras** (ex: totais por UF, totais por segmento e o total geral), use a tool `run_queries` com a lista de consultas em **uma única chamada**, em vez de várias chamadas sequenciais de `run_query`.
+- As consultas do lote são executadas em paralelo e os resultados voltam juntos, na mesma ordem.
+- Use `run_query` apenas quando uma consulta depende do resultado de outra.
+
+### Exportação de Resultados Completos:
+- Quando o usuário pedir a lista completa por trás de uma resposta (ex: todos os clientes de um segmento) ou um arquivo com os dados, use a tool `export_query_result` com a consulta completa (sem LIMIT). Não copie as linhas exportadas na resposta: informe o nome do arquivo e o número de linhas, pois o link de download é exibido junto da resposta.
+
+### Modo Aproximado (perguntas exploratórias):
+- Para perguntas vagas ou exploratórias (ex: "fale sobre as vendas", visões gerais, ordens de grandeza), use a tool `estimate_aggregate`: ela estima somas, contagens, médias, contagens distintas e quantis a partir de uma amostra estratificada por UF e mês (ou de sketches aproximados), muito mais rápido que varrer todas as linhas.
+- O resultado traz `limite_inferior`, `limite_superior` e `erro_relativo_pct`. Ao apresentar valores aproximados, deixe claro que são estimativas (ex: "aproximadamente R$ 1,2 bi, ±0,8%").
+- **Quando o usuário pedir valores exatos** (ex: "exato", "precisamente", "valor final", relatórios e conferências), ou quando o erro relativo for alto para a conclusão, use `run_query`/`run_queries` com execução exata.
 
 ### Cálculos Matemáticos:
-- **Sempre use CalculatorTools ou PythonTools** para operações numéricas (percentuais, razões, médias).
-- Operações disponíveis: +, -, ×, ÷, potenciação, raiz quadrada, fatorial.
+- **Sempre use a tool `evaluate_expressions`** para operações numéricas (percentuais, razões, médias).
+- Envie **todas as fórmulas de uma etapa em uma única chamada**: passe os valores obtidos no SQL em `inputs` (números ou listas) e a lista de `formulas` no formato `nome = expressão`. Cada fórmula pode usar os resultados das anteriores.
+- Exemplo: `inputs={{"vendas_uf": [120.5, 80.0, 40.2]}}`, `formulas=["total = sum(vendas_uf)", "participacao = share(vendas_uf)", "media = mean(vendas_uf)"]`
+- Operações disponíveis: +, -, ×, ÷, potenciação, raiz quadrada, log, somas, médias, mínimos/máximos, `percent(parte, total)`, `share(valores)` e `growth(novo, antigo)`.
 - Valide resultados contra o contexto dos dados.
 
 ## PROTOCOLO ESPECIAL PARA CÁLCULOS MATEMÁTICOS
@@ -237,30 +865,31 @@ Você é um especialista em análise de dados comerciais com foco exclusivo no d
       - Obter subconjuntos, totais, médias, rankings, contagens ou somas;
       - Executar queries SQL.
 
-   b. Após obter os dados da query com DuckDB, use a tool `python` (ou `calculator`) para:
+   b. Após obter os dados da query com DuckDB, use a tool `evaluate_expressions` para:
       - Realizar operações matemáticas como porcentagem, divisão, multiplicação, proporção, regra de três, etc;
       - Aplicar lógica matemática passo a passo com os resultados vindos do SQL;
       - Garantir precisão numérica e justificar os passos.
 
-2. **Nunca misture operações SQL com cálculos matemáticos diretos.** SQL serve para preparar os dados, e Python/Calculator para realizar o raciocínio numérico.
+2. **Nunca misture operações SQL com cálculos matemáticos diretos.** SQL serve para preparar os dados, e `evaluate_expressions` para realizar o raciocínio numérico.
 
 3. **Identifique corretamente o tipo de pergunta:**
-   - Se for uma pergunta como "qual é o percentual", "qual é a soma", "qual a média", etc, use DuckDB para extrair os valores necessários e Python/Calculator para calcular o resultado.
+   - Se for uma pergunta como "qual é o percentual", "qual é a soma", "qual a média", etc, use DuckDB para extrair os valores necessários e `evaluate_expressions` para calcular o resultado (todas as fórmulas em uma única chamada).
    - Para perguntas que exigem apenas filtragem ou ranking (ex: "quais os 3 primeiros"), use apenas SQL.
 
 4. **Evite qualquer hardcoding de respostas, valores ou perguntas.** Trabalhe com base nos dados apresentados dinamicamente.
 
 5. **Justifique sempre o raciocínio com passos matemáticos claros.**
 
-**Objetivo:** Dividir corretamente o uso de DuckDB para manipulação de dados e Python/Calculator para lógica matemática, garantindo respostas generalizadas, precisas e explicáveis.
+**Objetivo:** Dividir corretamente o uso de DuckDB para manipulação de dados e `evaluate_expressions` para lógica matemática, garantindo respostas generalizadas, precisas e explicáveis.
 
 ### Normalização de Texto:
 - Colunas normalizadas: {", ".join(text_columns)}
 - Use minúsculas sem acentos: `LOWER(coluna) LIKE '%termo%'`
 - Aliases disponíveis: {alias_mapping}
+- Quando a pergunta trouxer a linha `Mapeamentos resolvidos`, use-a diretamente: `colunas` indica as colunas citadas, `filtros` as condições SQL prontas (ex: `UF_Cliente = 'SP'`) e `metricas` a expressão SQL de cada métrica (ex: `COUNT(*)` para número de compras), sem consultas extras para descobri-las.
 
 ### Colunas Disponíveis:
-{", ".join(df.columns.tolist())}
+{", ".join(profile.columns)}
 
 ## PROTOCOLO DE VALIDAÇÃO
 
@@ -274,6 +903,7 @@ Você é um especialista em análise de dados comerciais com foco exclusivo no d
 - **Dados ausentes**: Mencione explicitamente e calcule sobre dados disponíveis.
 - **Consultas vazias**: Informe a ausência de resultados e sugira alternativas.
 - **Erros de ferramenta (ex: query SQL inválida)**: Reformule a consulta com base no erro, tente executar novamente e, se a falha persistir, informe ao usuário que não foi possível completar a solicitação.
+- **Erros estruturados do guard SQL** (JSON com `status: "error"`, `code`, `message` e `suggestion`): apenas consultas SELECT de leitura são aceitas, uma instrução por chamada, sem junções sem condição e com tempo máximo de execução. Siga a `suggestion` para reformular a consulta (ex: agregar, filtrar ou usar LIMIT). Consultas sem LIMIT que retornariam muitas linhas são limitadas automaticamente e o resultado traz um aviso.
 
 ## ESTRUTURA DE RESPOSTA
 
@@ -350,16 +980,80 @@ Utilize informações de conversas anteriores para:
 - Personalizar respostas conforme preferências do usuário.
 - Manter consistência em análises sequenciais.
 - Referenciar dados já discutidos quando relevante.
-""",
+"""
+
+    def build_light_instructions():
+        """Instruções curtas da rota leve (perguntas simples: um valor, uma consulta)"""
+        return f"""
+## ESCOPO
+Você é um analista de dados comerciais e responde apenas sobre o dataset disponível. Para perguntas fora desse contexto, diga que estão fora do seu escopo de análise comercial.
+
+## DADOS
+- Tabela `{source.name}` ({profile.n_rows} linhas). Colunas: {", ".join(profile.columns)}
+- Colunas de texto normalizadas (minúsculas, sem acentos): {", ".join(text_columns)}. Use `LOWER(coluna) LIKE '%termo%'` para buscas de texto.
+- Quando a pergunta trouxer a linha `Mapeamentos resolvidos`, use `colunas`, `filtros` (condições SQL prontas) e `metricas` (expressões SQL) diretamente.
+
+## EXECUÇÃO
+- Responda com **uma única consulta** agregada via `run_query` (ex: `SUM`, `COUNT(DISTINCT ...)`, `MAX`), sem `LIMIT` em agregações.
+- Use `evaluate_expressions` apenas se precisar de cálculo sobre o resultado (ex: percentual).
+- Se a ferramenta devolver um erro estruturado (`status: "error"`), siga a `suggestion` e tente novamente.
+
+## RESPOSTA
+- Comece pelo valor pedido, em negrito, seguido de uma frase de contexto. Use tabela apenas se o resultado tiver várias linhas.
+"""
+
+    agent = NormalizedAgent(
+        model=create_model(selected_model),
+        description="Você é um assistente especializado em análise de dados comerciais. Você tem acesso ao dataset DadosComercial_resumido.parquet com normalização de texto aplicada e pode responder perguntas baseadas nesse conteúdo. Você também tem memória contextual para lembrar de conversas anteriores na mesma sessão.",
+        tools=[
+            ReasoningTools(add_instructions=True),
+            ExpressionTools(),
+            DuckDbTools(),
+        ],
+        knowledge=knowledge,
+        enable_user_memories=True,
+        instructions=build_instructions,
         show_tool_calls=debug_mode,
         markdown=True,
     )
 
-    # Fazer o DuckDB carregar automaticamente o arquivo parquet
-    agent.run(
-        f"CREATE TABLE dados_comerciais AS SELECT * FROM read_parquet('{data_path}');"
+    if shared_database is not None:
+        # Tabela, amostra e views já existem no banco somente leitura compartilhado
+        for name in catalog.names():
+            agent.duckdb_tools.catalog_session.mark_registered(name)
+        if agent.duckdb_tools.approximate_sample is not None:
+            agent.duckdb_tools.approximate_sample.attach(
+                agent.duckdb_tools.connection, agent.dataset_fingerprint
+            )
+        return agent, df
+
+    # Registrar o arquivo parquet diretamente na conexão do DuckDB (sem passar pelo modelo).
+    # No modo de memória limitada usa-se uma view, evitando uma cópia completa dos dados.
+    if memory_budget.bounded:
+        agent.duckdb_tools.connection.execute(
+            f"CREATE OR REPLACE VIEW {source.name} AS SELECT * FROM read_parquet('{data_path}')"
+        )
+    else:
+        agent.duckdb_tools.connection.execute(
+            f"CREATE TABLE IF NOT EXISTS {source.name} AS SELECT * FROM read_parquet('{data_path}')"
+        )
+
+    # Acompanhar novos arquivos/row groups e ingerir apenas as linhas novas
+    agent.ingestor = IncrementalIngestor.from_env(
+        data_path,
+        incremental_glob=source.incremental_glob,
+        table_name=source.name,
+        materialized=not memory_budget.bounded,
+        normalizer=normalizer,
+        text_columns=text_columns,
     )
+    agent.ingestor.snapshot()
+    if df is not None:
+        agent.ingestor.seed_normalized_values(df, df_normalized)
+    agent.refresh_dataset(force=True)
 
+    # A amostra do modo aproximado é criada no primeiro `estimate_aggregate` da
+    # sessão (no modo "pooled" ela vem pronta no banco compartilhado)
     return agent, df
 
 
@@ -0,0 +1,239 @@
+"""
+Módulo de compactação do contexto da conversa.
+Mantém um resumo estruturado da sessão (colunas, filtros, métricas, consultas e
+resultados já discutidos) e inclui turnos anteriores completos apenas dentro de
+um orçamento de tokens, para que o contexto enviado ao modelo não cresça com a
+duração da sessão.
+"""
+
+import os
+import re
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+_encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Número de tokens de um texto (tiktoken, se instalado; senão ~4 caracteres por token).
+
+    Args:
+        text: Texto a medir
+
+    Returns:
+        Número estimado de tokens
+    """
+    global _encoding
+    if not text:
+        return 0
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding("o200k_base")
+        except (ImportError, ValueError):
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def headline(answer: str, max_chars: int = 160) -> str:
+    """Primeira linha de texto de uma resposta em markdown (sem tabelas e marcações)."""
+    for line in answer.splitlines():
+        line = line.strip()
+        if not line or line.startswith("|") or set(line) <= set("-=|: "):
+            continue
+        # Rótulo em negrito no início (ex: "**Insight Principal**:") e marcações
+        line = re.sub(r"^[#>\-\s]*\*\*[^*]{1,40}\*\*:?\s*", "", line)
+        line = re.sub(r"^[#>\-\s]+", "", line.replace("**", "").replace("`", ""))
+        if line:
+            return line if len(line) <= max_chars else line[: max_chars - 1] + "…"
+    return ""
+
+
+class CompactContext:
+    """Contexto compactado de uma pergunta e suas contagens de tokens."""
+
+    def __init__(
+        self,
+        text: str,
+        tokens_before: int,
+        tokens_after: int,
+        turns_total: int,
+        turns_included: int,
+        summary_tokens: int,
+    ):
+        self.text = text
+        self.tokens_before = tokens_before
+        self.tokens_after = tokens_after
+        self.turns_total = turns_total
+        self.turns_included = turns_included
+        self.summary_tokens = summary_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "tokens_before": self.tokens_before,
+            "tokens_after": self.tokens_after,
+            "summary_tokens": self.summary_tokens,
+            "turns_total": self.turns_total,
+            "turns_included": self.turns_included,
+        }
+
+
+class ContextCompactor:
+    """Resumo estruturado da sessão e turnos completos dentro de um orçamento de tokens."""
+
+    def __init__(
+        self, token_budget: int = 600, max_results: int = 6, max_queries: int = 3
+    ):
+        """
+        Args:
+            token_budget: Tokens disponíveis para os turnos completos mais recentes
+            max_results: Resultados (pergunta → conclusão) mantidos no resumo
+            max_queries: Consultas SQL recentes mantidas no resumo
+        """
+        self.token_budget = token_budget
+        self.max_results = max_results
+        self.max_queries = max_queries
+        self.columns: "OrderedDict[str, None]" = OrderedDict()
+        self.filters: "OrderedDict[str, str]" = OrderedDict()
+        self.metrics: "OrderedDict[str, str]" = OrderedDict()
+        self.queries: List[str] = []
+        self.results: List[str] = []
+        # Turnos registrados no resumo (a sessão pode ter mais turnos que os recuperados)
+        self.turns_recorded = 0
+
+    @classmethod
+    def from_env(cls) -> "ContextCompactor":
+        """
+        Cria o compactador a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_CONTEXT_TOKEN_BUDGET: tokens para turnos completos (0 = só o resumo)
+            AGENT_CONTEXT_MAX_RESULTS: resultados mantidos no resumo da sessão
+
+        Returns:
+            Instância de ContextCompactor
+        """
+        return cls(
+            token_budget=int(os.getenv("AGENT_CONTEXT_TOKEN_BUDGET", "600")),
+            max_results=int(os.getenv("AGENT_CONTEXT_MAX_RESULTS", "6")),
+        )
+
+    def record_turn(
+        self,
+        question: str,
+        answer: str,
+        hints: Optional[Dict[str, Dict[str, str]]] = None,
+        sql_queries: Optional[List[str]] = None,
+        columns: Optional[List[str]] = None,
+    ):
+        """
+        Atualiza o resumo com um turno concluído.
+
+        Args:
+            question: Pergunta do usuário
+            answer: Resposta final do agente
+            hints: Mapeamentos resolvidos pelo QueryRewriter (colunas, filtros, métricas)
+            sql_queries: Consultas executadas no turno
+            columns: Colunas do dataset, para detectar as citadas na pergunta e nas consultas
+        """
+        hints = hints or {}
+        self.turns_recorded += 1
+        text = " ".join([question] + list(sql_queries or []))
+        cited = [column for column in columns or [] if column in text]
+        for column in cited + list((hints.get("colunas") or {}).values()):
+            self.columns.pop(column, None)
+            self.columns[column] = None
+        for name, condition in (hints.get("filtros") or {}).items():
+            self.filters.pop(name, None)
+            self.filters[name] = condition
+        for name, expression in (hints.get("metricas") or {}).items():
+            self.metrics.pop(name, None)
+            self.metrics[name] = expression
+        for query in sql_queries or []:
+            query = " ".join(query.split())
+            if query in self.queries:
+                self.queries.remove(query)
+            self.queries.append(query)
+        del self.queries[: -self.max_queries]
+
+        conclusion = headline(answer)
+        if conclusion:
+            self.results.append(f"{headline(question, 100)} → {conclusion}")
+            del self.results[: -self.max_results]
+
+    def clear(self):
+        """Descarta o resumo da sessão."""
+        self.columns.clear()
+        self.filters.clear()
+        self.metrics.clear()
+        self.queries = []
+        self.results = []
+        self.turns_recorded = 0
+
+    def summary_text(self) -> str:
+        """Resumo estruturado da sessão (vazio se nada foi discutido)."""
+        lines = []
+        if self.columns:
+            lines.append(f"- Colunas: {', '.join(self.columns)}")
+        if self.filters:
+            lines.append(
+                "- Filtros: "
+                + "; ".join(f"{name}: {value}" for name, value in self.filters.items())
+            )
+        if self.metrics:
+            lines.append(
+                "- Métricas: "
+                + "; ".join(f"{name}: {value}" for name, value in self.metrics.items())
+            )
+        if self.queries:
+            lines.append("- Consultas recentes:")
+            lines.extend(f"  - `{query}`" for query in self.queries)
+        if self.results:
+            lines.append("- Resultados:")
+            lines.extend(f"  - {result}" for result in self.results)
+        return "\n".join(lines)
+
+    def build(self, turns: List[str]) -> CompactContext:
+        """
+        Monta o contexto. Se todos os turnos da sessão cabem no orçamento, eles vão
+        completos; senão (turnos que não cabem ou que não foram recuperados), vão o
+        resumo da sessão e apenas os turnos mais recentes que cabem.
+
+        Args:
+            turns: Turnos anteriores completos em ordem cronológica
+
+        Returns:
+            CompactContext com o texto e as contagens de tokens antes e depois
+        """
+        tokens_before = estimate_tokens("\n\n".join(turns))
+        included: List[str] = []
+        used = 0
+        for turn in reversed(turns):
+            tokens = estimate_tokens(turn)
+            if used + tokens > self.token_budget:
+                break
+            included.insert(0, turn)
+            used += tokens
+
+        # O resumo cobre todos os turnos registrados, inclusive os mais antigos
+        # que ficaram fora dos turnos recuperados
+        covered = max(len(turns), self.turns_recorded)
+        summary = self.summary_text() if len(included) < covered else ""
+        parts = []
+        if summary:
+            parts.append(f"Resumo da sessão:\n{summary}")
+        if included:
+            parts.append("Turnos recentes:\n" + "\n\n".join(included))
+        text = "\n\n".join(parts)
+        return CompactContext(
+            text,
+            tokens_before=tokens_before,
+            tokens_after=estimate_tokens(text),
+            turns_total=covered,
+            turns_included=len(included),
+            summary_tokens=estimate_tokens(summary),
+        )
@@ -0,0 +1,289 @@
+"""
+Módulo de catálogo de datasets.
+Lê as fontes declaradas em YAML e registra cada uma como view do DuckDB apenas
+no primeiro uso, com perfil e valores normalizados calculados sob demanda e
+mantidos em cache por fonte (compartilhados entre as sessões do processo).
+"""
+
+import glob
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import yaml
+
+from dataset_profile import DatasetProfile
+from text_normalizer import TextNormalizer
+
+DEFAULT_CATALOG_PATH = "data/catalog.yaml"
+
+# Fonte usada quando o arquivo de catálogo não existe
+DEFAULT_SOURCE = {
+    "description": "Vendas consolidadas (extrato resumido)",
+    "path": "data/raw/DadosComercial_resumido.parquet",
+    "incremental_glob": "data/raw/incremental/*.parquet",
+}
+
+# Colunas de texto com até este número de valores distintos têm os valores listados
+MAX_LISTED_VALUES = 30
+
+
+class DatasetSource:
+    """Fonte de dados declarada no catálogo."""
+
+    def __init__(
+        self,
+        name: str,
+        path: str,
+        description: str = "",
+        incremental_glob: Optional[str] = None,
+    ):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+            raise ValueError(f"Nome de dataset inválido no catálogo: {name!r}")
+        self.name = name
+        self.path = path
+        self.description = description
+        self.incremental_glob = incremental_glob
+
+    @property
+    def source_sql(self) -> str:
+        """Expressão de leitura da fonte no DuckDB."""
+        return f"read_parquet('{self.path}', union_by_name = true)"
+
+    def signature(self) -> Tuple:
+        """Assinatura dos arquivos da fonte (invalida o cache quando mudam)."""
+        files = sorted(glob.glob(self.path))
+        return tuple(
+            (path, os.stat(path).st_size, os.stat(path).st_mtime_ns) for path in files
+        )
+
+
+class DatasetCatalog:
+    """Catálogo de fontes com perfis e valores normalizados em cache."""
+
+    def __init__(
+        self,
+        sources: Dict[str, DatasetSource],
+        default: str,
+        normalizer: Optional[TextNormalizer] = None,
+    ):
+        if default not in sources:
+            raise ValueError(f"Dataset padrão '{default}' não está no catálogo")
+        self.sources = sources
+        self.default = default
+        self.normalizer = normalizer or TextNormalizer()
+        self._profiles: Dict[str, Tuple[Tuple, DatasetProfile]] = {}
+        self._lookups: Dict[str, Tuple[Tuple, Dict[str, Dict[Any, str]]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_yaml(cls, path: str) -> "DatasetCatalog":
+        """
+        Carrega o catálogo de um arquivo YAML.
+
+        Args:
+            path: Caminho do arquivo YAML
+
+        Returns:
+            Instância de DatasetCatalog
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = yaml.safe_load(f) or {}
+
+        sources = {
+            name: DatasetSource(
+                name,
+                path=entry["path"],
+                description=entry.get("description", ""),
+                incremental_glob=entry.get("incremental_glob"),
+            )
+            for name, entry in (data.get("datasets") or {}).items()
+        }
+        default = data.get("default") or next(iter(sources), "dados_comerciais")
+        return cls(sources, default)
+
+    @property
+    def default_source(self) -> DatasetSource:
+        return self.sources[self.default]
+
+    def names(self) -> List[str]:
+        return list(self.sources)
+
+    def get(self, name: str) -> DatasetSource:
+        if name not in self.sources:
+            raise KeyError(
+                f"Dataset '{name}' não encontrado. Disponíveis: {', '.join(self.sources)}"
+            )
+        return self.sources[name]
+
+    def referenced_sources(self, query: str) -> List[str]:
+        """Fontes do catálogo citadas em uma consulta SQL."""
+        return [
+            name
+            for name in self.sources
+            if re.search(rf"\b{re.escape(name)}\b", query, re.IGNORECASE)
+        ]
+
+    def profile(self, name: str, connection) -> DatasetProfile:
+        """
+        Perfil da fonte, calculado no primeiro uso e reaproveitado enquanto os arquivos não mudarem.
+
+        Args:
+            name: Nome da fonte
+            connection: Conexão do DuckDB usada para o cálculo
+
+        Returns:
+            DatasetProfile da fonte
+        """
+        source = self.get(name)
+        signature = source.signature()
+        with self._lock:
+            cached = self._profiles.get(name)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        # Varredura completa fora do lock: outras fontes (e sessões) não esperam
+        profile = DatasetProfile.from_duckdb(
+            connection, source.source_sql, self.normalizer
+        )
+        with self._lock:
+            self._profiles[name] = (signature, profile)
+        return profile
+
+    def normalized_lookup(self, name: str, connection) -> Dict[str, Dict[Any, str]]:
+        """
+        Valores distintos das colunas de texto com sua forma normalizada (em cache).
+
+        Args:
+            name: Nome da fonte
+            connection: Conexão do DuckDB usada para o cálculo
+
+        Returns:
+            Dicionário coluna -> {valor original: valor normalizado}
+        """
+        source = self.get(name)
+        profile = self.profile(name, connection)
+        signature = source.signature()
+        with self._lock:
+            cached = self._lookups.get(name)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        lookup = {}
+        for column in profile.text_columns:
+            values = connection.execute(
+                f'SELECT DISTINCT "{column}" FROM {source.source_sql} '
+                f'WHERE "{column}" IS NOT NULL'
+            ).fetchall()
+            lookup[column] = {
+                value: self.normalizer.normalize_text(value) for (value,) in values
+            }
+        with self._lock:
+            self._lookups[name] = (signature, lookup)
+        return lookup
+
+    def describe(self, name: str, connection) -> str:
+        """Descrição textual da fonte para o modelo (perfil e valores normalizados)."""
+        source = self.get(name)
+        profile = self.profile(name, connection)
+        lookup = self.normalized_lookup(name, connection)
+
+        lines = [
+            f"Dataset: {source.name} ({source.description})",
+            f"Arquivo(s): {source.path}",
+            f"Linhas: {profile.n_rows} | Colunas: {len(profile.columns)}",
+            "",
+            "Tipos de dados:",
+            profile.dtypes_text,
+            "",
+            "Estatísticas:",
+            profile.describe_text,
+        ]
+        for column, values in lookup.items():
+            normalized = sorted(set(values.values()) - {""})
+            if len(normalized) <= MAX_LISTED_VALUES:
+                lines.append(
+                    f"Valores normalizados de {column}: {', '.join(normalized)}"
+                )
+            else:
+                lines.append(f"{column}: {len(normalized)} valores distintos")
+        return "\n".join(lines)
+
+
+class CatalogSession:
+    """Registro preguiçoso das fontes do catálogo em uma conexão do DuckDB."""
+
+    def __init__(self, catalog: DatasetCatalog, connection_provider):
+        """
+        Args:
+            catalog: Catálogo de fontes
+            connection_provider: Função que retorna a conexão do DuckDB do agente
+        """
+        self.catalog = catalog
+        self.connection_provider = connection_provider
+        self.registered: Set[str] = set()
+
+    def mark_registered(self, name: str):
+        """Indica que a fonte já foi criada por outro caminho (ex: tabela principal)."""
+        self.registered.add(name)
+
+    def ensure(self, name: str):
+        """Cria a view da fonte na conexão, se ainda não existir."""
+        if name in self.registered:
+            return
+        source = self.catalog.get(name)
+        self.connection_provider().execute(
+            f"CREATE OR REPLACE VIEW {source.name} AS SELECT * FROM {source.source_sql}"
+        )
+        self.registered.add(name)
+
+    def ensure_for_query(self, query: str) -> List[str]:
+        """
+        Registra as fontes citadas na consulta antes da execução.
+
+        Returns:
+            Fontes registradas nesta chamada
+        """
+        new_sources = [
+            name
+            for name in self.catalog.referenced_sources(query)
+            if name not in self.registered
+        ]
+        for name in new_sources:
+            self.ensure(name)
+        return new_sources
+
+
+_catalog_cache: Dict[str, Tuple[float, DatasetCatalog]] = {}
+_catalog_lock = threading.Lock()
+
+
+def load_catalog(path: Optional[str] = None) -> DatasetCatalog:
+    """
+    Carrega o catálogo configurado (AGENT_DATASET_CATALOG), reaproveitando a
+    instância enquanto o arquivo não mudar para compartilhar os perfis em cache.
+
+    Args:
+        path: Caminho do YAML (padrão: AGENT_DATASET_CATALOG ou data/catalog.yaml)
+
+    Returns:
+        Instância de DatasetCatalog
+    """
+    path = path or os.getenv("AGENT_DATASET_CATALOG", DEFAULT_CATALOG_PATH)
+    with _catalog_lock:
+        if not os.path.exists(path):
+            if "" not in _catalog_cache:
+                source = DatasetSource("dados_comerciais", **DEFAULT_SOURCE)
+                _catalog_cache[""] = (
+                    0.0,
+                    DatasetCatalog({source.name: source}, source.name),
+                )
+            return _catalog_cache[""][1]
+
+        mtime = os.path.getmtime(path)
+        cached = _catalog_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = (mtime, DatasetCatalog.from_yaml(path))
+            _catalog_cache[path] = cached
+        return cached[1]
@@ -0,0 +1,296 @@
+"""
+Módulo de perfil do dataset usado na construção do prompt do agente.
+Permite gerar o mesmo resumo a partir de um DataFrame pandas ou diretamente
+do DuckDB, sem carregar o dataset inteiro em memória. As estatísticas numéricas
+podem ser combinadas incrementalmente quando novas linhas são ingeridas.
+"""
+
+import math
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from text_normalizer import TextNormalizer
+
+NUMERIC_TYPES = (
+    "TINYINT",
+    "SMALLINT",
+    "INTEGER",
+    "BIGINT",
+    "HUGEINT",
+    "UTINYINT",
+    "USMALLINT",
+    "UINTEGER",
+    "UBIGINT",
+    "FLOAT",
+    "DOUBLE",
+    "DECIMAL",
+)
+
+
+class DatasetProfile:
+    """Resumo do dataset (tamanho, colunas, amostras e estatísticas)."""
+
+    def __init__(
+        self,
+        n_rows: int,
+        columns: List[str],
+        text_columns: List[str],
+        head_text: str,
+        head_normalized_text: str,
+        describe_text: str,
+        dtypes_text: str,
+        numeric_stats: Optional[Dict[str, Dict[str, float]]] = None,
+        fingerprint: str = "",
+        quartiles: Optional[Dict[str, List[float]]] = None,
+    ):
+        self.n_rows = n_rows
+        self.columns = columns
+        self.text_columns = text_columns
+        self.head_text = head_text
+        self.head_normalized_text = head_normalized_text
+        self.describe_text = describe_text
+        self.dtypes_text = dtypes_text
+        # Estatísticas combináveis por coluna numérica: count, mean, m2, min, max
+        self.numeric_stats = numeric_stats or {}
+        # Quartis (25%, 50%, 75%) por coluna numérica, recalculados a cada ingestão
+        self.quartiles = quartiles or {}
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_dataframe(
+        cls,
+        df: pd.DataFrame,
+        df_normalized: pd.DataFrame,
+        text_columns: List[str],
+    ) -> "DatasetProfile":
+        """
+        Cria o perfil a partir de DataFrames já carregados em memória.
+
+        Args:
+            df: DataFrame original
+            df_normalized: DataFrame com colunas de texto normalizadas
+            text_columns: Colunas de texto normalizadas
+
+        Returns:
+            Instância de DatasetProfile
+        """
+        describe = df.describe()
+        numeric_stats = {
+            column: {
+                "count": float(describe.at["count", column]),
+                "mean": float(describe.at["mean", column]),
+                "m2": float(describe.at["std", column]) ** 2
+                * max(float(describe.at["count", column]) - 1, 0),
+                "min": float(describe.at["min", column]),
+                "max": float(describe.at["max", column]),
+            }
+            for column in describe.columns
+        }
+        return cls(
+            n_rows=len(df),
+            columns=df.columns.tolist(),
+            text_columns=text_columns,
+            head_text=df.head().to_string(),
+            head_normalized_text=(
+                df_normalized[text_columns].head().to_string()
+                if text_columns
+                else "Nenhuma coluna de texto para normalizar"
+            ),
+            describe_text=describe.to_string(),
+            dtypes_text=df.dtypes.to_string(),
+            numeric_stats=numeric_stats,
+            quartiles={
+                column: [float(describe.at[q, column]) for q in ("25%", "50%", "75%")]
+                for column in describe.columns
+            },
+        )
+
+    @classmethod
+    def from_duckdb(
+        cls,
+        connection,
+        source_sql: str,
+        normalizer: Optional[TextNormalizer] = None,
+        sample_size: int = 100,
+    ) -> "DatasetProfile":
+        """
+        Cria o perfil consultando o DuckDB, lendo apenas agregados e pequenas amostras.
+
+        Args:
+            connection: Conexão do DuckDB
+            source_sql: Expressão de origem dos dados (ex: read_parquet('...'))
+            normalizer: Normalizador de texto (opcional)
+            sample_size: Número de linhas usadas para identificar colunas de texto
+
+        Returns:
+            Instância de DatasetProfile
+        """
+        normalizer = normalizer or TextNormalizer()
+
+        n_rows = connection.execute(f"SELECT COUNT(*) FROM {source_sql}").fetchone()[0]
+        sample = connection.execute(
+            f"SELECT * FROM {source_sql} LIMIT {sample_size}"
+        ).df()
+        text_columns = normalizer.identify_text_columns(sample)
+        head = sample.head()
+
+        # SUMMARIZE calcula as estatísticas em streaming, sem materializar os dados
+        summary = connection.execute(f"SUMMARIZE SELECT * FROM {source_sql}").df()
+        numeric_summary = summary[
+            summary["column_type"].str.upper().str.startswith(NUMERIC_TYPES)
+        ]
+        describe = numeric_summary.set_index("column_name")[
+            ["count", "avg", "std", "min", "q25", "q50", "q75", "max"]
+        ].T
+
+        return cls(
+            n_rows=n_rows,
+            columns=sample.columns.tolist(),
+            text_columns=text_columns,
+            head_text=head.to_string(),
+            head_normalized_text=(
+                normalizer.normalize_dataframe(head, text_columns)[
+                    text_columns
+                ].to_string()
+                if text_columns
+                else "Nenhuma coluna de texto para normalizar"
+            ),
+            describe_text=describe.to_string(),
+            dtypes_text=summary.set_index("column_name")["column_type"].to_string(),
+            numeric_stats=cls.numeric_stats_from_duckdb(connection, source_sql),
+            quartiles={
+                column: [float(describe.at[q, column]) for q in ("q25", "q50", "q75")]
+                for column in describe.columns
+                if describe.at["q25", column] is not None
+            },
+        )
+
+    @staticmethod
+    def numeric_stats_from_duckdb(
+        connection, source_sql: str
+    ) -> Dict[str, Dict[str, float]]:
+        """
+        Calcula estatísticas combináveis (count, mean, m2, min, max) das colunas numéricas.
+
+        Args:
+            connection: Conexão do DuckDB
+            source_sql: Expressão de origem dos dados (tabela, view ou read_parquet)
+
+        Returns:
+            Dicionário coluna -> estatísticas
+        """
+        columns = [
+            row[0]
+            for row in connection.execute(
+                f"DESCRIBE SELECT * FROM {source_sql}"
+            ).fetchall()
+            if row[1].upper().startswith(NUMERIC_TYPES)
+        ]
+        if not columns:
+            return {}
+
+        aggregates = ", ".join(
+            f'COUNT("{c}"), AVG("{c}"), VAR_POP("{c}") * COUNT("{c}"), MIN("{c}"), MAX("{c}")'
+            for c in columns
+        )
+        values = connection.execute(f"SELECT {aggregates} FROM {source_sql}").fetchone()
+
+        stats = {}
+        for i, column in enumerate(columns):
+            count, mean, m2, minimum, maximum = values[i * 5 : i * 5 + 5]
+            if count:
+                stats[column] = {
+                    "count": float(count),
+                    "mean": float(mean),
+                    "m2": float(m2 or 0.0),
+                    "min": float(minimum),
+                    "max": float(maximum),
+                }
+        return stats
+
+    @staticmethod
+    def quartiles_from_duckdb(
+        connection, source_sql: str, columns: List[str]
+    ) -> Dict[str, List[float]]:
+        """
+        Calcula os quartis aproximados (como no SUMMARIZE) das colunas numéricas.
+
+        Args:
+            connection: Conexão do DuckDB
+            source_sql: Expressão de origem dos dados (tabela, view ou read_parquet)
+            columns: Colunas numéricas
+
+        Returns:
+            Dicionário coluna -> [25%, 50%, 75%]
+        """
+        if not columns:
+            return {}
+        aggregates = ", ".join(
+            f'approx_quantile("{c}", [0.25, 0.5, 0.75])' for c in columns
+        )
+        values = connection.execute(f"SELECT {aggregates} FROM {source_sql}").fetchone()
+        return {
+            column: [float(q) for q in quartiles]
+            for column, quartiles in zip(columns, values)
+            if quartiles and None not in quartiles
+        }
+
+    def merge_numeric_stats(
+        self,
+        batch_stats: Dict[str, Dict[str, float]],
+        batch_rows: int,
+        quartiles: Optional[Dict[str, List[float]]] = None,
+    ):
+        """
+        Combina as estatísticas de um lote de linhas novas com as atuais
+        (algoritmo paralelo de Chan para média e variância).
+
+        Args:
+            batch_stats: Estatísticas do lote (ver `numeric_stats_from_duckdb`)
+            batch_rows: Número de linhas do lote
+            quartiles: Quartis recalculados sobre o dataset completo (ver
+                `quartiles_from_duckdb`); sem eles o resumo omite os quartis
+        """
+        self.n_rows += batch_rows
+        for column, new in batch_stats.items():
+            current = self.numeric_stats.get(column)
+            if not current or not current["count"]:
+                self.numeric_stats[column] = dict(new)
+                continue
+
+            count = current["count"] + new["count"]
+            delta = new["mean"] - current["mean"]
+            self.numeric_stats[column] = {
+                "count": count,
+                "mean": current["mean"] + delta * new["count"] / count,
+                "m2": current["m2"]
+                + new["m2"]
+                + delta**2 * current["count"] * new["count"] / count,
+                "min": min(current["min"], new["min"]),
+                "max": max(current["max"], new["max"]),
+            }
+
+        # Quartis não são combináveis: só são exibidos se foram recalculados
+        self.quartiles = quartiles or {}
+        self.describe_text = self._render_describe()
+
+    def _render_describe(self) -> str:
+        """Monta o resumo estatístico a partir das estatísticas combináveis."""
+        rows = {}
+        for column, stats in self.numeric_stats.items():
+            std = (
+                math.sqrt(stats["m2"] / (stats["count"] - 1))
+                if stats["count"] > 1
+                else float("nan")
+            )
+            rows[column] = {
+                "count": stats["count"],
+                "mean": stats["mean"],
+                "std": std,
+                "min": stats["min"],
+            }
+            if column in self.quartiles:
+                rows[column].update(zip(("25%", "50%", "75%"), self.quartiles[column]))
+            rows[column]["max"] = stats["max"]
+        return pd.DataFrame(rows).to_string()
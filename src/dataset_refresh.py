@@ -0,0 +1,421 @@
+"""
+Módulo de atualização incremental do dataset.
+Detecta novos arquivos Parquet ou row groups acrescentados a arquivos conhecidos,
+insere apenas as linhas novas no DuckDB, normaliza apenas os valores de texto
+inéditos e atualiza o perfil e a impressão digital (fingerprint) do dataset.
+"""
+
+import glob
+import hashlib
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from dataset_profile import DatasetProfile
+from text_normalizer import TextNormalizer
+
+
+def _concat_tables(tables: List[pa.Table]) -> pa.Table:
+    """Concatena tabelas Arrow promovendo schemas compatíveis (ex: colunas nulas)."""
+    # `promote_options` existe a partir do pyarrow 14; antes o argumento era `promote`
+    if int(pa.__version__.split(".")[0]) >= 14:
+        return pa.concat_tables(tables, promote_options="default")
+    return pa.concat_tables(tables, promote=True)
+
+
+class ParquetFileState:
+    """Estado conhecido de um arquivo Parquet já ingerido."""
+
+    def __init__(
+        self,
+        size: int,
+        mtime_ns: int,
+        row_group_rows: List[int],
+        row_group_digests: Optional[List[str]] = None,
+    ):
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.row_group_rows = row_group_rows
+        # Resumo dos metadados de cada row group (tamanhos, offsets e estatísticas)
+        self.row_group_digests = row_group_digests or []
+
+    @property
+    def rows(self) -> int:
+        return sum(self.row_group_rows)
+
+
+class RefreshResult:
+    """Resumo de uma execução de refresh."""
+
+    def __init__(
+        self,
+        new_files: Optional[List[str]] = None,
+        appended_files: Optional[List[str]] = None,
+        new_rows: int = 0,
+        new_distinct_values: int = 0,
+        rebuilt: bool = False,
+        fingerprint: str = "",
+    ):
+        self.new_files = new_files or []
+        self.appended_files = appended_files or []
+        self.new_rows = new_rows
+        self.new_distinct_values = new_distinct_values
+        self.rebuilt = rebuilt
+        self.fingerprint = fingerprint
+
+    @property
+    def changed(self) -> bool:
+        return self.new_rows > 0 or self.rebuilt
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "new_files": self.new_files,
+            "appended_files": self.appended_files,
+            "new_rows": self.new_rows,
+            "new_distinct_values": self.new_distinct_values,
+            "rebuilt": self.rebuilt,
+            "fingerprint": self.fingerprint,
+        }
+
+
+class IncrementalIngestor:
+    """Mantém a tabela do DuckDB sincronizada com os arquivos Parquet de origem."""
+
+    def __init__(
+        self,
+        base_path: str,
+        incremental_glob: Optional[str] = None,
+        table_name: str = "dados_comerciais",
+        materialized: bool = True,
+        normalizer: Optional[TextNormalizer] = None,
+        text_columns: Optional[List[str]] = None,
+    ):
+        """
+        Inicializa o ingestor.
+
+        Args:
+            base_path: Arquivo Parquet principal do dataset
+            incremental_glob: Padrão dos arquivos adicionais (ex: data/raw/incremental/*.parquet)
+            table_name: Tabela (ou view, no modo de memória limitada) do DuckDB
+            materialized: True se a tabela é materializada (INSERT); False para view
+            normalizer: Normalizador de texto
+            text_columns: Colunas de texto normalizadas
+        """
+        self.base_path = base_path
+        self.incremental_glob = incremental_glob
+        self.table_name = table_name
+        self.materialized = materialized
+        self.normalizer = normalizer or TextNormalizer()
+        self.text_columns = text_columns or []
+        self.files: Dict[str, ParquetFileState] = {}
+        # Cache valor original -> valor normalizado por coluna de texto
+        self.normalized_values: Dict[str, Dict[Any, str]] = {
+            column: {} for column in self.text_columns
+        }
+
+    @classmethod
+    def from_env(
+        cls, base_path: str, incremental_glob: Optional[str] = None, **kwargs
+    ) -> "IncrementalIngestor":
+        """
+        Cria o ingestor a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_INCREMENTAL_GLOB: padrão dos arquivos Parquet adicionais
+                (tem precedência sobre o padrão declarado no catálogo)
+
+        Args:
+            base_path: Arquivo Parquet principal do dataset
+            incremental_glob: Padrão declarado no catálogo de datasets (opcional)
+
+        Returns:
+            Instância de IncrementalIngestor
+        """
+        return cls(
+            base_path,
+            incremental_glob=os.getenv(
+                "AGENT_INCREMENTAL_GLOB",
+                incremental_glob or "data/raw/incremental/*.parquet",
+            ),
+            **kwargs,
+        )
+
+    @property
+    def fingerprint(self) -> str:
+        """Impressão digital do estado dos arquivos ingeridos."""
+        digest = hashlib.sha1()
+        for path in sorted(self.files):
+            state = self.files[path]
+            digest.update(
+                f"{path}:{state.size}:{state.mtime_ns}:{state.row_group_rows}".encode()
+            )
+        return digest.hexdigest()[:16]
+
+    def source_paths(self) -> List[str]:
+        """Arquivos de origem atuais: o arquivo principal e os incrementais."""
+        paths = [self.base_path]
+        if self.incremental_glob:
+            paths += [
+                path
+                for path in sorted(glob.glob(self.incremental_glob))
+                if os.path.abspath(path) != os.path.abspath(self.base_path)
+            ]
+        return paths
+
+    def snapshot(self, paths: Optional[List[str]] = None):
+        """
+        Registra o estado atual dos arquivos já carregados na tabela.
+
+        Args:
+            paths: Arquivos já ingeridos (padrão: apenas o arquivo principal)
+        """
+        for path in paths or [self.base_path]:
+            self.files[path] = self._read_state(path)
+
+    def seed_normalized_values(self, df: pd.DataFrame, df_normalized: pd.DataFrame):
+        """
+        Preenche o cache de normalização com os pares já calculados na carga inicial.
+
+        Args:
+            df: DataFrame original
+            df_normalized: DataFrame com as colunas de texto normalizadas
+        """
+        for column in self.text_columns:
+            pairs = pd.DataFrame(
+                {"original": df[column], "normalized": df_normalized[column]}
+            ).drop_duplicates("original")
+            self.normalized_values[column] = dict(
+                zip(pairs["original"], pairs["normalized"])
+            )
+
+    def detect_changes(self) -> Dict[str, Any]:
+        """
+        Compara os arquivos de origem com o estado conhecido.
+
+        Returns:
+            Dicionário com "new" (arquivo -> estado), "appended"
+            (arquivo -> (estado, primeiro row group novo)) e "rewritten" (arquivos)
+        """
+        changes = {"new": {}, "appended": {}, "rewritten": []}
+        for path in self.source_paths():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            known = self.files.get(path)
+            if known and (known.size, known.mtime_ns) == (
+                stat.st_size,
+                stat.st_mtime_ns,
+            ):
+                continue
+
+            state = self._read_state(path)
+            if known is None:
+                changes["new"][path] = state
+            elif (
+                state.size > known.size
+                and len(state.row_group_digests) > len(known.row_group_digests)
+                and state.row_group_digests[: len(known.row_group_digests)]
+                == known.row_group_digests
+            ):
+                # O arquivo só cresceu e os row groups existentes estão intactos
+                # (mesmos metadados e estatísticas): apenas os novos são lidos
+                changes["appended"][path] = (state, len(known.row_group_rows))
+            else:
+                # Qualquer outra mudança (mesmo com o mesmo número de linhas) pode
+                # ter alterado linhas já ingeridas
+                changes["rewritten"].append(path)
+
+        # Arquivos removidos também exigem reconstrução
+        for path in self.files:
+            if not os.path.exists(path):
+                changes["rewritten"].append(path)
+        return changes
+
+    def refresh(
+        self,
+        connection,
+        profile: Optional[DatasetProfile] = None,
+        df_normalized: Optional[pd.DataFrame] = None,
+    ) -> Tuple[RefreshResult, Optional[pd.DataFrame]]:
+        """
+        Ingere as mudanças detectadas na tabela do DuckDB.
+
+        Args:
+            connection: Conexão do DuckDB do agente
+            profile: Perfil do dataset a atualizar incrementalmente (opcional)
+            df_normalized: DataFrame normalizado em memória (modo padrão, opcional)
+
+        Returns:
+            Tupla (RefreshResult, df_normalized atualizado)
+        """
+        changes = self.detect_changes()
+        result = RefreshResult()
+
+        if changes["rewritten"]:
+            # Arquivos reescritos ou removidos não permitem ingestão parcial
+            return self._rebuild(connection, profile, df_normalized, result)
+
+        batches = []
+        for path, state in changes["new"].items():
+            batches.append(pq.read_table(path))
+            self.files[path] = state
+            result.new_files.append(path)
+        for path, (state, first_new) in changes["appended"].items():
+            if len(state.row_group_rows) > first_new:
+                parquet_file = pq.ParquetFile(path)
+                batches.append(
+                    parquet_file.read_row_groups(
+                        list(range(first_new, len(state.row_group_rows)))
+                    )
+                )
+                result.appended_files.append(path)
+            self.files[path] = state
+
+        batches = [batch for batch in batches if batch.num_rows > 0]
+        if batches:
+            new_rows = _concat_tables(batches)
+            connection.register("refresh_new_rows", new_rows)
+            try:
+                self._append(connection, "refresh_new_rows")
+                if profile is not None:
+                    batch_stats = DatasetProfile.numeric_stats_from_duckdb(
+                        connection, "refresh_new_rows"
+                    )
+                    profile.merge_numeric_stats(
+                        batch_stats,
+                        new_rows.num_rows,
+                        quartiles=DatasetProfile.quartiles_from_duckdb(
+                            connection,
+                            self.table_name,
+                            list(profile.numeric_stats or batch_stats),
+                        ),
+                    )
+            finally:
+                connection.unregister("refresh_new_rows")
+            result.new_rows = new_rows.num_rows
+
+            new_df = new_rows.to_pandas()
+            result.new_distinct_values = self._update_normalized_values(new_df)
+            if df_normalized is not None:
+                df_normalized = pd.concat(
+                    [df_normalized, self._normalize_new_rows(new_df)],
+                    ignore_index=True,
+                )
+
+        result.fingerprint = self.fingerprint
+        if profile is not None:
+            profile.fingerprint = result.fingerprint
+        return result, df_normalized
+
+    def _append(self, connection, source_name: str):
+        """Acrescenta as linhas novas à tabela (ou redefine a view sobre os arquivos)."""
+        if not self.materialized:
+            # No modo de memória limitada a view lê os arquivos diretamente
+            self._create_view(connection)
+            return
+        connection.execute(
+            f"INSERT INTO {self.table_name} BY NAME SELECT * FROM {source_name}"
+        )
+
+    def _create_view(self, connection):
+        """Cria a view do modo de memória limitada sobre todos os arquivos conhecidos."""
+        paths = ", ".join(f"'{path}'" for path in sorted(self.files))
+        connection.execute(
+            f"CREATE OR REPLACE VIEW {self.table_name} AS "
+            f"SELECT * FROM read_parquet([{paths}], union_by_name = true)"
+        )
+
+    def _rebuild(
+        self,
+        connection,
+        profile: Optional[DatasetProfile],
+        df_normalized: Optional[pd.DataFrame],
+        result: RefreshResult,
+    ) -> Tuple[RefreshResult, Optional[pd.DataFrame]]:
+        """Reconstrói a tabela a partir de todos os arquivos (fallback)."""
+        self.files = {}
+        self.snapshot([path for path in self.source_paths() if os.path.exists(path)])
+        if self.materialized:
+            paths = ", ".join(f"'{path}'" for path in sorted(self.files))
+            connection.execute(
+                f"CREATE OR REPLACE TABLE {self.table_name} AS "
+                f"SELECT * FROM read_parquet([{paths}], union_by_name = true)"
+            )
+        else:
+            self._create_view(connection)
+
+        if df_normalized is not None:
+            df_normalized = self._normalize_new_rows(
+                connection.execute(f"SELECT * FROM {self.table_name}").df()
+            )
+
+        result.rebuilt = True
+        result.fingerprint = self.fingerprint
+        if profile is not None:
+            rebuilt_profile = DatasetProfile.from_duckdb(
+                connection, self.table_name, self.normalizer
+            )
+            profile.__dict__.update(rebuilt_profile.__dict__)
+            profile.fingerprint = result.fingerprint
+        return result, df_normalized
+
+    def _update_normalized_values(self, new_df: pd.DataFrame) -> int:
+        """Normaliza apenas os valores de texto ainda não vistos; retorna quantos eram inéditos."""
+        new_values = 0
+        for column in self.text_columns:
+            if column not in new_df.columns:
+                continue
+            cache = self.normalized_values.setdefault(column, {})
+            for value in new_df[column].dropna().unique():
+                if value not in cache:
+                    cache[value] = self.normalizer.normalize_text(value)
+                    new_values += 1
+        return new_values
+
+    def _normalize_new_rows(self, new_df: pd.DataFrame) -> pd.DataFrame:
+        """Aplica a normalização às linhas novas usando o cache de valores."""
+        self._update_normalized_values(new_df)
+        normalized = new_df.copy()
+        for column in self.text_columns:
+            if column in normalized.columns:
+                normalized[column] = (
+                    normalized[column].map(self.normalized_values[column]).fillna("")
+                )
+        return normalized
+
+    def _read_state(self, path: str) -> ParquetFileState:
+        """Lê tamanho, data de modificação e row groups de um arquivo Parquet."""
+        stat = os.stat(path)
+        metadata = pq.ParquetFile(path).metadata
+        row_groups = [metadata.row_group(i) for i in range(metadata.num_row_groups)]
+        return ParquetFileState(
+            size=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            row_group_rows=[row_group.num_rows for row_group in row_groups],
+            row_group_digests=[
+                self._row_group_digest(row_group) for row_group in row_groups
+            ],
+        )
+
+    @staticmethod
+    def _row_group_digest(row_group) -> str:
+        """Resumo dos metadados de um row group (lido do rodapé, sem ler os dados)."""
+        digest = hashlib.sha1(
+            f"{row_group.num_rows}:{row_group.total_byte_size}".encode()
+        )
+        for i in range(row_group.num_columns):
+            column = row_group.column(i)
+            stats = column.statistics
+            digest.update(
+                f"{column.path_in_schema}:{column.file_offset}:"
+                f"{column.total_compressed_size}:"
+                f"{stats.min if stats is not None and stats.has_min_max else ''}:"
+                f"{stats.max if stats is not None and stats.has_min_max else ''}:"
+                f"{stats.null_count if stats is not None else ''}".encode()
+            )
+        return digest.hexdigest()
@@ -0,0 +1,470 @@
+"""
+Módulo de backends de execução do agente.
+No modo "inline" as perguntas rodam na thread do Streamlit; no modo "pooled"
+são enviadas a um pool de processos, com afinidade por sessão, que compartilham
+um banco DuckDB somente leitura e caches mapeados em memória (mmap). Quando os
+dados mudam, os workers passam para a nova versão sem serem recriados.
+"""
+
+import json
+import multiprocessing
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import time
+import zlib
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+SHARED_DB_ENV = "AGENT_SHARED_DB_DIR"
+
+
+class SharedDatabase:
+    """Banco DuckDB e caches preparados uma vez e lidos pelos workers (somente leitura)."""
+
+    DB_FILE = "dados.duckdb"
+    PROFILE_FILE = "profile.pkl"
+    NORMALIZED_FILE = "normalized.arrow"
+    MANIFEST_FILE = "manifest.json"
+
+    def __init__(self, directory: str):
+        """
+        Args:
+            directory: Diretório de uma versão preparada (contém o banco e os caches)
+        """
+        self.directory = directory
+
+    @property
+    def db_path(self) -> str:
+        return os.path.join(self.directory, self.DB_FILE)
+
+    @classmethod
+    def attached(cls) -> Optional["SharedDatabase"]:
+        """Versão compartilhada configurada para este processo (workers do pool), se houver."""
+        directory = os.getenv(SHARED_DB_ENV)
+        return cls(directory) if directory else None
+
+    @classmethod
+    def prepare(cls, root: str) -> "SharedDatabase":
+        """
+        Prepara (ou reaproveita) a versão compartilhada correspondente aos arquivos atuais.
+
+        Args:
+            root: Diretório raiz das versões preparadas
+
+        Returns:
+            SharedDatabase da versão atual
+        """
+        import duckdb
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.ipc as ipc
+
+        from approximate_query import StratifiedSample
+        from dataset_catalog import load_catalog
+        from dataset_profile import DatasetProfile
+        from dataset_refresh import IncrementalIngestor
+        from text_normalizer import TextNormalizer
+
+        catalog = load_catalog()
+        source = catalog.default_source
+        ingestor = IncrementalIngestor.from_env(
+            source.path,
+            incremental_glob=source.incremental_glob,
+            table_name=source.name,
+        )
+        paths = [path for path in ingestor.source_paths() if os.path.exists(path)]
+        ingestor.snapshot(paths)
+        fingerprint = ingestor.fingerprint
+
+        directory = os.path.join(root, fingerprint)
+        shared = cls(directory)
+        if os.path.exists(os.path.join(directory, cls.MANIFEST_FILE)):
+            return shared
+
+        # Construir em diretório temporário e publicar com rename atômico
+        os.makedirs(root, exist_ok=True)
+        build_dir = tempfile.mkdtemp(prefix=f".{fingerprint}-", dir=root)
+        connection = duckdb.connect(os.path.join(build_dir, cls.DB_FILE))
+        try:
+            files = ", ".join(f"'{os.path.abspath(path)}'" for path in paths)
+            connection.execute(
+                f"CREATE TABLE {source.name} AS "
+                f"SELECT * FROM read_parquet([{files}], union_by_name = true)"
+            )
+
+            # Demais fontes do catálogo como views (workers não podem criar objetos)
+            for name in catalog.names():
+                if name != source.name:
+                    other = catalog.get(name)
+                    connection.execute(
+                        f"CREATE VIEW {other.name} AS SELECT * FROM "
+                        f"read_parquet('{os.path.abspath(other.path)}', union_by_name = true)"
+                    )
+
+            sample = StratifiedSample.from_env(source.name)
+            if sample is not None:
+                sample.build(connection, fingerprint)
+
+            normalizer = TextNormalizer()
+            profile = DatasetProfile.from_duckdb(connection, source.name, normalizer)
+            profile.fingerprint = fingerprint
+            with open(os.path.join(build_dir, cls.PROFILE_FILE), "wb") as f:
+                pickle.dump(profile, f)
+
+            # Colunas de texto normalizadas (cada valor distinto é normalizado uma vez)
+            columns: Dict[str, Any] = {}
+            for column in profile.text_columns:
+                values = connection.execute(
+                    f'SELECT "{column}" FROM {source.name}'
+                ).fetch_arrow_table()[column]
+                distinct = pc.unique(values).drop_null()
+                normalized = pa.array(
+                    [
+                        normalizer.normalize_text(value)
+                        for value in distinct.to_pylist()
+                    ],
+                    pa.string(),
+                )
+                columns[column] = pc.fill_null(
+                    pc.take(normalized, pc.index_in(values, value_set=distinct)), ""
+                )
+            table = pa.table(columns)
+            with ipc.new_file(
+                os.path.join(build_dir, cls.NORMALIZED_FILE), table.schema
+            ) as writer:
+                writer.write_table(table)
+        finally:
+            connection.close()
+
+        with open(os.path.join(build_dir, cls.MANIFEST_FILE), "w") as f:
+            json.dump({"fingerprint": fingerprint, "files": paths}, f)
+        try:
+            os.rename(build_dir, directory)
+        except OSError:
+            # Outro processo publicou a mesma versão primeiro
+            shutil.rmtree(build_dir, ignore_errors=True)
+        return shared
+
+    def load_profile(self):
+        """Carrega o perfil do dataset preparado."""
+        with open(os.path.join(self.directory, self.PROFILE_FILE), "rb") as f:
+            return pickle.load(f)
+
+    def load_normalized(self):
+        """
+        Abre as colunas normalizadas via mmap (páginas compartilhadas entre os workers).
+
+        Returns:
+            DataFrame pandas com tipos Arrow, sem cópia dos dados mapeados
+        """
+        import pandas as pd
+        import pyarrow as pa
+        import pyarrow.ipc as ipc
+
+        source = pa.memory_map(os.path.join(self.directory, self.NORMALIZED_FILE))
+        table = ipc.open_file(source).read_all()
+        return table.to_pandas(types_mapper=pd.ArrowDtype)
+
+
+class AgentRunResult:
+    """Resposta de uma execução (compatível com o uso de `response.content`)."""
+
+    def __init__(self, content: str, debug_info: Optional[Dict[str, Any]] = None):
+        self.content = content
+        self.debug_info = debug_info or {}
+
+
+# Sessões mantidas em cada processo worker (TTL e limite LRU, ver session_manager.py)
+_worker_sessions = None
+
+
+def _worker_init(shared_dir: str):
+    """Inicializa um processo worker apontando para a versão compartilhada."""
+    os.environ[SHARED_DB_ENV] = shared_dir
+
+
+def _worker_session_manager():
+    """Gerenciador de sessões do processo worker (criado no primeiro uso)."""
+    global _worker_sessions
+    if _worker_sessions is None:
+        from chatbot_agents import create_agent
+        from session_manager import SessionManager
+
+        _worker_sessions = SessionManager.from_env(
+            lambda session_id, debug_mode=False: create_agent(
+                session_user_id=session_id, debug_mode=debug_mode
+            )[0]
+        )
+    return _worker_sessions
+
+
+def _worker_run(
+    session_id: str, question: str, debug_mode: bool, profile: bool = False
+) -> Dict[str, Any]:
+    """Executa uma pergunta no agente da sessão dentro do processo worker."""
+    manager = _worker_session_manager()
+    with manager.use(session_id, debug_mode=debug_mode) as session:
+        agent = session.agent
+        response = agent.run(question, debug_mode=debug_mode, profile=profile)
+        result = {
+            "content": response.content,
+            "debug_info": agent.debug_info,
+            "fingerprint": agent.dataset_fingerprint,
+        }
+    # Métricas das sessões do worker ao fim de cada tarefa (guardadas pelo backend)
+    result["metrics"] = manager.metrics()
+    return result
+
+
+def _worker_switch(shared_dir: str) -> int:
+    """
+    Passa o processo worker para uma nova versão compartilhada sem recriá-lo:
+    as sessões vivas trocam de banco mantendo memória e contexto.
+
+    Returns:
+        Número de sessões atualizadas
+    """
+    os.environ[SHARED_DB_ENV] = shared_dir
+    if _worker_sessions is None:
+        return 0
+    shared = SharedDatabase(shared_dir)
+    sessions = list(_worker_sessions.sessions.values())
+    for entry in sessions:
+        entry.agent.attach_shared_database(shared)
+    return len(sessions)
+
+
+def _worker_clear_session(session_id: str):
+    """Limpa a memória e o debug de uma sessão no processo worker."""
+    _worker_session_manager().clear_session(session_id)
+
+
+class ProcessPoolBackend:
+    """Executa as perguntas em processos worker com afinidade por sessão."""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        shared_root: Optional[str] = None,
+        refresh_interval: float = 60.0,
+    ):
+        """
+        Args:
+            workers: Número de processos worker
+            shared_root: Diretório das versões do banco compartilhado
+            refresh_interval: Intervalo (s) para verificar se os dados mudaram
+        """
+        self.workers = workers
+        self.shared_root = shared_root or os.path.join(
+            tempfile.gettempdir(), "agent_shared_db"
+        )
+        self.refresh_interval = refresh_interval
+        self.shared: Optional[SharedDatabase] = None
+        self.executors: List[ProcessPoolExecutor] = []
+        self.last_refresh: Optional[float] = None
+        # Métricas de sessões informadas por cada worker ao fim da última tarefa
+        self.worker_metrics: Dict[int, Dict[str, Any]] = {}
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._refresh_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Prepara o banco compartilhado e inicia os workers."""
+        with self._lock:
+            shared = SharedDatabase.prepare(self.shared_root)
+            context = multiprocessing.get_context("spawn")
+            self.shared = shared
+            self.executors = [
+                ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=context,
+                    initializer=_worker_init,
+                    initargs=(shared.directory,),
+                )
+                for _ in range(self.workers)
+            ]
+            self.last_refresh = time.monotonic()
+            # Versões de execuções anteriores não são usadas por nenhum worker
+            self._remove_old_versions()
+
+    def refresh_if_stale(self) -> Optional[threading.Thread]:
+        """
+        Verifica em segundo plano se os arquivos de dados mudaram e, se sim, passa
+        os workers para a nova versão compartilhada. Não bloqueia quem chama: as
+        perguntas continuam na versão atual enquanto a nova é preparada.
+
+        Returns:
+            Thread da verificação iniciada (None se não era hora de verificar)
+        """
+        if self.refresh_interval <= 0 or (
+            self.last_refresh is not None
+            and time.monotonic() - self.last_refresh < self.refresh_interval
+        ):
+            return None
+        # Lock próprio: `_lock` fica ocupado durante a troca, que espera as
+        # perguntas em execução nos workers
+        with self._refresh_lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return None
+            self.last_refresh = time.monotonic()
+            self._refresh_thread = threading.Thread(
+                target=self._refresh, name="shared-db-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+            return self._refresh_thread
+
+    def _refresh(self):
+        """Prepara a versão atual dos dados (fora do lock) e troca os workers."""
+        try:
+            shared = SharedDatabase.prepare(self.shared_root)
+        except Exception:
+            # Falha ao ler os arquivos novos: segue na versão atual e tenta de novo
+            # no próximo intervalo
+            return
+        if shared.directory == self.shared.directory:
+            return
+        with self._lock:
+            # Cada worker executa uma tarefa por vez: a troca acontece entre
+            # perguntas, e os processos (e as sessões em memória) são mantidos
+            switches = [
+                executor.submit(_worker_switch, shared.directory)
+                for executor in self.executors
+            ]
+            for switch in switches:
+                switch.result()
+            self.shared = shared
+            self._remove_old_versions()
+
+    def _remove_old_versions(self):
+        """Apaga as versões compartilhadas que nenhum worker usa mais."""
+        if not os.path.isdir(self.shared_root):
+            return
+        for name in os.listdir(self.shared_root):
+            path = os.path.join(self.shared_root, name)
+            # Diretórios ".<fingerprint>-*" são versões em construção
+            if name.startswith(".") or path == self.shared.directory:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+
+    def worker_for(self, session_id: str) -> int:
+        """Índice do worker responsável pela sessão (estável entre chamadas)."""
+        return zlib.crc32(session_id.encode("utf-8")) % self.workers
+
+    def submit(
+        self,
+        session_id: str,
+        question: str,
+        debug_mode: bool = False,
+        profile: bool = False,
+    ) -> Future:
+        """Envia uma pergunta ao worker da sessão."""
+        if not self.executors:
+            self.start()
+        self.refresh_if_stale()
+        index = self.worker_for(session_id)
+        future = self.executors[index].submit(
+            _worker_run, session_id, question, debug_mode, profile
+        )
+        future.add_done_callback(lambda done: self._store_metrics(index, done))
+        return future
+
+    def _store_metrics(self, index: int, future: Future):
+        """Guarda as métricas que o worker devolveu junto com a resposta."""
+        if not future.cancelled() and future.exception() is None:
+            self.worker_metrics[index] = future.result()["metrics"]
+
+    def run(
+        self,
+        session_id: str,
+        question: str,
+        debug_mode: bool = False,
+        profile: bool = False,
+    ):
+        """Executa uma pergunta e aguarda a resposta."""
+        result = self.submit(session_id, question, debug_mode, profile).result()
+        return AgentRunResult(result["content"], result["debug_info"])
+
+    def clear_session(self, session_id: str):
+        """Limpa a memória e o debug da sessão no seu worker."""
+        if self.executors:
+            executor = self.executors[self.worker_for(session_id)]
+            executor.submit(_worker_clear_session, session_id).result()
+
+    def session_metrics(self) -> List[Dict[str, Any]]:
+        """
+        Métricas de sessões de cada worker, como informadas ao fim da última tarefa
+        dele (sem esperar pelas perguntas em execução nos workers).
+        """
+        return [self.worker_metrics[index] for index in sorted(self.worker_metrics)]
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False)
+        self.executors = []
+
+
+class PooledAgent:
+    """Interface de agente (run/debug_info) que delega a execução ao pool de processos."""
+
+    def __init__(self, backend: ProcessPoolBackend, session_id: str):
+        self.backend = backend
+        self.session_user_id = session_id
+        self.debug_info: Dict[str, Any] = {}
+
+    @property
+    def dataset_fingerprint(self) -> str:
+        shared = self.backend.shared
+        return os.path.basename(shared.directory) if shared else ""
+
+    def run(
+        self, query: str, debug_mode: bool = False, profile: bool = False, **kwargs
+    ) -> AgentRunResult:
+        result = self.backend.run(self.session_user_id, query, debug_mode, profile)
+        self.debug_info = result.debug_info
+        return result
+
+    def clear_session(self):
+        self.backend.clear_session(self.session_user_id)
+        self.debug_info = {}
+
+
+def execution_mode() -> str:
+    """
+    Modo de execução configurado.
+
+    Variáveis suportadas:
+        AGENT_EXECUTION_MODE: "inline" (padrão) ou "pooled"
+
+    Returns:
+        "inline" ou "pooled"
+    """
+    mode = os.getenv("AGENT_EXECUTION_MODE", "inline").strip().lower()
+    if mode not in ("inline", "pooled"):
+        raise ValueError(
+            f"AGENT_EXECUTION_MODE inválido: {mode!r} (use 'inline' ou 'pooled')"
+        )
+    return mode
+
+
+def create_process_pool_backend() -> ProcessPoolBackend:
+    """
+    Cria o backend de processos a partir das variáveis de ambiente.
+
+    Variáveis suportadas:
+        AGENT_POOL_WORKERS: número de processos worker
+        AGENT_POOL_SHARED_DIR: diretório do banco DuckDB compartilhado
+        AGENT_REFRESH_INTERVAL_S: intervalo de verificação de novos dados
+
+    Returns:
+        Instância de ProcessPoolBackend (workers iniciados)
+    """
+    backend = ProcessPoolBackend(
+        workers=int(os.getenv("AGENT_POOL_WORKERS", "2")),
+        shared_root=os.getenv("AGENT_POOL_SHARED_DIR"),
+        refresh_interval=float(os.getenv("AGENT_REFRESH_INTERVAL_S", "60")),
+    )
+    backend.start()
+    return backend
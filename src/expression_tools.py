@@ -0,0 +1,215 @@
+"""
+Módulo de avaliação de expressões numéricas para o agente.
+Avalia várias fórmulas de uma vez com NumPy, de forma segura (sem executar
+código Python arbitrário), e devolve os resultados formatados no padrão brasileiro.
+"""
+
+import ast
+import operator
+from functools import reduce
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+from agno.tools import Toolkit
+
+# Operadores aritméticos permitidos nas fórmulas
+BINARY_OPERATORS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS: Dict[type, Callable[[Any], Any]] = {
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+
+def _aggregate(function: Callable[[Any], Any], elementwise: Callable[..., Any]):
+    """Agrega um vetor (1 argumento) ou combina valores elemento a elemento (2+ argumentos)."""
+
+    def apply(*args):
+        if len(args) == 1:
+            return function(args[0])
+        return reduce(elementwise, args)
+
+    return apply
+
+
+def _single(function: Callable[[Any], Any]):
+    """Restringe uma função NumPy a um único argumento (evita uso acidental de `axis`)."""
+
+    def apply(values):
+        return function(values)
+
+    return apply
+
+
+# Funções vetorizadas disponíveis nas fórmulas
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "abs": np.abs,
+    "sqrt": np.sqrt,
+    "exp": np.exp,
+    "log": np.log,
+    "log10": np.log10,
+    "round": lambda value, decimals=0: np.round(value, int(decimals)),
+    "sum": _single(np.sum),
+    "mean": _single(np.mean),
+    "median": _single(np.median),
+    "min": _aggregate(np.min, np.minimum),
+    "max": _aggregate(np.max, np.maximum),
+    "std": _single(np.std),
+    "var": _single(np.var),
+    "cumsum": _single(np.cumsum),
+    "count": _single(np.size),
+    "percent": lambda part, total: np.divide(part, total) * 100,
+    "share": lambda values: np.divide(values, np.sum(values)) * 100,
+    "growth": lambda new, old: np.divide(np.subtract(new, old), old) * 100,
+}
+
+# Expoente máximo aceito para evitar cálculos descontrolados
+MAX_EXPONENT = 100
+
+
+def format_number(value: Any, decimals: int = 2) -> str:
+    """
+    Formata um número (ou lista de números) no padrão brasileiro (1.234.567,89).
+
+    Args:
+        value: Escalar ou array NumPy
+        decimals: Casas decimais
+
+    Returns:
+        Valor formatado
+    """
+    array = np.asarray(value)
+    if array.ndim > 0:
+        return "[" + "; ".join(format_number(v, decimals) for v in array.ravel()) + "]"
+
+    number = float(array)
+    if not np.isfinite(number):
+        return "indefinido"
+
+    # Valores pequenos (ex: participações abaixo de 1%) recebem mais casas decimais
+    if 0 < abs(number) < 1:
+        decimals = max(decimals, min(6, int(-np.floor(np.log10(abs(number)))) + 1))
+    formatted = f"{number:,.{decimals}f}"
+    return formatted.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+class SafeExpressionEvaluator:
+    """Avaliador de expressões aritméticas restrito a operações numéricas."""
+
+    def __init__(self, variables: Dict[str, Any]):
+        self.variables = variables
+
+    def evaluate(self, expression: str) -> Any:
+        """
+        Avalia uma expressão aritmética.
+
+        Args:
+            expression: Expressão a avaliar (ex: "total_sp / total * 100")
+
+        Returns:
+            Resultado escalar ou array NumPy
+        """
+        tree = ast.parse(expression.strip(), mode="eval")
+        return self._eval(tree.body)
+
+    def _eval(self, node: ast.AST) -> Any:
+        if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+            return np.float64(node.value)
+
+        if isinstance(node, ast.Name):
+            if node.id not in self.variables:
+                raise NameError(f"variável '{node.id}' não definida")
+            return self.variables[node.id]
+
+        if isinstance(node, ast.List):
+            return np.array([self._eval(element) for element in node.elts], float)
+
+        if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+            left = self._eval(node.left)
+            right = self._eval(node.right)
+            if isinstance(node.op, ast.Pow) and np.any(np.abs(right) > MAX_EXPONENT):
+                raise ValueError(f"expoente maior que {MAX_EXPONENT}")
+            return BINARY_OPERATORS[type(node.op)](left, right)
+
+        if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+            return UNARY_OPERATORS[type(node.op)](self._eval(node.operand))
+
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name):
+            if node.func.id not in FUNCTIONS or node.keywords:
+                raise ValueError(f"função '{node.func.id}' não permitida")
+            return FUNCTIONS[node.func.id](*[self._eval(arg) for arg in node.args])
+
+        if isinstance(node, ast.Subscript):
+            target = np.asarray(self._eval(node.value))
+            index = node.slice
+            if isinstance(index, ast.Constant) and isinstance(index.value, int):
+                return target[index.value]
+            raise ValueError("apenas índices inteiros são permitidos")
+
+        raise ValueError(f"operação não permitida: {type(node).__name__}")
+
+
+class ExpressionTools(Toolkit):
+    """Toolkit para cálculos numéricos em lote sobre resultados de consultas."""
+
+    def __init__(self, decimals: int = 2, **kwargs):
+        """
+        Inicializa o toolkit.
+
+        Args:
+            decimals: Casas decimais usadas na formatação dos resultados
+        """
+        self.decimals = decimals
+        super().__init__(
+            name="expression_tools", tools=[self.evaluate_expressions], **kwargs
+        )
+
+    def evaluate_expressions(
+        self,
+        formulas: List[str],
+        inputs: Optional[Dict[str, Union[float, List[float]]]] = None,
+    ) -> str:
+        """Avalia várias fórmulas numéricas em uma única chamada (percentuais, razões, médias, variações).
+        Cada fórmula tem o formato "nome = expressão" e pode usar as entradas e os resultados das fórmulas anteriores.
+        Operadores: + - * / // % **. Funções: abs, sqrt, exp, log, log10, round, sum, mean, median, min, max,
+        std, var, cumsum, count, percent(parte, total), share(valores), growth(novo, antigo).
+        Listas são tratadas como vetores (operações elemento a elemento).
+
+        :param formulas: Lista de fórmulas, ex: ["total = sum(vendas)", "part_sp = percent(vendas_sp, total)"]
+        :param inputs: Valores nomeados (números ou listas de números), ex: {"vendas": [10.5, 20.0], "vendas_sp": 10.5}
+        :return: Resultado de cada fórmula formatado no padrão brasileiro
+        """
+        variables: Dict[str, Any] = {}
+        for name, value in (inputs or {}).items():
+            variables[name] = np.asarray(value, dtype=float)
+
+        evaluator = SafeExpressionEvaluator(variables)
+        lines = []
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            for i, formula in enumerate(formulas, 1):
+                name, expression = self._split_formula(formula, i)
+                try:
+                    value = evaluator.evaluate(expression)
+                except Exception as e:
+                    lines.append(f"{name} = ERRO: {e}")
+                    continue
+                variables[name] = value
+                lines.append(f"{name} = {format_number(value, self.decimals)}")
+
+        return "\n".join(lines)
+
+    def _split_formula(self, formula: str, position: int):
+        """Separa o nome do resultado e a expressão de uma fórmula."""
+        if "=" in formula:
+            name, expression = formula.split("=", 1)
+            if name.strip().isidentifier() and not expression.startswith("="):
+                return name.strip(), expression
+        return f"resultado_{position}", formula
@@ -0,0 +1,239 @@
+"""
+Servidor local compatível com a API de chat da OpenAI, para testes sem custo.
+Responde a POST /v1/chat/completions (com ou sem streaming) e permite simular
+latência, falhas transitórias e travamentos do provedor.
+"""
+
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+DEFAULT_REPLY = "Resposta simulada pelo servidor local."
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clientes que desistem (timeout, hedging) fecham a conexão antes da resposta
+        pass
+
+
+class FakeOpenAIServer:
+    """Servidor HTTP em thread que imita o endpoint de chat completions."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_s: float = 0.0,
+        latency_jitter_s: float = 0.0,
+        failure_rate: float = 0.0,
+        failure_status: int = 503,
+        stall_rate: float = 0.0,
+        stall_s: float = 30.0,
+        responder: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        seed: Optional[int] = None,
+    ):
+        """
+        Args:
+            host: Endereço de escuta
+            port: Porta (0 escolhe uma porta livre)
+            latency_s: Latência base de cada resposta
+            latency_jitter_s: Variação aleatória somada à latência
+            failure_rate: Fração das requisições respondidas com erro
+            failure_status: Status HTTP das falhas simuladas
+            stall_rate: Fração das requisições que travam por `stall_s`
+            stall_s: Duração do travamento simulado
+            responder: Função que recebe o corpo da requisição e devolve a
+                mensagem do assistente ({"content": ..., "tool_calls": ...})
+            seed: Semente do sorteio de latência/falhas
+        """
+        self.latency_s = latency_s
+        self.latency_jitter_s = latency_jitter_s
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.stall_rate = stall_rate
+        self.stall_s = stall_s
+        self.responder = responder or (lambda body: {"content": DEFAULT_REPLY})
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.failures = 0
+        self.stalls = 0
+        self._lock = threading.Lock()
+        self._server = _QuietHTTPServer((host, port), self._handler_class())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-openai", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _draw(self) -> str:
+        """Sorteia o comportamento da próxima requisição (ok, falha ou travamento)."""
+        with self._lock:
+            self.requests += 1
+            draw = self.random.random()
+            if draw < self.failure_rate:
+                self.failures += 1
+                return "failure"
+            if draw < self.failure_rate + self.stall_rate:
+                self.stalls += 1
+                return "stall"
+            return "ok"
+
+    def _delay(self) -> float:
+        with self._lock:
+            return self.latency_s + self.random.uniform(0, self.latency_jitter_s)
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict[str, Any]):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                outcome = server._draw()
+                if outcome == "stall":
+                    time.sleep(server.stall_s)
+                else:
+                    time.sleep(server._delay())
+                if outcome == "failure":
+                    self._send_json(
+                        server.failure_status,
+                        {
+                            "error": {
+                                "message": "falha simulada",
+                                "type": "server_error",
+                            }
+                        },
+                    )
+                    return
+
+                message = {"role": "assistant", "content": None}
+                message.update(server.responder(body))
+                completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+                usage = {
+                    "prompt_tokens": 10,
+                    "completion_tokens": 10,
+                    "total_tokens": 20,
+                }
+                if body.get("stream"):
+                    self._stream(completion_id, body.get("model", ""), message, usage)
+                    return
+                self._send_json(
+                    200,
+                    {
+                        "id": completion_id,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": body.get("model", ""),
+                        "choices": [
+                            {"index": 0, "message": message, "finish_reason": "stop"}
+                        ],
+                        "usage": usage,
+                    },
+                )
+
+            def _stream(self, completion_id, model, message, usage):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                chunks = [
+                    {"role": "assistant", "content": message.get("content") or ""}
+                ]
+                if message.get("tool_calls"):
+                    chunks.append(
+                        {
+                            "tool_calls": [
+                                dict(call, index=i)
+                                for i, call in enumerate(message["tool_calls"])
+                            ]
+                        }
+                    )
+                for delta in chunks:
+                    payload = {
+                        "id": completion_id,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [
+                            {"index": 0, "delta": delta, "finish_reason": None}
+                        ],
+                    }
+                    self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+                final = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                    "usage": usage,
+                }
+                self.wfile.write(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+                self.wfile.write(b"data: [DONE]\n\n")
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Servidor OpenAI simulado")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--stall-rate", type=float, default=0.0)
+    parser.add_argument("--stall", type=float, default=30.0)
+    args = parser.parse_args()
+
+    fake = FakeOpenAIServer(
+        port=args.port,
+        latency_s=args.latency,
+        latency_jitter_s=args.jitter,
+        failure_rate=args.failure_rate,
+        stall_rate=args.stall_rate,
+        stall_s=args.stall,
+    )
+    print(f"Servidor simulado em {fake.base_url} (use OPENAI_BASE_URL)")
+    try:
+        fake._server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
@@ -0,0 +1,474 @@
+"""
+Módulo de resiliência das chamadas ao modelo.
+Envolve o cliente OpenAI com prazo por chamada, novas tentativas com backoff
+exponencial e jitter em erros transitórios, requisições duplicadas (hedging)
+após um limite de latência e circuit breaker, registrando métricas do processo.
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from itertools import chain
+from typing import Any, Callable, Dict, Optional
+
+from agno.exceptions import ModelProviderError
+from agno.models.openai import OpenAIChat
+from openai import APIConnectionError, APIStatusError
+
+from request_profiler import profiled
+
+# Status HTTP tratados como transitórios (nova tentativa e falha do circuit breaker)
+TRANSIENT_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+# Contadores expostos nas métricas
+COUNTERS = (
+    "calls",
+    "successes",
+    "failures",
+    "attempts",
+    "retries",
+    "hedges",
+    "hedge_wins",
+    "deadline_exceeded",
+    "short_circuited",
+    "breaker_opened",
+)
+
+
+class LlmDeadlineExceeded(ModelProviderError):
+    """A chamada ao modelo não concluiu dentro do prazo total."""
+
+    def __init__(self, message: str, model_name=None, model_id=None):
+        super().__init__(message, 504, model_name, model_id)
+
+
+class CircuitOpenError(ModelProviderError):
+    """O circuit breaker está aberto: o provedor falhou repetidamente."""
+
+    def __init__(self, message: str, model_name=None, model_id=None):
+        super().__init__(message, 503, model_name, model_id)
+
+
+def is_transient(error: BaseException) -> bool:
+    """Indica se o erro justifica uma nova tentativa (timeout, conexão, 429 ou 5xx)."""
+    # O agno envolve qualquer exceção do cliente em ModelProviderError (502 quando
+    # não há status HTTP): a classificação usa a causa original
+    if (
+        isinstance(error, ModelProviderError)
+        and not isinstance(error, (LlmDeadlineExceeded, CircuitOpenError))
+        and error.__cause__ is not None
+    ):
+        return is_transient(error.__cause__)
+    if isinstance(error, (TimeoutError, ConnectionError, APIConnectionError)):
+        return True
+    if isinstance(error, (APIStatusError, ModelProviderError)):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    return False
+
+
+@dataclass
+class ResiliencePolicy:
+    """Parâmetros de prazo, novas tentativas, hedging e circuit breaker."""
+
+    attempt_timeout_s: float = 30.0
+    deadline_s: float = 90.0
+    max_retries: int = 2
+    backoff_base_s: float = 0.5
+    backoff_max_s: float = 8.0
+    hedge_after_s: Optional[float] = None
+    breaker_failure_threshold: int = 5
+    breaker_reset_s: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> "ResiliencePolicy":
+        """
+        Cria a política a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_LLM_TIMEOUT_S: tempo máximo de cada tentativa
+            AGENT_LLM_DEADLINE_S: prazo total da chamada (todas as tentativas)
+            AGENT_LLM_MAX_RETRIES: novas tentativas em erros transitórios
+            AGENT_LLM_BACKOFF_S: base do backoff exponencial (com jitter)
+            AGENT_LLM_HEDGE_AFTER_MS: dispara uma requisição duplicada após este
+                tempo sem resposta (0 desativa)
+            AGENT_LLM_BREAKER_FAILURES: falhas consecutivas que abrem o circuito
+            AGENT_LLM_BREAKER_RESET_S: tempo até testar o provedor novamente
+
+        Returns:
+            Instância de ResiliencePolicy
+        """
+        hedge_after_ms = float(os.getenv("AGENT_LLM_HEDGE_AFTER_MS", "0"))
+        return cls(
+            attempt_timeout_s=float(os.getenv("AGENT_LLM_TIMEOUT_S", "30")),
+            deadline_s=float(os.getenv("AGENT_LLM_DEADLINE_S", "90")),
+            max_retries=int(os.getenv("AGENT_LLM_MAX_RETRIES", "2")),
+            backoff_base_s=float(os.getenv("AGENT_LLM_BACKOFF_S", "0.5")),
+            hedge_after_s=hedge_after_ms / 1000 if hedge_after_ms > 0 else None,
+            breaker_failure_threshold=int(os.getenv("AGENT_LLM_BREAKER_FAILURES", "5")),
+            breaker_reset_s=float(os.getenv("AGENT_LLM_BREAKER_RESET_S", "30")),
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes da nova tentativa (full jitter sobre o backoff exponencial)."""
+        return random.uniform(
+            0, min(self.backoff_max_s, self.backoff_base_s * (2**attempt))
+        )
+
+
+class CircuitBreaker:
+    """Circuit breaker com estados fechado, aberto e meio-aberto."""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_s: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_s = reset_s
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Indica se uma chamada pode ser feita (no meio-aberto, apenas uma sonda)."""
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_s:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    return False
+                self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> bool:
+        """
+        Registra uma falha transitória.
+
+        Returns:
+            True se esta falha abriu o circuito
+        """
+        with self._lock:
+            self.consecutive_failures += 1
+            self._probe_in_flight = False
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class ResilienceMetrics:
+    """Contadores e latências das chamadas ao modelo (seguro entre threads)."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.counters: Dict[str, int] = {name: 0 for name in COUNTERS}
+        self.latencies = deque(maxlen=max_samples)
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: int = 1):
+        with self._lock:
+            self.counters[name] += value
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counters)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Contadores e percentis de latência (ms) das chamadas bem-sucedidas."""
+        with self._lock:
+            snapshot: Dict[str, Any] = dict(self.counters)
+            latencies = sorted(self.latencies)
+        for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95), ("p99_ms", 0.99)):
+            snapshot[name] = (
+                round(
+                    latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000,
+                    1,
+                )
+                if latencies
+                else None
+            )
+        return snapshot
+
+
+class LlmResilience:
+    """Executa chamadas ao modelo com prazo, novas tentativas, hedging e circuit breaker."""
+
+    def __init__(self, policy: Optional[ResiliencePolicy] = None):
+        self.policy = policy or ResiliencePolicy()
+        self.breaker = CircuitBreaker(
+            self.policy.breaker_failure_threshold, self.policy.breaker_reset_s
+        )
+        self.metrics = ResilienceMetrics()
+
+    def __deepcopy__(self, memo):
+        # Estado compartilhado do processo: cópias do modelo (ex: memória do agente)
+        # continuam usando o mesmo breaker e as mesmas métricas
+        return self
+
+    def call(self, fn: Callable[[], Any], model_name=None, model_id=None) -> Any:
+        """
+        Executa `fn` respeitando a política.
+
+        Args:
+            fn: Chamada ao provedor (sem argumentos)
+            model_name: Nome do modelo (para as mensagens de erro)
+            model_id: Identificador do modelo (para as mensagens de erro)
+
+        Returns:
+            Resultado da primeira tentativa bem-sucedida
+        """
+        policy = self.policy
+        self.metrics.increment("calls")
+        start = time.monotonic()
+        deadline = start + policy.deadline_s
+        # Threads próprias da chamada (tentativa e requisição duplicada): nenhuma
+        # espera em fila compartilhada consome o prazo
+        executor = ThreadPoolExecutor(
+            max_workers=1 if policy.hedge_after_s is None else 2,
+            thread_name_prefix="llm-call",
+        )
+        try:
+            return self._call(executor, fn, start, deadline, model_name, model_id)
+        finally:
+            # Requisições ainda pendentes terminam sozinhas pelo timeout do cliente
+            executor.shutdown(wait=False)
+
+    def _call(
+        self,
+        executor: ThreadPoolExecutor,
+        fn: Callable[[], Any],
+        start: float,
+        deadline: float,
+        model_name,
+        model_id,
+    ) -> Any:
+        """Laço de tentativas de `call` sobre as threads da chamada."""
+        policy = self.policy
+        attempt = 0
+        while True:
+            if not self.breaker.allow():
+                self.metrics.increment("short_circuited")
+                self.metrics.increment("failures")
+                raise CircuitOpenError(
+                    "Provedor do modelo indisponível (circuit breaker aberto); "
+                    f"nova tentativa em até {policy.breaker_reset_s:.0f}s",
+                    model_name,
+                    model_id,
+                )
+            try:
+                result = self._attempt(executor, fn, deadline, model_name, model_id)
+            except Exception as error:
+                transient = is_transient(error)
+                if transient:
+                    if self.breaker.record_failure():
+                        self.metrics.increment("breaker_opened")
+                else:
+                    # Erro do pedido (ex: 400): o provedor está respondendo
+                    self.breaker.record_success()
+                delay = policy.backoff(attempt)
+                if (
+                    not transient
+                    or isinstance(error, LlmDeadlineExceeded)
+                    or attempt >= policy.max_retries
+                    or time.monotonic() + delay >= deadline
+                ):
+                    self.metrics.increment("failures")
+                    raise
+                self.metrics.increment("retries")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            self.metrics.increment("successes")
+            self.metrics.record_latency(time.monotonic() - start)
+            return result
+
+    def _attempt(
+        self,
+        executor: ThreadPoolExecutor,
+        fn: Callable[[], Any],
+        deadline: float,
+        model_name,
+        model_id,
+    ):
+        """Uma tentativa, com requisição duplicada se a primeira demorar."""
+        self.metrics.increment("attempts")
+        fn = profiled(fn)
+        primary = executor.submit(fn)
+        pending = {primary}
+        hedge_after = self.policy.hedge_after_s
+        if hedge_after is not None and time.monotonic() + hedge_after < deadline:
+            done, _ = wait(pending, timeout=hedge_after)
+            if not done:
+                self.metrics.increment("hedges")
+                pending.add(executor.submit(fn))
+
+        last_error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(
+                pending,
+                timeout=max(deadline - time.monotonic(), 0),
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        self.metrics.increment("hedge_wins")
+                    return future.result()
+                last_error = future.exception()
+
+        if not pending and last_error is not None:
+            raise last_error
+        self.metrics.increment("deadline_exceeded")
+        raise LlmDeadlineExceeded(
+            f"O modelo não respondeu em {self.policy.deadline_s:.0f}s",
+            model_name,
+            model_id,
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Métricas atuais com o estado do circuit breaker."""
+        snapshot = self.metrics.snapshot()
+        snapshot["breaker_state"] = self.breaker.state
+        return snapshot
+
+
+@dataclass
+class ResilientOpenAIChat(OpenAIChat):
+    """OpenAIChat cujas chamadas passam pela camada de resiliência."""
+
+    resilience: Optional[LlmResilience] = None
+
+    def _get_client_params(self) -> Dict[str, Any]:
+        client_params = super()._get_client_params()
+        if self.resilience is not None:
+            # O timeout do cliente é o prazo de cada tentativa; as novas tentativas
+            # ficam a cargo da camada de resiliência
+            client_params.setdefault(
+                "timeout", self.resilience.policy.attempt_timeout_s
+            )
+            client_params["max_retries"] = 0
+        return client_params
+
+    def invoke(self, *args, **kwargs):
+        invoke = super().invoke
+        if self.resilience is None:
+            return invoke(*args, **kwargs)
+        return self.resilience.call(lambda: invoke(*args, **kwargs), self.name, self.id)
+
+    def invoke_stream(self, *args, **kwargs):
+        invoke_stream = super().invoke_stream
+        if self.resilience is None:
+            yield from invoke_stream(*args, **kwargs)
+            return
+
+        def open_stream():
+            # A requisição só é feita ao consumir o primeiro chunk
+            stream = invoke_stream(*args, **kwargs)
+            first = next(stream, None)
+            return stream if first is None else chain([first], stream)
+
+        yield from self.resilience.call(open_stream, self.name, self.id)
+
+
+_resilience: Optional[LlmResilience] = None
+_resilience_lock = threading.Lock()
+
+
+def get_resilience() -> LlmResilience:
+    """Camada de resiliência do processo (breaker e métricas compartilhados entre sessões)."""
+    global _resilience
+    with _resilience_lock:
+        if _resilience is None:
+            _resilience = LlmResilience(ResiliencePolicy.from_env())
+        return _resilience
+
+
+def create_model(model_id: str) -> ResilientOpenAIChat:
+    """Cria o modelo OpenAI com a camada de resiliência do processo."""
+    return ResilientOpenAIChat(id=model_id, resilience=get_resilience())
+
+
+if __name__ == "__main__":
+    import sys
+
+    from agno.models.message import Message
+
+    from fake_openai_server import FakeOpenAIServer
+
+    # Verificação contra o servidor simulado: falhas transitórias, travamentos e breaker
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    policy = ResiliencePolicy(
+        attempt_timeout_s=2.0,
+        deadline_s=6.0,
+        max_retries=3,
+        backoff_base_s=0.05,
+        hedge_after_s=0.3,
+        breaker_failure_threshold=5,
+        breaker_reset_s=1.0,
+    )
+    with FakeOpenAIServer(
+        latency_s=0.05, failure_rate=0.2, stall_rate=0.1, stall_s=5.0, seed=7
+    ) as fake:
+        resilience = LlmResilience(policy)
+        model = ResilientOpenAIChat(
+            id="fake-model",
+            api_key="test",
+            base_url=fake.base_url,
+            resilience=resilience,
+        )
+        latencies = []
+        errors = 0
+        for i in range(n_calls):
+            start = time.monotonic()
+            try:
+                model.invoke([Message(role="user", content=f"pergunta {i}")])
+            except ModelProviderError:
+                errors += 1
+            latencies.append(time.monotonic() - start)
+        latencies.sort()
+        print(f"Chamadas: {n_calls} | erros: {errors}")
+        print(
+            f"p50: {latencies[len(latencies) // 2] * 1000:.0f}ms | "
+            f"máx: {latencies[-1] * 1000:.0f}ms | prazo: {policy.deadline_s:.0f}s"
+        )
+        print(f"Métricas: {resilience.snapshot()}")
+
+        # Provedor fora do ar: o circuito abre e as chamadas falham imediatamente
+        fake.failure_rate = 1.0
+        for _ in range(policy.breaker_failure_threshold + 2):
+            try:
+                model.invoke([Message(role="user", content="teste")])
+            except ModelProviderError:
+                pass
+        print(
+            f"Estado do breaker com o provedor fora do ar: {resilience.breaker.state}"
+        )
+
+        within_deadline = latencies[-1] <= policy.deadline_s + 0.5
+        breaker_opened = resilience.breaker.state == CircuitBreaker.OPEN
+        sys.exit(0 if within_deadline and breaker_opened else 1)
@@ -0,0 +1,462 @@
+"""
+Módulo de teste de carga com várias sessões simultâneas.
+Simula N analistas enviando perguntas de qa_test_data.json pelo mesmo caminho
+do app.py (gerenciador de sessões → create_agent → agent.run), contra o
+servidor OpenAI simulado e um dataset sintético, e relata vazão, percentis de
+latência, consultas DuckDB simultâneas e a evolução do RSS ao longo do teste.
+"""
+
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from memory_budget import current_rss_mb
+
+DEFAULT_QUESTIONS_PATH = "data/test_questions/qa_test_data.json"
+
+NUMERIC_COLUMNS = ("Valor_Vendido", "Qtd_Vendida", "Peso_Vendido", "Peso_Unitario")
+
+# Palavra-chave da pergunta -> agregação aplicada à coluna citada
+AGGREGATE_KEYWORDS = (
+    ("soma", "SUM({})"),
+    ("total", "SUM({})"),
+    ("medio", "AVG({})"),
+    ("media", "AVG({})"),
+    ("maximo", "MAX({})"),
+    ("minimo", "MIN({})"),
+    ("unicos", "COUNT(DISTINCT {})"),
+    ("nulo", "COUNT(*) FILTER (WHERE {} IS NULL)"),
+)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def load_questions(path: Optional[str] = None) -> List[str]:
+    """Perguntas do conjunto de QA (campo `pergunta`)."""
+    with open(path or DEFAULT_QUESTIONS_PATH, "r", encoding="utf-8") as f:
+        return [item["pergunta"] for item in json.load(f)]
+
+
+def synthesize_dataset(directory: str, rows: int = 200_000, seed: int = 42) -> str:
+    """
+    Gera um dataset sintético com o esquema de DadosComercial e o catálogo dele.
+
+    Args:
+        directory: Diretório de saída
+        rows: Número de linhas
+        seed: Semente do gerador aleatório do DuckDB
+
+    Returns:
+        Caminho do catálogo YAML (use em AGENT_DATASET_CATALOG)
+    """
+    import duckdb
+
+    os.makedirs(directory, exist_ok=True)
+    parquet_path = os.path.join(directory, "DadosComercial_sintetico.parquet")
+    connection = duckdb.connect()
+    try:
+        connection.execute(f"SELECT setseed({(seed % 1000) / 1000})")
+        connection.execute(f"""
+            COPY (
+                SELECT
+                    'Empresa ' || (range % 5)::VARCHAR AS Empresa,
+                    DATE '2023-01-01' + (range % 730)::INTEGER AS Data_Emissao,
+                    DATE '2023-01-05' + (range % 730)::INTEGER AS Data_Entrega,
+                    (range % 819)::BIGINT AS Cod_Produto,
+                    'fam' || (range % 40)::VARCHAR AS Cod_Familia_Produto,
+                    'Grupo ' || (range % 12)::VARCHAR AS Cod_Grupo_Produto,
+                    'Linha ' || (range % 6)::VARCHAR AS Cod_Linha_Produto,
+                    random() AS Peso_Unitario,
+                    'V' || (range % 150)::VARCHAR AS Cod_Vendedor,
+                    ['SP', 'RJ', 'MG', 'PR', 'RS', 'SC', 'BA', 'GO'][range % 8 + 1] AS Cod_Regiao_Vendedor,
+                    (range % 20000)::BIGINT AS Cod_Cliente,
+                    ['SP', 'RJ', 'MG', 'PR', 'RS', 'SC', 'BA', 'GO'][range % 8 + 1] AS UF_Cliente,
+                    ['São Paulo', 'Rio de Janeiro', 'Belo Horizonte', 'CURITIBA',
+                     'Porto Alegre', 'Florianópolis', 'Salvador', 'Goiânia'][range % 8 + 1] AS Municipio_Cliente,
+                    ['Indústria', 'Comércio', 'Serviços', 'Governo'][range % 4 + 1] AS Cod_Segmento_Cliente,
+                    random() * 1000 AS Valor_Vendido,
+                    random() * 100 AS Peso_Vendido,
+                    (random() * 500)::INTEGER AS Qtd_Vendida
+                FROM range({rows})
+            ) TO '{parquet_path}' (FORMAT PARQUET)
+            """)
+    finally:
+        connection.close()
+
+    catalog_path = os.path.join(directory, "catalog.yaml")
+    with open(catalog_path, "w", encoding="utf-8") as f:
+        f.write(
+            "default: dados_comerciais\n"
+            "datasets:\n"
+            "  dados_comerciais:\n"
+            "    description: Vendas sintéticas (teste de carga)\n"
+            f"    path: {parquet_path}\n"
+        )
+    return catalog_path
+
+
+def analyst_responder(table: str = "dados_comerciais") -> Callable[[Dict], Dict]:
+    """
+    Responder do servidor simulado que se comporta como o modelo: na primeira
+    rodada chama `run_query` com uma consulta derivada da pergunta e, depois do
+    resultado da ferramenta, devolve a resposta final.
+
+    Args:
+        table: Tabela consultada
+
+    Returns:
+        Função para o parâmetro `responder` de FakeOpenAIServer
+    """
+    from query_rewriter import fold
+
+    def respond(body: Dict[str, Any]) -> Dict[str, Any]:
+        messages = body.get("messages") or []
+        tools = {
+            tool.get("function", {}).get("name") for tool in body.get("tools") or []
+        }
+        if "run_query" not in tools:
+            # Chamadas auxiliares (ex: gerenciador de memórias do agno)
+            return {"content": "Resumo da conversa."}
+        if messages and messages[-1].get("role") == "tool":
+            result = str(messages[-1].get("content") or "").strip().splitlines()
+            return {"content": f"Resposta: {result[-1] if result else 'sem dados'}"}
+
+        question = next(
+            (
+                str(message.get("content"))
+                for message in reversed(messages)
+                if message.get("role") == "user"
+            ),
+            "",
+        )
+        folded = fold(question)[0]
+        column = next(
+            iter(re.findall(r"\b[A-Z][A-Za-z]*_[A-Za-z_]+\b", question)), None
+        )
+        if column is None or ("unicos" in folded and column not in NUMERIC_COLUMNS):
+            # Perguntas sem coluna ou de valores distintos: contagem agrupada
+            target = column or "UF_Cliente"
+            sql = f"SELECT {target}, COUNT(*) AS n FROM {table} GROUP BY 1 ORDER BY 2 DESC LIMIT 20"
+        else:
+            aggregate = next(
+                (
+                    template
+                    for keyword, template in AGGREGATE_KEYWORDS
+                    if keyword in folded
+                ),
+                "COUNT({})",
+            )
+            sql = f"SELECT {aggregate.format(column)} AS resultado FROM {table}"
+        uf = re.search(r"UF_Cliente\s*=\s*'([A-Z]{2})'", question)
+        if uf and " GROUP BY" not in sql:
+            sql += f" WHERE UF_Cliente = '{uf.group(1)}'"
+        return {
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": f"call_{abs(hash(sql)) % 10**8}",
+                    "type": "function",
+                    "function": {
+                        "name": "run_query",
+                        "arguments": json.dumps({"query": sql}),
+                    },
+                }
+            ],
+        }
+
+    return respond
+
+
+class LoadTestReport:
+    """Resultado do teste de carga."""
+
+    def __init__(self, sessions: int, duration_s: float):
+        self.sessions = sessions
+        self.duration_s = duration_s
+        self.latencies: List[float] = []
+        self.setup_times: List[float] = []
+        self.errors: List[str] = []
+        self.timeline: List[Dict[str, Any]] = []
+        # Consultas DuckDB do período: total, consulta x segundo, tempo ocupado e pico
+        self.duckdb: Dict[str, float] = {
+            "queries": 0,
+            "query_s": 0.0,
+            "busy_s": 0.0,
+            "max": 0,
+        }
+        self.llm: Dict[str, Any] = {}
+        self.session_metrics: Dict[str, Any] = {}
+
+    @property
+    def completed(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.completed / self.duration_s if self.duration_s else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        rss = [point["rss_mb"] for point in self.timeline if point["rss_mb"]]
+        return {
+            "sessions": self.sessions,
+            "duration_s": round(self.duration_s, 2),
+            "completed": self.completed,
+            "errors": len(self.errors),
+            "error_samples": self.errors[:5],
+            "throughput_qps": round(self.throughput, 3),
+            "latency_ms": {
+                name: (
+                    round(_percentile(self.latencies, q) * 1000, 1)
+                    if self.latencies
+                    else None
+                )
+                for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+            },
+            "session_setup_ms": {
+                "p50": (
+                    round(_percentile(self.setup_times, 0.5) * 1000, 1)
+                    if self.setup_times
+                    else None
+                ),
+                "max": (
+                    round(max(self.setup_times) * 1000, 1) if self.setup_times else None
+                ),
+            },
+            "duckdb_concurrency": {
+                "queries": self.duckdb["queries"],
+                "mean": (
+                    round(self.duckdb["query_s"] / self.duration_s, 2)
+                    if self.duration_s
+                    else 0.0
+                ),
+                "max": self.duckdb["max"],
+                "busy_pct": (
+                    round(100 * self.duckdb["busy_s"] / self.duration_s, 1)
+                    if self.duration_s
+                    else 0.0
+                ),
+            },
+            "rss_mb": {
+                "start": round(rss[0], 1) if rss else None,
+                "end": round(rss[-1], 1) if rss else None,
+                "peak": round(max(rss), 1) if rss else None,
+                "growth": round(rss[-1] - rss[0], 1) if rss else None,
+            },
+            "timeline": self.timeline,
+            "llm": self.llm,
+            "session_manager": self.session_metrics,
+        }
+
+    def summary(self) -> str:
+        """Resumo textual do teste."""
+        data = self.to_dict()
+        latency = data["latency_ms"]
+        duckdb = data["duckdb_concurrency"]
+        rss = data["rss_mb"]
+        lines = [
+            f"{data['sessions']} sessões | {data['completed']} perguntas em "
+            f"{data['duration_s']:.1f}s | {data['throughput_qps']:.2f} perguntas/s | "
+            f"erros: {data['errors']}",
+            f"Latência p50/p95/p99: {latency['p50']} / {latency['p95']} / {latency['p99']} ms "
+            f"(criação da sessão p50 {data['session_setup_ms']['p50']} ms)",
+            f"DuckDB: {duckdb['queries']} consultas | simultâneas: média {duckdb['mean']}, "
+            f"máx {duckdb['max']} | ocupado {duckdb['busy_pct']}% do tempo",
+            f"RSS: {rss['start']} → {rss['end']} MB (pico {rss['peak']} MB, "
+            f"crescimento {rss['growth']} MB)",
+        ]
+        for point in self.timeline:
+            lines.append(
+                f"  t={point['t_s']:6.1f}s  RSS {point['rss_mb']:8.1f} MB  "
+                f"concluídas {point['completed']:4d}  DuckDB máx {point['duckdb_max']}"
+            )
+        return "\n".join(lines)
+
+
+class LoadTest:
+    """Gera carga de várias sessões simultâneas sobre o agente."""
+
+    def __init__(
+        self,
+        sessions: int = 8,
+        questions_per_session: int = 5,
+        questions: Optional[List[str]] = None,
+        think_s: float = 0.0,
+        timeline_interval_s: float = 1.0,
+        seed: int = 42,
+    ):
+        """
+        Args:
+            sessions: Número de sessões (analistas) simultâneas
+            questions_per_session: Perguntas enviadas por sessão
+            questions: Perguntas sorteadas (padrão: qa_test_data.json)
+            think_s: Pausa entre perguntas da mesma sessão
+            timeline_interval_s: Intervalo dos pontos de RSS na linha do tempo
+            seed: Semente do sorteio das perguntas
+        """
+        self.sessions = sessions
+        self.questions_per_session = questions_per_session
+        self.questions = questions or load_questions()
+        self.think_s = think_s
+        self.timeline_interval_s = timeline_interval_s
+        self.seed = seed
+
+    def run(self) -> LoadTestReport:
+        """Executa o teste e devolve o relatório."""
+        # Mesmo caminho do app.py no modo "inline"
+        from chatbot_agents import create_agent
+        from llm_resilience import get_resilience
+        from query_profiler import get_query_activity
+        from session_manager import SessionManager
+
+        os.environ.setdefault("AGENT_MAX_SESSIONS", str(self.sessions))
+        manager = SessionManager.from_env(
+            lambda session_id: create_agent(session_user_id=session_id)
+        )
+        llm_before = get_resilience().metrics.counts()
+        # Contador incrementado em torno de cada consulta: pega também as rápidas
+        activity = get_query_activity()
+        duckdb_before = activity.snapshot()
+        activity.take_peak()
+
+        lock = threading.Lock()
+        stop = threading.Event()
+        report = LoadTestReport(self.sessions, 0.0)
+        session_threads: List[threading.Thread] = []
+
+        def session_loop(index: int):
+            rng = random.Random(self.seed + index)
+            session_id = f"load-{index}"
+            for _ in range(self.questions_per_session):
+                question = rng.choice(self.questions)
+                start = time.perf_counter()
+                try:
+                    with manager.use(session_id) as entry:
+                        ready = time.perf_counter()
+                        entry.agent.run(question)
+                        elapsed = time.perf_counter() - ready
+                    with lock:
+                        report.latencies.append(elapsed)
+                        if entry.requests == 1:
+                            report.setup_times.append(ready - start)
+                except Exception as e:
+                    with lock:
+                        report.errors.append(f"{type(e).__name__}: {e}")
+                if self.think_s:
+                    time.sleep(self.think_s)
+
+        def sampler():
+            while not stop.wait(self.timeline_interval_s):
+                with lock:
+                    completed = len(report.latencies)
+                # Pico de consultas simultâneas desde o ponto anterior
+                window_max = activity.take_peak()
+                report.duckdb["max"] = max(report.duckdb["max"], window_max)
+                report.timeline.append(
+                    {
+                        "t_s": round(time.perf_counter() - started, 2),
+                        "rss_mb": round(current_rss_mb() or 0.0, 1),
+                        "completed": completed,
+                        "duckdb_max": window_max,
+                        "live_threads": sum(
+                            thread.is_alive() for thread in session_threads
+                        ),
+                    }
+                )
+
+        session_threads.extend(
+            threading.Thread(target=session_loop, args=(i,), name=f"load-session-{i}")
+            for i in range(self.sessions)
+        )
+        started = time.perf_counter()
+        for thread in session_threads:
+            thread.start()
+        sampler_thread = threading.Thread(target=sampler, name="load-sampler")
+        sampler_thread.start()
+        for thread in session_threads:
+            thread.join()
+        report.duration_s = time.perf_counter() - started
+        duckdb_after = activity.snapshot()
+        stop.set()
+        sampler_thread.join()
+        window_max = activity.take_peak()
+        report.duckdb["max"] = max(report.duckdb["max"], window_max)
+        report.duckdb.update(
+            queries=duckdb_after["total"] - duckdb_before["total"],
+            query_s=duckdb_after["query_s"] - duckdb_before["query_s"],
+            busy_s=duckdb_after["busy_s"] - duckdb_before["busy_s"],
+        )
+        report.timeline.append(
+            {
+                "t_s": round(report.duration_s, 2),
+                "rss_mb": round(current_rss_mb() or 0.0, 1),
+                "completed": report.completed,
+                "duckdb_max": window_max,
+                "live_threads": 0,
+            }
+        )
+
+        llm_after = get_resilience().metrics.counts()
+        report.llm = {name: llm_after[name] - llm_before[name] for name in llm_after}
+        report.session_metrics = {
+            key: value for key, value in manager.metrics().items() if key != "sessions"
+        }
+        manager.shutdown()
+        return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from fake_openai_server import FakeOpenAIServer
+
+    parser = argparse.ArgumentParser(description="Teste de carga multi-sessão")
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--questions-per-session", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--think", type=float, default=0.0)
+    parser.add_argument("--questions", default=DEFAULT_QUESTIONS_PATH)
+    parser.add_argument("--output", help="Arquivo JSON com o relatório completo")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="load_test_")
+    os.environ["AGENT_DATASET_CATALOG"] = synthesize_dataset(work_dir, args.rows)
+
+    with FakeOpenAIServer(
+        latency_s=args.latency,
+        latency_jitter_s=args.jitter,
+        failure_rate=args.failure_rate,
+        responder=analyst_responder(),
+        seed=7,
+    ) as fake:
+        # O agente fala apenas com o servidor simulado
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        os.environ["OPENAI_API_KEY"] = "sk-load-test"
+        load_test = LoadTest(
+            sessions=args.sessions,
+            questions_per_session=args.questions_per_session,
+            questions=load_questions(args.questions),
+            think_s=args.think,
+        )
+        report = load_test.run()
+        print(report.summary())
+        print(f"Chamadas ao modelo: {report.llm}")
+        print(f"Requisições ao servidor simulado: {fake.requests}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report.to_dict(), f, ensure_ascii=False, indent=2)
+    sys.exit(1 if report.errors else 0)
@@ -0,0 +1,254 @@
+"""
+Módulo de orçamento de memória para execução em pods pequenos.
+Define o modo "bounded" (memória limitada), no qual o agente não mantém cópias
+pandas do dataset e o DuckDB trabalha com limite de memória e spill em disco.
+"""
+
+import os
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional
+
+
+def current_rss_mb() -> Optional[float]:
+    """
+    Retorna o RSS atual do processo em MB.
+
+    Returns:
+        RSS em MB ou None se a plataforma não expuser a informação
+    """
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+    try:
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # macOS reporta bytes, Linux reporta KB
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        return None
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Retorna o pico de RSS do processo em MB.
+
+    Returns:
+        Pico de RSS em MB ou None se a plataforma não expuser a informação
+    """
+    try:
+        import resource
+    except ImportError:
+        return current_rss_mb()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reporta bytes, Linux reporta KB
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class MemoryBudget:
+    """Configuração de orçamento de memória do agente e do DuckDB."""
+
+    def __init__(
+        self,
+        mode: str = "standard",
+        rss_budget_mb: int = 2048,
+        duckdb_memory_fraction: float = 0.6,
+        threads: Optional[int] = None,
+        temp_directory: Optional[str] = None,
+        max_result_rows: int = 500,
+        result_batch_size: int = 100,
+    ):
+        """
+        Inicializa o orçamento de memória.
+
+        Args:
+            mode: "standard" (comportamento original) ou "bounded"
+            rss_budget_mb: Orçamento total de RSS do processo em MB
+            duckdb_memory_fraction: Fração do orçamento reservada ao DuckDB
+            threads: Número de threads do DuckDB (None = padrão do DuckDB)
+            temp_directory: Diretório de spill do DuckDB
+            max_result_rows: Máximo de linhas devolvidas ao modelo por consulta
+            result_batch_size: Tamanho dos lotes lidos do cursor do DuckDB
+        """
+        self.mode = mode
+        self.rss_budget_mb = rss_budget_mb
+        self.duckdb_memory_fraction = duckdb_memory_fraction
+        self.threads = threads
+        self.temp_directory = temp_directory or os.path.join(
+            tempfile.gettempdir(), "agent_duckdb_spill"
+        )
+        self.max_result_rows = max_result_rows
+        self.result_batch_size = result_batch_size
+
+    @property
+    def bounded(self) -> bool:
+        """Indica se o modo de memória limitada está ativo."""
+        return self.mode == "bounded"
+
+    @property
+    def duckdb_memory_limit_mb(self) -> int:
+        """Limite de memória do DuckDB derivado do orçamento de RSS."""
+        return max(64, int(self.rss_budget_mb * self.duckdb_memory_fraction))
+
+    @classmethod
+    def from_env(cls) -> "MemoryBudget":
+        """
+        Cria o orçamento a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_MEMORY_MODE: "standard" ou "bounded"
+            AGENT_RSS_BUDGET_MB: orçamento de RSS em MB
+            AGENT_DUCKDB_MEMORY_FRACTION: fração do orçamento para o DuckDB
+            AGENT_DUCKDB_THREADS: threads do DuckDB
+            AGENT_DUCKDB_TEMP_DIR: diretório de spill
+            AGENT_MAX_RESULT_ROWS: linhas máximas por resultado de ferramenta
+
+        Returns:
+            Instância de MemoryBudget
+        """
+        threads = os.getenv("AGENT_DUCKDB_THREADS")
+        return cls(
+            mode=os.getenv("AGENT_MEMORY_MODE", "standard").strip().lower(),
+            rss_budget_mb=int(os.getenv("AGENT_RSS_BUDGET_MB", "2048")),
+            duckdb_memory_fraction=float(
+                os.getenv("AGENT_DUCKDB_MEMORY_FRACTION", "0.6")
+            ),
+            threads=int(threads) if threads else None,
+            temp_directory=os.getenv("AGENT_DUCKDB_TEMP_DIR"),
+            max_result_rows=int(os.getenv("AGENT_MAX_RESULT_ROWS", "500")),
+        )
+
+    def duckdb_config(self) -> Optional[Dict[str, Any]]:
+        """
+        Monta a configuração de conexão do DuckDB para o modo atual.
+
+        Returns:
+            Dicionário de configuração ou None no modo padrão
+        """
+        if not self.bounded:
+            return None
+
+        os.makedirs(self.temp_directory, exist_ok=True)
+        config = {
+            "memory_limit": f"{self.duckdb_memory_limit_mb}MB",
+            "temp_directory": self.temp_directory,
+            # Evita manter a ordem de inserção quando não é necessária (reduz memória)
+            "preserve_insertion_order": False,
+        }
+        if self.threads:
+            config["threads"] = self.threads
+        return config
+
+
+def stream_query_result(
+    connection, query: str, max_rows: Optional[int] = 500, batch_size: int = 100
+) -> str:
+    """
+    Executa uma consulta lendo o resultado em lotes, sem materializar tudo em memória.
+
+    O formato de saída é o mesmo do DuckDbTools.run_query (cabeçalho CSV e linhas
+    separadas por vírgula), acrescido de um aviso quando o resultado é truncado.
+
+    Args:
+        connection: Conexão (ou cursor) do DuckDB
+        query: Consulta SQL a executar
+        max_rows: Número máximo de linhas devolvidas (None = sem limite)
+        batch_size: Tamanho de cada lote lido do cursor
+
+    Returns:
+        Resultado formatado como texto
+    """
+    cursor = connection.execute(query)
+    if cursor.description is None:
+        return "No output"
+
+    columns = [column[0] for column in cursor.description]
+    result_rows: List[str] = []
+    truncated = False
+
+    while True:
+        batch = cursor.fetchmany(batch_size)
+        if not batch:
+            break
+        for row in batch:
+            if max_rows is not None and len(result_rows) >= max_rows:
+                truncated = True
+                break
+            if len(row) == 1:
+                result_rows.append(str(row[0]))
+            else:
+                result_rows.append(",".join(str(x) for x in row))
+        if truncated:
+            break
+
+    result_output = ",".join(columns) + "\n" + "\n".join(result_rows)
+    if truncated:
+        result_output += (
+            f"\n... resultado truncado em {max_rows} linhas. "
+            "Use agregações, filtros ou LIMIT para reduzir o resultado."
+        )
+    return result_output
+
+
+def load_memory_budget() -> MemoryBudget:
+    """
+    Carrega o orçamento de memória configurado no ambiente.
+
+    Returns:
+        Instância de MemoryBudget
+    """
+    return MemoryBudget.from_env()
+
+
+# Verificação do modo limitado: GROUP BY pesado sob um teto fixo de memória
+if __name__ == "__main__":
+    import duckdb
+
+    budget_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 512
+    n_rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5_500_000
+
+    budget = MemoryBudget(mode="bounded", rss_budget_mb=budget_mb, threads=2)
+    work_dir = tempfile.mkdtemp(prefix="bounded_check_")
+    parquet_path = os.path.join(work_dir, "dados_sinteticos.parquet")
+
+    setup = duckdb.connect(config=budget.duckdb_config())
+    setup.execute(
+        f"""
+        COPY (
+            SELECT
+                range AS Cod_Cliente,
+                'UF' || (range % 27)::VARCHAR AS UF_Cliente,
+                'municipio ' || (range % 5000)::VARCHAR AS Municipio_Cliente,
+                (range % 819) AS Cod_Produto,
+                (random() * 1000)::DOUBLE AS Valor_Vendido
+            FROM range({n_rows})
+        ) TO '{parquet_path}' (FORMAT PARQUET)
+        """
+    )
+    setup.close()
+
+    baseline_rss = current_rss_mb() or 0.0
+    connection = duckdb.connect(config=budget.duckdb_config())
+    heavy_queries = [
+        f"SELECT Cod_Cliente, SUM(Valor_Vendido) AS total FROM read_parquet('{parquet_path}') GROUP BY Cod_Cliente ORDER BY total DESC",
+        f"SELECT UF_Cliente, Municipio_Cliente, Cod_Produto, COUNT(*) AS n FROM read_parquet('{parquet_path}') GROUP BY ALL",
+    ]
+
+    for heavy_query in heavy_queries:
+        output = stream_query_result(
+            connection, heavy_query, budget.max_result_rows, budget.result_batch_size
+        )
+        print(f"OK: {len(output.splitlines())} linhas devolvidas")
+
+    peak_rss = peak_rss_mb() or 0.0
+    print(f"RSS base: {baseline_rss:.0f}MB | pico: {peak_rss:.0f}MB | orçamento: {budget_mb}MB")
+    if peak_rss > budget_mb:
+        print("ERROR: orçamento de memória excedido")
+        sys.exit(1)
+    print("SUCCESS: GROUP BY pesado concluído dentro do orçamento de memória")
@@ -0,0 +1,300 @@
+"""
+Módulo de profiling das consultas DuckDB executadas pelo agente.
+Captura o perfil JSON de cada consulta (tempo por operador, linhas e bytes lidos)
+e grava as consultas lentas em um log rotativo junto com a pergunta do usuário.
+Também conta as consultas em execução no processo (todas as sessões).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+from typing import Any, Dict, List, Optional
+
+
+def _format_bytes(value: float) -> str:
+    """Formata um número de bytes em unidade legível."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if value < 1024:
+            return f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} TB"
+
+
+class QueryProfiler:
+    """Coleta perfis de execução do DuckDB e registra consultas lentas."""
+
+    def __init__(
+        self,
+        enabled: bool = False,
+        slow_threshold_ms: float = 1000.0,
+        log_path: str = "logs/slow_queries.log",
+        max_bytes: int = 5 * 1024 * 1024,
+        backup_count: int = 5,
+        top_operators: int = 3,
+    ):
+        """
+        Inicializa o profiler.
+
+        Args:
+            enabled: Ativa o profiling das consultas
+            slow_threshold_ms: Tempo a partir do qual a consulta é considerada lenta
+            log_path: Caminho do log de consultas lentas
+            max_bytes: Tamanho máximo de cada arquivo de log antes da rotação
+            backup_count: Número de arquivos de log rotacionados mantidos
+            top_operators: Número de operadores mais caros exibidos no resumo
+        """
+        self.enabled = enabled
+        self.slow_threshold_ms = slow_threshold_ms
+        self.log_path = log_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.top_operators = top_operators
+        self._logger = None
+
+    @classmethod
+    def from_env(cls) -> "QueryProfiler":
+        """
+        Cria o profiler a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_SQL_PROFILING: "1"/"true" para ativar o profiling
+            AGENT_SLOW_QUERY_MS: limite de tempo para o log de consultas lentas
+            AGENT_SLOW_QUERY_LOG: caminho do log de consultas lentas
+
+        Returns:
+            Instância de QueryProfiler
+        """
+        return cls(
+            enabled=os.getenv("AGENT_SQL_PROFILING", "0").strip().lower()
+            in ("1", "true", "yes"),
+            slow_threshold_ms=float(os.getenv("AGENT_SLOW_QUERY_MS", "1000")),
+            log_path=os.getenv("AGENT_SLOW_QUERY_LOG", "logs/slow_queries.log"),
+        )
+
+    @property
+    def logger(self) -> logging.Logger:
+        """Logger rotativo das consultas lentas (criado sob demanda)."""
+        if self._logger is None:
+            log_dir = os.path.dirname(self.log_path)
+            if log_dir:
+                os.makedirs(log_dir, exist_ok=True)
+
+            logger = logging.getLogger(f"slow_queries.{os.path.abspath(self.log_path)}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            if not logger.handlers:
+                handler = RotatingFileHandler(
+                    self.log_path,
+                    maxBytes=self.max_bytes,
+                    backupCount=self.backup_count,
+                    encoding="utf-8",
+                )
+                handler.setFormatter(logging.Formatter("%(message)s"))
+                logger.addHandler(handler)
+            self._logger = logger
+        return self._logger
+
+    def prepare(self, connection):
+        """
+        Ativa o profiling na conexão sem imprimir a saída.
+
+        Args:
+            connection: Conexão do DuckDB
+        """
+        if self.enabled:
+            connection.execute("SET enable_profiling = 'no_output'")
+
+    def collect(
+        self,
+        connection,
+        query: str,
+        wall_ms: float,
+        question: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Lê o perfil da última consulta da conexão e registra se for lenta.
+
+        Args:
+            connection: Conexão do DuckDB onde a consulta foi executada
+            query: Consulta SQL executada
+            wall_ms: Tempo total medido em torno da execução (ms)
+            question: Pergunta original do usuário
+
+        Returns:
+            Dicionário com o resumo do perfil ou None se o profiling estiver desativado
+        """
+        if not self.enabled:
+            return None
+
+        try:
+            raw_profile = json.loads(
+                connection.get_profiling_information(format="json")
+            )
+        except Exception:
+            raw_profile = {}
+
+        operators: List[Dict[str, Any]] = []
+        self._collect_operators(raw_profile, operators)
+        operators.sort(key=lambda op: op["timing_ms"], reverse=True)
+
+        profile = {
+            "wall_ms": round(wall_ms, 2),
+            "latency_ms": round(raw_profile.get("latency", 0.0) * 1000, 2),
+            "rows_returned": raw_profile.get("rows_returned"),
+            "rows_scanned": raw_profile.get("cumulative_rows_scanned"),
+            "bytes_read": raw_profile.get("total_bytes_read"),
+            "peak_memory_bytes": raw_profile.get("system_peak_buffer_memory"),
+            "operators": operators[: self.top_operators],
+        }
+        profile["summary"] = self.summarize(profile)
+
+        if wall_ms >= self.slow_threshold_ms:
+            self.logger.info(
+                json.dumps(
+                    {
+                        "timestamp": datetime.now().isoformat(timespec="seconds"),
+                        "question": question,
+                        "query": query,
+                        "profile": profile,
+                        "operators": operators,
+                    },
+                    ensure_ascii=False,
+                    default=str,
+                )
+            )
+
+        return profile
+
+    def summarize(self, profile: Dict[str, Any]) -> str:
+        """
+        Gera um resumo de uma linha do plano executado.
+
+        Args:
+            profile: Perfil retornado por `collect`
+
+        Returns:
+            Resumo legível do perfil
+        """
+        parts = [f"{profile['wall_ms']:.1f} ms"]
+        if profile.get("rows_scanned") is not None:
+            parts.append(f"{profile['rows_scanned']:,} linhas lidas")
+        if profile.get("bytes_read"):
+            parts.append(f"{_format_bytes(profile['bytes_read'])} lidos")
+        if profile.get("peak_memory_bytes"):
+            parts.append(f"pico {_format_bytes(profile['peak_memory_bytes'])}")
+
+        operators = [
+            f"{op['name']} {op['timing_ms']:.1f} ms ({op['rows']:,} linhas)"
+            for op in profile.get("operators", [])
+        ]
+        summary = " | ".join(parts)
+        if operators:
+            summary += " | " + " · ".join(operators)
+        return summary
+
+    def _collect_operators(self, node: Dict[str, Any], operators: List[Dict[str, Any]]):
+        """Percorre a árvore do perfil acumulando tempo e cardinalidade por operador."""
+        name = (
+            node.get("operator_name") or node.get("operator_type") or node.get("name")
+        )
+        timing = node.get("operator_timing", node.get("timing"))
+        if name and timing is not None:
+            operators.append(
+                {
+                    "name": str(name).strip(),
+                    "timing_ms": round(float(timing) * 1000, 2),
+                    "rows": int(
+                        node.get("operator_cardinality", node.get("cardinality", 0))
+                        or 0
+                    ),
+                    "rows_scanned": int(node.get("operator_rows_scanned", 0) or 0),
+                }
+            )
+        for child in node.get("children", []):
+            self._collect_operators(child, operators)
+
+
+class QueryActivity:
+    """Contador das consultas DuckDB em execução no processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.total = 0
+        self._peak = 0
+        self._busy_s = 0.0
+        # Integral do número de consultas em execução no tempo (consulta x segundo)
+        self._query_s = 0.0
+        self._last_change = time.perf_counter()
+
+    def _advance(self):
+        """Acumula o intervalo desde a última mudança (chamado com o lock)."""
+        now = time.perf_counter()
+        elapsed = now - self._last_change
+        self._query_s += self.in_flight * elapsed
+        if self.in_flight:
+            self._busy_s += elapsed
+        self._last_change = now
+
+    @contextmanager
+    def track(self):
+        """Conta a consulta executada dentro do bloco como em execução."""
+        with self._lock:
+            self._advance()
+            self.in_flight += 1
+            self.total += 1
+            self._peak = max(self._peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._advance()
+                self.in_flight -= 1
+
+    def take_peak(self) -> int:
+        """
+        Máximo de consultas simultâneas desde a chamada anterior, inclusive
+        consultas que começaram e terminaram entre as duas chamadas.
+
+        Returns:
+            Pico de consultas em execução
+        """
+        with self._lock:
+            peak, self._peak = self._peak, self.in_flight
+            return peak
+
+    def snapshot(self) -> Dict[str, float]:
+        """
+        Totais acumulados desde a criação do contador. A diferença entre dois
+        snapshots dividida pelo intervalo dá a média de consultas simultâneas
+        (`query_s`) e a fração do tempo com alguma consulta em execução (`busy_s`).
+
+        Returns:
+            Dicionário com in_flight, total, busy_s e query_s
+        """
+        with self._lock:
+            self._advance()
+            return {
+                "in_flight": self.in_flight,
+                "total": self.total,
+                "busy_s": self._busy_s,
+                "query_s": self._query_s,
+            }
+
+
+_query_activity: Optional[QueryActivity] = None
+_query_activity_lock = threading.Lock()
+
+
+def get_query_activity() -> QueryActivity:
+    """Contador de consultas em execução do processo (compartilhado pelas sessões)."""
+    global _query_activity
+    with _query_activity_lock:
+        if _query_activity is None:
+            _query_activity = QueryActivity()
+        return _query_activity
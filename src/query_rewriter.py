@@ -0,0 +1,255 @@
+"""
+Módulo de reescrita das perguntas antes do modelo.
+Compila todas as seções do alias.json (colunas, métricas e convenções) em uma
+única expressão regular por versão do arquivo: aliases viram nomes de colunas,
+nomes de estados viram filtros por `UF_Cliente` e frases de métricas viram suas
+expressões SQL, anexadas à pergunta em forma estruturada e compacta.
+"""
+
+import json
+import os
+import re
+import threading
+import unicodedata
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_ALIAS_PATH = "data/mappings/alias.json"
+
+# Nomes de estado que também são palavras comuns ("para"): só contam com o acento
+AMBIGUOUS_STATE_NAMES = {"para"}
+
+# Palavras que, antes do nome, indicam a cidade e não o estado (ex: "cidade de São Paulo")
+CITY_MARKERS = re.compile(r"(cidade|municipio)\s+(de\s+|do\s+|da\s+)?$")
+
+# Aliases de uma palavra que também são substantivos comuns ("quais clientes
+# compraram itens"): só viram a coluna em posição de coluna (ver COLUMN_BEFORE/AFTER)
+GENERIC_COLUMN_ALIASES = {
+    "itens",
+    "cliente",
+    "comprador",
+    "produto",
+    "grupo",
+    "familia",
+    "vendedor",
+    "empresa",
+    "companhia",
+    "setor",
+    "cidade",
+    "localidade",
+    "municipio",
+    "estado",
+    "uf",
+}
+
+# Posição de coluna: agrupamento antes ("por cliente", "cada produto") ou valor
+# literal depois ("grupo 5", "cliente '123'")
+COLUMN_BEFORE = re.compile(
+    r"(?<!\w)(por|cada|pelo|pela|pelos|pelas)\s+((o|a|os|as)\s+)?$"
+)
+COLUMN_AFTER = re.compile(r"\s*[:=]?\s*(\d|'|\")")
+
+# Siglas de UF que também são palavras ("SE", "TO"): em listas só contam se a
+# própria sigla vier após um contexto de UF
+AMBIGUOUS_UF_CODES = {"SE", "TO", "MA", "PA", "ES"}
+
+# Contexto de UF antes de uma sigla: preposição ou menção a estado/UF
+UF_CONTEXT = re.compile(
+    r"(?<!\w)(em|no|na|nos|nas|de|do|da|dos|das|para|pelo|pela|por|entre|"
+    r"uf|ufs|estado|estados)\s+$"
+)
+
+# Continuação de uma lista de siglas ("em SP, RJ e MG")
+UF_LIST_SEPARATOR = re.compile(r"\s*(,|e|ou|,\s*e|,\s*ou)\s*")
+
+
+def fold(text: str) -> Tuple[str, List[int]]:
+    """
+    Remove acentos e converte para minúsculas preservando as posições.
+
+    Args:
+        text: Texto original
+
+    Returns:
+        Texto normalizado e, para cada caractere dele, o índice no texto original
+    """
+    chars: List[str] = []
+    index: List[int] = []
+    for i, char in enumerate(text):
+        for part in unicodedata.normalize("NFD", char):
+            if unicodedata.category(part) != "Mn":
+                for lowered in part.lower():
+                    chars.append(lowered)
+                    index.append(i)
+    return "".join(chars), index
+
+
+def _phrase_pattern(phrase: str) -> str:
+    """Padrão regex de uma frase normalizada (espaços flexíveis)."""
+    return r"\s+".join(re.escape(word) for word in phrase.split())
+
+
+class RewriteResult:
+    """Pergunta reescrita e dicas resolvidas."""
+
+    def __init__(self, query: str, hints: Dict[str, Dict[str, str]]):
+        self.query = query
+        self.hints = hints
+
+    def hints_text(self) -> str:
+        """Dicas em JSON compacto (vazio se nada foi resolvido)."""
+        if not self.hints:
+            return ""
+        return json.dumps(self.hints, ensure_ascii=False, separators=(",", ":"))
+
+    def with_hints(self) -> str:
+        """Pergunta reescrita seguida da linha de mapeamentos resolvidos."""
+        if not self.hints:
+            return self.query
+        return f"{self.query}\nMapeamentos resolvidos: {self.hints_text()}"
+
+
+class QueryRewriter:
+    """Reescrita das perguntas compilada a partir de todas as seções do alias.json."""
+
+    def __init__(self, alias_data: Dict[str, Any]):
+        """
+        Args:
+            alias_data: Conteúdo completo do alias.json
+        """
+        # frase normalizada -> (tipo, alvo, valor)
+        self.entries: Dict[str, Tuple[str, str, str]] = {}
+
+        for column, aliases in (alias_data.get("columns") or {}).items():
+            for alias in aliases:
+                self._add(alias, ("coluna", column, column))
+
+        conventions = alias_data.get("conventions") or {}
+        expressions = alias_data.get("metric_expressions") or {}
+        for metric, phrases in (alias_data.get("metrics") or {}).items():
+            expression = expressions.get(metric) or conventions.get(metric, "")
+            for phrase in [metric] + list(phrases):
+                self._add(phrase, ("metrica", metric, expression), override=True)
+
+        for code, name in conventions.items():
+            if re.fullmatch(r"[A-Z]{2}", code):
+                self._add(name, ("estado", code, f"UF_Cliente = '{code}'"))
+        self.uf_codes = {
+            code for code in conventions if re.fullmatch(r"[A-Z]{2}", code)
+        }
+
+        # Frases mais longas primeiro ("mato grosso do sul" antes de "mato grosso")
+        phrases = sorted(self.entries, key=len, reverse=True)
+        self.pattern = (
+            re.compile(
+                r"(?<!\w)("
+                + "|".join(_phrase_pattern(phrase) for phrase in phrases)
+                + r")(?:s|es)?(?!\w)"
+            )
+            if phrases
+            else None
+        )
+        self.code_pattern = re.compile(r"(?<!\w)([A-Z]{2})(?!\w)")
+
+    def _add(self, phrase: str, entry: Tuple[str, str, str], override: bool = False):
+        folded = " ".join(fold(phrase)[0].split())
+        if folded and (override or folded not in self.entries):
+            self.entries[folded] = entry
+
+    def rewrite(self, query: str) -> RewriteResult:
+        """
+        Reescreve a pergunta: aliases de colunas são trocados pelos nomes das
+        colunas; estados e métricas citados viram dicas estruturadas.
+
+        Args:
+            query: Pergunta do usuário
+
+        Returns:
+            RewriteResult com a pergunta reescrita e as dicas
+        """
+        hints: Dict[str, Dict[str, str]] = {}
+        if self.pattern is None:
+            return RewriteResult(query, hints)
+
+        folded, index = fold(query)
+        replacements: List[Tuple[int, int, str]] = []
+        for match in self.pattern.finditer(folded):
+            phrase = " ".join(match.group(1).split())
+            kind, target, value = self.entries[phrase]
+            start, end = index[match.start()], index[match.end() - 1] + 1
+            original = query[start:end]
+
+            if kind == "estado":
+                if phrase in AMBIGUOUS_STATE_NAMES and original.lower() == phrase:
+                    continue
+                if CITY_MARKERS.search(folded[: match.start()]):
+                    continue
+                hints.setdefault("filtros", {})[original] = value
+            elif kind == "metrica":
+                hints.setdefault("metricas", {})[original] = value or target
+            else:
+                if phrase in GENERIC_COLUMN_ALIASES and not (
+                    COLUMN_BEFORE.search(folded[: match.start()])
+                    or COLUMN_AFTER.match(folded, match.end())
+                ):
+                    continue
+                hints.setdefault("colunas", {})[original] = target
+                replacements.append((start, end, target))
+
+        # Siglas de UF escritas em maiúsculas, após preposição ou menção a UF
+        # ("vendas em SP", "UF SP") ou em lista com outra sigla ("em SP, RJ e MG")
+        previous_end = None
+        for match in self.code_pattern.finditer(query):
+            code = match.group(1)
+            if code not in self.uf_codes:
+                continue
+            in_context = UF_CONTEXT.search(query[: match.start()].lower())
+            in_list = (
+                previous_end is not None
+                and code not in AMBIGUOUS_UF_CODES
+                and UF_LIST_SEPARATOR.fullmatch(
+                    query[previous_end : match.start()].lower()
+                )
+            )
+            if not (in_context or in_list):
+                continue
+            hints.setdefault("filtros", {})[code] = f"UF_Cliente = '{code}'"
+            previous_end = match.end()
+
+        rewritten = query
+        for start, end, target in reversed(replacements):
+            rewritten = rewritten[:start] + target + rewritten[end:]
+        return RewriteResult(rewritten, hints)
+
+
+_rewriter_cache: Dict[str, Tuple[Tuple[int, int], QueryRewriter]] = {}
+_rewriter_lock = threading.Lock()
+
+
+def load_query_rewriter(alias_file_path: Optional[str] = None) -> QueryRewriter:
+    """
+    Compila o alias.json uma vez por versão do arquivo (tamanho e mtime).
+
+    Args:
+        alias_file_path: Caminho do alias.json (padrão: data/mappings/alias.json)
+
+    Returns:
+        QueryRewriter compilado (vazio se o arquivo não existir)
+    """
+    path = alias_file_path or DEFAULT_ALIAS_PATH
+    try:
+        stat = os.stat(path)
+        version = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        version = (0, 0)
+
+    with _rewriter_lock:
+        cached = _rewriter_cache.get(path)
+        if cached is None or cached[0] != version:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    alias_data = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                alias_data = {}
+            cached = (version, QueryRewriter(alias_data))
+            _rewriter_cache[path] = cached
+        return cached[1]
@@ -0,0 +1,488 @@
+"""
+Módulo de formatos (shapes) das consultas SQL geradas pelo modelo.
+Normaliza cada consulta em formato + parâmetros (ex: `WHERE UF_Cliente = 'SP'` e
+`= 'RJ'` têm o mesmo formato), mantém por conexão um cache limitado de prepared
+statements para executar formatos repetidos sem novo parsing e planejamento, e
+acumula estatísticas por formato (frequência e latência) para indicar quais
+rollups ou índices valem a pena.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Comentários, literais, identificadores entre aspas, números, palavras e operadores
+TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<space>\s+)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<number>(?<![\w.$])\d+(?:\.\d+)?(?:[eE][+-]?\d+)?(?![\w.]))
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<op><>|!=|<=|>=|::|\|\||.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+# Tokens após os quais um literal é um valor comparado e vira parâmetro. Literais em
+# outras posições (GROUP BY 1, LIMIT 10, ROUND(x, 2), date_trunc('month', ...))
+# fazem parte do formato.
+COMPARISON_TOKENS = {"=", "<>", "!=", "<", ">", "<=", ">=", "BETWEEN", "LIKE", "ILIKE"}
+
+# Literais tipados (DATE '2024-01-01') viram CAST($n AS DATE)
+TYPED_LITERALS = {"DATE", "TIMESTAMP", "TIMESTAMPTZ", "TIME", "INTERVAL"}
+
+
+class NormalizedQuery:
+    """Consulta separada em formato (com $1, $2, ...) e parâmetros (literais SQL)."""
+
+    def __init__(self, shape: str, params: List[str]):
+        self.shape = shape
+        self.params = params
+
+    @property
+    def shape_id(self) -> str:
+        return hashlib.sha1(self.shape.encode("utf-8")).hexdigest()[:12]
+
+    def execute_sql(self, statement_name: str) -> str:
+        """Instrução EXECUTE do prepared statement com os parâmetros desta consulta."""
+        if not self.params:
+            return f"EXECUTE {statement_name}"
+        return f"EXECUTE {statement_name}({', '.join(self.params)})"
+
+
+def normalize_query(query: str) -> NormalizedQuery:
+    """
+    Separa os valores comparados de uma consulta do seu formato.
+
+    Strings e números comparados (=, <>, <, >, BETWEEN ... AND, LIKE, IN (...))
+    viram parâmetros; espaços e comentários são normalizados.
+
+    Args:
+        query: Consulta SQL
+
+    Returns:
+        NormalizedQuery com o formato e os parâmetros na ordem em que aparecem
+    """
+    tokens = []
+    space = False
+    for match in TOKEN_PATTERN.finditer(query.replace("`", "").strip().rstrip(";")):
+        if match.lastgroup in ("comment", "space"):
+            space = True
+            continue
+        tokens.append((match.lastgroup, match.group(), space))
+        space = False
+
+    parts: List[str] = []
+    params: List[str] = []
+    last = ""
+    in_list = False
+    between = False
+    i = 0
+    while i < len(tokens):
+        kind, text, space = tokens[i]
+        prefix = " " if space and parts else ""
+
+        literal, cast, step = None, None, 1
+        if kind in ("string", "number"):
+            literal = text
+        elif (
+            kind == "word"
+            and text.upper() in TYPED_LITERALS
+            and i + 1 < len(tokens)
+            and tokens[i + 1][0] == "string"
+        ):
+            literal, cast, step = tokens[i + 1][1], text.upper(), 2
+
+        if literal is not None and (
+            last in COMPARISON_TOKENS
+            or (last == "AND" and between)
+            or (in_list and last in ("(", ","))
+        ):
+            params.append(literal)
+            placeholder = f"${len(params)}"
+            if cast:
+                placeholder = f"CAST({placeholder} AS {cast})"
+            parts.append(prefix + placeholder)
+            between = last == "BETWEEN"
+            last = "?"
+            i += step
+            continue
+
+        upper = text.upper()
+        if upper == "(":
+            in_list = last == "IN"
+        elif upper != ",":
+            in_list = False
+        if upper != "AND":
+            between = False
+        parts.append(prefix + text)
+        last = upper
+        i += 1
+
+    return NormalizedQuery("".join(parts), params)
+
+
+class PreparedStatement:
+    """Prepared statement de um formato em uma conexão."""
+
+    def __init__(self, name: str, notes: List[str], capped: bool):
+        self.name = name
+        self.notes = notes
+        self.capped = capped
+        self.executions = 0
+
+
+class PreparedStatementCache:
+    """Cache LRU de prepared statements de uma conexão DuckDB, por formato de consulta."""
+
+    def __init__(self, max_statements: int = 32, prepare_after: int = 2):
+        """
+        Args:
+            max_statements: Prepared statements mantidos na conexão (0 desativa)
+            prepare_after: Ocorrências de um formato antes de prepará-lo
+        """
+        self.max_statements = max_statements
+        self.prepare_after = max(1, prepare_after)
+        self.connection = None
+        self.statements: "OrderedDict[str, Optional[PreparedStatement]]" = OrderedDict()
+        self.seen: "OrderedDict[str, int]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "PreparedStatementCache":
+        """
+        Cria o cache a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_PREPARED_STATEMENTS: prepared statements por conexão (0 desativa)
+            AGENT_PREPARE_AFTER: ocorrências de um formato antes de prepará-lo
+
+        Returns:
+            Instância de PreparedStatementCache
+        """
+        return cls(
+            max_statements=int(os.getenv("AGENT_PREPARED_STATEMENTS", "32")),
+            prepare_after=int(os.getenv("AGENT_PREPARE_AFTER", "2")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_statements > 0
+
+    def _bind(self, connection):
+        """Descarta o cache se a conexão mudou (prepared statements são por conexão)."""
+        if self.connection is not connection:
+            self.connection = connection
+            self.statements.clear()
+            self.seen.clear()
+
+    def get(self, connection, query: NormalizedQuery) -> Optional[PreparedStatement]:
+        """
+        Prepared statement do formato da consulta, se já preparado nesta conexão.
+
+        Args:
+            connection: Conexão do DuckDB
+            query: Consulta normalizada
+
+        Returns:
+            PreparedStatement ou None
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._bind(connection)
+            statement = self.statements.get(query.shape)
+            if statement is None:
+                self.misses += 1
+                return None
+            self.statements.move_to_end(query.shape)
+            self.hits += 1
+            statement.executions += 1
+            return statement
+
+    def observe(
+        self,
+        connection,
+        query: NormalizedQuery,
+        guarded_sql: str,
+        notes: List[str],
+        capped: bool,
+    ) -> Optional[PreparedStatement]:
+        """
+        Registra uma execução validada do formato e o prepara ao atingir o número
+        de ocorrências configurado.
+
+        Args:
+            connection: Conexão do DuckDB onde a consulta foi executada
+            query: Consulta normalizada (como enviada pelo modelo)
+            guarded_sql: Consulta validada pelo guard (possivelmente com LIMIT)
+            notes: Avisos do guard repetidos nas próximas execuções
+            capped: Se o guard já limitou as linhas da consulta
+
+        Returns:
+            PreparedStatement criado ou None
+        """
+        if not self.enabled:
+            return None
+        guarded = normalize_query(guarded_sql)
+        # O guard só acrescenta LIMIT ou subconsulta: os parâmetros precisam coincidir
+        if guarded.params != query.params:
+            return None
+
+        with self._lock:
+            self._bind(connection)
+            if query.shape in self.statements:
+                return None
+            count = self.seen.pop(query.shape, 0) + 1
+            if count < self.prepare_after:
+                self.seen[query.shape] = count
+                while len(self.seen) > 4 * self.max_statements:
+                    self.seen.popitem(last=False)
+                return None
+
+            name = f"shape_{query.shape_id}"
+            try:
+                connection.execute(f"PREPARE {name} AS {guarded.shape}")
+            except Exception:
+                # Formato que não aceita parâmetros nessas posições: fica sem cache
+                self.statements[query.shape] = None
+                return None
+            statement = PreparedStatement(name, notes, capped)
+            self.statements[query.shape] = statement
+            evicted = []
+            while len(self.statements) > self.max_statements:
+                evicted.append(self.statements.popitem(last=False)[1])
+
+        for old in evicted:
+            if old is not None:
+                try:
+                    connection.execute(f"DEALLOCATE {old.name}")
+                except Exception:
+                    continue
+        return statement
+
+    def is_unpreparable(self, query: NormalizedQuery) -> bool:
+        """Se o formato já falhou no PREPARE nesta conexão."""
+        with self._lock:
+            return query.shape in self.statements and (
+                self.statements[query.shape] is None
+            )
+
+    def invalidate(self, query: NormalizedQuery):
+        """Descarta o prepared statement de um formato (ex: falha na execução)."""
+        with self._lock:
+            statement = self.statements.pop(query.shape, None)
+            connection = self.connection
+        if statement is not None and connection is not None:
+            try:
+                connection.execute(f"DEALLOCATE {statement.name}")
+            except Exception:
+                pass
+
+    def clear(self):
+        """Esquece os prepared statements (a conexão foi fechada)."""
+        with self._lock:
+            self.connection = None
+            self.statements.clear()
+            self.seen.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "prepared": sum(1 for s in self.statements.values() if s is not None),
+                "max_statements": self.max_statements,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class ShapeStats:
+    """Frequência e latência por formato de consulta (seguro entre threads)."""
+
+    def __init__(self, max_shapes: int = 500):
+        """
+        Args:
+            max_shapes: Formatos mantidos (os menos frequentes saem primeiro)
+        """
+        self.max_shapes = max_shapes
+        self.shapes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(
+        self,
+        query: NormalizedQuery,
+        elapsed_ms: float,
+        prepared: bool = False,
+        error: bool = False,
+    ):
+        """
+        Registra uma execução de um formato.
+
+        Args:
+            query: Consulta normalizada
+            elapsed_ms: Tempo da execução (ms)
+            prepared: Se a execução usou o prepared statement
+            error: Se a execução falhou ou foi rejeitada
+        """
+        with self._lock:
+            entry = self.shapes.get(query.shape)
+            if entry is None:
+                if len(self.shapes) >= self.max_shapes:
+                    least = min(self.shapes, key=lambda s: self.shapes[s]["count"])
+                    del self.shapes[least]
+                entry = self.shapes[query.shape] = {
+                    "shape_id": query.shape_id,
+                    "shape": query.shape,
+                    "count": 0,
+                    "prepared": 0,
+                    "errors": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "distinct_params": set(),
+                }
+            entry["count"] += 1
+            if prepared:
+                entry["prepared"] += 1
+            if error:
+                entry["errors"] += 1
+            entry["total_ms"] += elapsed_ms
+            entry["max_ms"] = max(entry["max_ms"], elapsed_ms)
+            if len(entry["distinct_params"]) < 100:
+                entry["distinct_params"].add(tuple(query.params))
+
+    def snapshot(self, top: int = 20) -> List[Dict[str, Any]]:
+        """
+        Formatos com maior tempo acumulado: os candidatos a rollup ou índice.
+
+        Args:
+            top: Número de formatos devolvidos
+
+        Returns:
+            Lista de formatos com frequência, latência média e máxima (ms)
+        """
+        with self._lock:
+            entries = sorted(
+                self.shapes.values(), key=lambda e: e["total_ms"], reverse=True
+            )[:top]
+            return [
+                {
+                    "shape_id": entry["shape_id"],
+                    "shape": entry["shape"],
+                    "count": entry["count"],
+                    "prepared": entry["prepared"],
+                    "errors": entry["errors"],
+                    "distinct_params": len(entry["distinct_params"]),
+                    "mean_ms": round(entry["total_ms"] / entry["count"], 2),
+                    "max_ms": round(entry["max_ms"], 2),
+                    "total_ms": round(entry["total_ms"], 2),
+                }
+                for entry in entries
+            ]
+
+
+_shape_stats: Optional[ShapeStats] = None
+_shape_stats_lock = threading.Lock()
+
+
+def get_shape_stats() -> ShapeStats:
+    """Estatísticas por formato do processo (compartilhadas por todas as sessões)."""
+    global _shape_stats
+    with _shape_stats_lock:
+        if _shape_stats is None:
+            _shape_stats = ShapeStats()
+        return _shape_stats
+
+
+# Comparação: consultas que só diferem nos literais, com e sem prepared statements
+if __name__ == "__main__":
+    import sys
+    import tempfile
+    import time
+
+    import duckdb
+
+    from sql_guard import SqlGuard
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    work_dir = tempfile.mkdtemp(prefix="query_shapes_")
+    parquet_path = os.path.join(work_dir, "dados_sinteticos.parquet")
+    connection = duckdb.connect()
+    connection.execute(f"""
+        COPY (
+            SELECT
+                'uf' || (range % 27)::VARCHAR AS UF_Cliente,
+                DATE '2024-01-01' + (range % 365)::INTEGER AS Data_Emissao,
+                (range % 819) AS Cod_Produto,
+                (random() * 1000)::DOUBLE AS Valor_Vendido
+            FROM range({n_rows})
+        ) TO '{parquet_path}' (FORMAT PARQUET)
+        """)
+    connection.execute(
+        f"CREATE VIEW dados AS SELECT * FROM read_parquet('{parquet_path}')"
+    )
+
+    queries = [
+        f"SELECT COUNT(*) AS n, SUM(Cod_Produto) AS total FROM dados WHERE UF_Cliente = 'uf{i % 27}' "
+        f"AND Data_Emissao >= DATE '2024-0{1 + i % 9}-01'"
+        for i in range(repeats)
+    ] + [
+        f"SELECT Cod_Produto, COUNT(*) AS n FROM dados WHERE Valor_Vendido > {100 * (i % 9)} "
+        "GROUP BY Cod_Produto ORDER BY n DESC, Cod_Produto LIMIT 5"
+        for i in range(repeats)
+    ]
+
+    # Caminho sem cache: validação do guard (EXPLAIN) e consulta literal a cada vez
+    guard = SqlGuard()
+    start = time.perf_counter()
+    literal_results = [
+        connection.execute(guard.validate(connection, query).sql).fetchall()
+        for query in queries
+    ]
+    literal_ms = (time.perf_counter() - start) * 1000
+
+    # Com cache: formatos repetidos executam o prepared statement sem nova validação
+    cache = PreparedStatementCache()
+    stats = get_shape_stats()
+    start = time.perf_counter()
+    prepared_results = []
+    for query in queries:
+        normalized = normalize_query(query)
+        query_start = time.perf_counter()
+        statement = cache.get(connection, normalized)
+        if statement is not None:
+            rows = connection.execute(normalized.execute_sql(statement.name)).fetchall()
+        else:
+            guard_result = guard.validate(connection, query)
+            rows = connection.execute(guard_result.sql).fetchall()
+            cache.observe(
+                connection, normalized, guard_result.sql, guard_result.notes, False
+            )
+        prepared_results.append(rows)
+        stats.record(
+            normalized,
+            (time.perf_counter() - query_start) * 1000,
+            prepared=statement is not None,
+        )
+    prepared_ms = (time.perf_counter() - start) * 1000
+
+    print(f"Guard + literal: {literal_ms / len(queries):.2f} ms por consulta")
+    print(f"Cache de formatos: {prepared_ms / len(queries):.2f} ms por consulta")
+    print(f"Cache: {cache.snapshot()}")
+    for entry in stats.snapshot():
+        print(
+            f"[{entry['shape_id']}] {entry['count']}x, {entry['distinct_params']} "
+            f"parâmetros distintos, média {entry['mean_ms']} ms: {entry['shape']}"
+        )
+    if literal_results != prepared_results:
+        print("ERROR: resultados diferentes com prepared statements")
+        sys.exit(1)
+    print("SUCCESS: mesmos resultados com formatos preparados")
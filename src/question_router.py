@@ -0,0 +1,347 @@
+"""
+Módulo de roteamento das perguntas por complexidade.
+Classifica cada pergunta com atributos locais e baratos (colunas mapeadas,
+palavras de agregação, expressões temporais, de comparação e de ranking) e envia as simples
+para uma configuração leve do agente (menos ferramentas e instruções curtas) e as
+complexas para o agente completo, registrando a latência por rota.
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from query_rewriter import RewriteResult, fold
+
+LIGHT = "light"
+FULL = "full"
+ROUTES = (LIGHT, FULL)
+
+AGGREGATION_WORDS = re.compile(
+    r"\b(soma|somatorio|total|media|medio|maximo|minimo|maior|menor|contagem|"
+    r"quant[oa]s?|unicos?|distint[oa]s?|nulos?|percentual|porcentagem|participacao)\b"
+)
+TEMPORAL_WORDS = re.compile(
+    r"\b(por (dia|semana|mes|trimestre|semestre|ano|periodo)|diari[oa]|semanal|mensal|"
+    r"trimestral|anual|evolucao|tendencias?|historico|crescimento|queda|sazonalidade|"
+    r"ano (passado|anterior)|mes (passado|anterior)|periodo anterior|ultim[oa]s? \d+|"
+    r"janeiro|fevereiro|marco|abril|maio|junho|julho|agosto|setembro|outubro|"
+    r"novembro|dezembro|20\d\d)\b"
+)
+BREAKDOWN_WORDS = re.compile(
+    r"\b(por (uf|estado|regiao|cliente|produto|segmento|vendedor|municipio|familia|"
+    r"grupo|linha|empresa)|cada|ranking|top ?\d*|principais|mais vendid[oa]s|"
+    r"compar\w*|versus|vs|entre .+ e .+|agrupad\w*|distribuicao)\b"
+)
+# Rankings e top-N pedem GROUP BY/ORDER BY/LIMIT: "quem mais comprou", "vendeu
+# mais", "quais os 5 ...", "qual estado ... maior"
+DIMENSION_WORDS = (
+    r"(uf|estados?|regi(ao|oes)|clientes?|produtos?|segmentos?|vendedor(es)?|"
+    r"municipios?|cidades?|familias?|grupos?|linhas?|empresas?)"
+)
+RANKING_WORDS = re.compile(
+    r"\b((mais|menos) \w+(ou|eu|iu|aram|eram|iram)|\w+(ou|eu|iu|aram|eram|iram) "
+    r"(mais|menos)|quais( sao)? (os|as) \d+|"
+    rf"qua(l|is)( sao)?( (o|a|os|as))? {DIMENSION_WORDS}\b.*\b(maior|menor|"
+    r"maiores|menores|mais|menos|melhor|pior))\b"
+)
+EXPLORATORY_WORDS = re.compile(
+    r"\b(fale sobre|analise|explique|por que|porque|insights?|visao geral|"
+    r"resumo|panorama|sugira|recomend\w*)\b"
+)
+
+
+class RouteDecision:
+    """Rota escolhida para uma pergunta e os motivos."""
+
+    def __init__(self, route: str, features: Dict[str, int], reasons: List[str]):
+        self.route = route
+        self.features = features
+        self.reasons = reasons
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "route": self.route,
+            "features": self.features,
+            "reasons": self.reasons,
+        }
+
+
+class QuestionRouter:
+    """Classifica perguntas em simples (rota leve) ou complexas (agente completo)."""
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        max_columns: int = 2,
+        max_aggregations: int = 2,
+        max_words: int = 25,
+    ):
+        """
+        Args:
+            enabled: Se False, todas as perguntas vão para o agente completo
+            max_columns: Colunas citadas aceitas na rota leve
+            max_aggregations: Palavras de agregação aceitas na rota leve
+            max_words: Tamanho máximo (em palavras) de uma pergunta simples
+        """
+        self.enabled = enabled
+        self.max_columns = max_columns
+        self.max_aggregations = max_aggregations
+        self.max_words = max_words
+
+    @classmethod
+    def from_env(cls) -> "QuestionRouter":
+        """
+        Cria o roteador a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_ROUTING: "on" (padrão) ou "off" (sempre o agente completo)
+            AGENT_ROUTING_MAX_COLUMNS: colunas citadas aceitas na rota leve
+            AGENT_ROUTING_MAX_WORDS: tamanho máximo de uma pergunta simples
+
+        Returns:
+            Instância de QuestionRouter
+        """
+        return cls(
+            enabled=os.getenv("AGENT_ROUTING", "on").strip().lower() != "off",
+            max_columns=int(os.getenv("AGENT_ROUTING_MAX_COLUMNS", "2")),
+            max_words=int(os.getenv("AGENT_ROUTING_MAX_WORDS", "25")),
+        )
+
+    def classify(
+        self,
+        query: str,
+        rewrite: Optional[RewriteResult] = None,
+        columns: Optional[List[str]] = None,
+    ) -> RouteDecision:
+        """
+        Classifica a complexidade da pergunta.
+
+        Args:
+            query: Pergunta do usuário
+            rewrite: Resultado do QueryRewriter (colunas, filtros e métricas mapeados)
+            columns: Colunas do dataset, para detectar as citadas pelo nome
+
+        Returns:
+            RouteDecision com a rota, os atributos e os motivos de complexidade
+        """
+        hints = rewrite.hints if rewrite is not None else {}
+        text = rewrite.query if rewrite is not None else query
+        folded = fold(query)[0]
+
+        cited = {column for column in columns or [] if column in text}
+        cited.update((hints.get("colunas") or {}).values())
+        features = {
+            "columns": len(cited),
+            "filters": len(set((hints.get("filtros") or {}).values())),
+            "metrics": len(hints.get("metricas") or {}),
+            "aggregations": len(AGGREGATION_WORDS.findall(folded)),
+            "temporal": len(TEMPORAL_WORDS.findall(folded)),
+            "breakdown": len(BREAKDOWN_WORDS.findall(folded)),
+            "ranking": len(RANKING_WORDS.findall(folded)),
+            "exploratory": len(EXPLORATORY_WORDS.findall(folded)),
+            "words": len(folded.split()),
+        }
+
+        reasons = []
+        if features["columns"] + features["metrics"] > self.max_columns:
+            reasons.append("várias colunas")
+        if features["aggregations"] > self.max_aggregations:
+            reasons.append("várias agregações")
+        if features["filters"] > 1:
+            reasons.append("vários filtros")
+        if features["temporal"]:
+            reasons.append("comparação temporal")
+        if features["breakdown"]:
+            reasons.append("agrupamento ou comparação")
+        if features["ranking"]:
+            reasons.append("ranking ou top-N")
+        if features["exploratory"]:
+            reasons.append("pergunta exploratória")
+        if features["words"] > self.max_words:
+            reasons.append("pergunta longa")
+
+        route = LIGHT if self.enabled and not reasons else FULL
+        if not self.enabled:
+            reasons = ["roteamento desativado"]
+        return RouteDecision(route, features, reasons)
+
+
+class RouteMetrics:
+    """Contagem e latência das respostas por rota (seguro entre threads)."""
+
+    def __init__(self, max_samples: int = 1000):
+        self.counts: Dict[str, int] = {route: 0 for route in ROUTES}
+        self.errors: Dict[str, int] = {route: 0 for route in ROUTES}
+        self.latencies: Dict[str, deque] = {
+            route: deque(maxlen=max_samples) for route in ROUTES
+        }
+        self._lock = threading.Lock()
+
+    def record(self, route: str, seconds: float, error: bool = False):
+        with self._lock:
+            self.counts[route] += 1
+            if error:
+                self.errors[route] += 1
+            else:
+                self.latencies[route].append(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Contagens e percentis de latência (ms) por rota."""
+        snapshot: Dict[str, Any] = {}
+        with self._lock:
+            for route in ROUTES:
+                latencies = sorted(self.latencies[route])
+                entry: Dict[str, Any] = {
+                    "count": self.counts[route],
+                    "errors": self.errors[route],
+                }
+                for name, q in (("p50_ms", 0.5), ("p95_ms", 0.95)):
+                    entry[name] = (
+                        round(
+                            latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+                            * 1000,
+                            1,
+                        )
+                        if latencies
+                        else None
+                    )
+                snapshot[route] = entry
+        return snapshot
+
+
+_route_metrics: Optional[RouteMetrics] = None
+_route_metrics_lock = threading.Lock()
+
+
+def get_route_metrics() -> RouteMetrics:
+    """Métricas por rota do processo (compartilhadas por todas as sessões)."""
+    global _route_metrics
+    with _route_metrics_lock:
+        if _route_metrics is None:
+            _route_metrics = RouteMetrics()
+        return _route_metrics
+
+
+def _numbers(text: str) -> List[float]:
+    """Números de um texto em formato brasileiro ou americano (1.534.311.000, 12,5, 3.2)."""
+    values = []
+    for token in re.findall(r"\d[\d.,]*", text):
+        token = token.rstrip(".,")
+        if re.fullmatch(r"\d{1,3}(\.\d{3})+(,\d+)?", token):
+            token = token.replace(".", "").replace(",", ".")
+        elif re.fullmatch(r"\d{1,3}(,\d{3})+(\.\d+)?", token):
+            token = token.replace(",", "")
+        else:
+            token = token.replace(",", ".")
+        try:
+            values.append(float(token))
+        except ValueError:
+            continue
+    return values
+
+
+def answer_matches(expected: str, answer: str, tolerance: float = 0.005) -> bool:
+    """
+    Confere uma resposta com a resposta esperada do conjunto de QA.
+
+    Os números da resposta esperada precisam aparecer na resposta (tolerância
+    relativa); sem números, as palavras relevantes esperadas precisam aparecer.
+
+    Args:
+        expected: Resposta esperada
+        answer: Resposta do agente
+        tolerance: Diferença relativa aceita entre os números
+
+    Returns:
+        True se a resposta contém o resultado esperado
+    """
+    expected_numbers = _numbers(expected)
+    answer_numbers = _numbers(answer)
+    if expected_numbers:
+        return all(
+            any(
+                abs(value - candidate) <= tolerance * max(abs(value), 1.0)
+                for candidate in answer_numbers
+            )
+            for value in expected_numbers
+        )
+    expected_words = {word for word in fold(expected)[0].split() if len(word) > 3}
+    answer_folded = fold(answer)[0]
+    found = sum(1 for word in expected_words if word in answer_folded)
+    return bool(expected_words) and found / len(expected_words) >= 0.5
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(
+        description="Roteamento por complexidade sobre o conjunto de QA"
+    )
+    parser.add_argument("--questions", default="data/test_questions/qa_test_data.json")
+    parser.add_argument(
+        "--evaluate",
+        action="store_true",
+        help="Executa as perguntas no agente e mede acurácia e latência por rota",
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Com --evaluate, executa cada pergunta nas duas rotas",
+    )
+    args = parser.parse_args()
+
+    with open(args.questions, "r", encoding="utf-8") as f:
+        qa_items = json.load(f)
+
+    from query_rewriter import load_query_rewriter
+
+    router = QuestionRouter.from_env()
+    rewriter = load_query_rewriter()
+    for item in qa_items:
+        decision = router.classify(item["pergunta"], rewriter.rewrite(item["pergunta"]))
+        print(
+            f"[{decision.route:5}] {item['pergunta']}"
+            + (f"  ({', '.join(decision.reasons)})" if decision.reasons else "")
+        )
+
+    if args.evaluate:
+        from chatbot_agents import create_agent
+
+        agent, _ = create_agent(session_user_id="route-evaluation")
+        results: Dict[str, List[Dict[str, Any]]] = {route: [] for route in ROUTES}
+        for item in qa_items:
+            for route in ROUTES if args.compare else (None,):
+                agent.clear_session()
+                start = time.perf_counter()
+                try:
+                    response = agent.run(item["pergunta"], route=route)
+                    content = response.content or ""
+                except Exception as e:
+                    content = f"erro: {e}"
+                elapsed = time.perf_counter() - start
+                taken = agent.debug_info.get("route", {}).get("route", route or FULL)
+                results[taken].append(
+                    {
+                        "correct": answer_matches(item["resposta"], content),
+                        "latency_s": elapsed,
+                    }
+                )
+
+        print()
+        for route in ROUTES:
+            runs = results[route]
+            if not runs:
+                print(f"{route:5}: nenhuma pergunta nesta rota (use --compare)")
+                continue
+            latencies = sorted(run["latency_s"] for run in runs)
+            accuracy = sum(run["correct"] for run in runs) / len(runs)
+            print(
+                f"{route:5}: {len(runs)} perguntas | acurácia {accuracy:.0%} | "
+                f"p50 {latencies[len(latencies) // 2]:.2f}s | "
+                f"p95 {latencies[min(int(0.95 * len(latencies)), len(latencies) - 1)]:.2f}s"
+            )
+        agent.close()
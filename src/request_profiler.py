@@ -0,0 +1,271 @@
+"""
+Módulo de profiling por amostragem de requisições individuais.
+Durante uma execução do agente, uma thread amostra periodicamente as pilhas Python
+da thread da requisição (e das tarefas que ela enviou a pools auxiliares, marcadas
+com `profiled`), grava as pilhas no formato
+"collapsed" (flamegraph.pl, speedscope) e resume as funções mais quentes.
+"""
+
+import functools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+
+# Funções em que a thread está bloqueada (espera, I/O); não contam como CPU no resumo
+IDLE_FUNCTIONS = {
+    "wait",
+    "_wait_for_tstate_lock",
+    "acquire",
+    "sleep",
+    "select",
+    "poll",
+    "recv",
+    "recv_into",
+    "readinto",
+    "read",
+    "_read_status",
+    "result",
+    "_worker",
+}
+
+# Threads amostradas pelo profiling ativo no contexto atual: a da requisição e as
+# dos pools auxiliares enquanto executam tarefas dela (outras sessões ficam de fora)
+_profiled_threads: ContextVar[Optional[Set[int]]] = ContextVar(
+    "profiled_threads", default=None
+)
+
+
+def profiled(fn: Callable) -> Callable:
+    """
+    Marca uma tarefa enviada a um pool (consultas paralelas, chamadas ao modelo)
+    para que a thread que a executar seja amostrada junto com a requisição atual.
+
+    Args:
+        fn: Tarefa a executar em outra thread
+
+    Returns:
+        A própria tarefa, se não houver profiling ativo, ou um wrapper que registra
+        a thread durante a execução
+    """
+    threads = _profiled_threads.get()
+    if threads is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        ident = threading.get_ident()
+        threads.add(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            threads.discard(ident)
+
+    return run
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{code.co_name}"
+
+
+class RequestProfile:
+    """Resultado da amostragem de uma requisição."""
+
+    def __init__(self, label: str, interval_ms: float, top_n: int = 15):
+        self.label = label
+        self.interval_ms = interval_ms
+        self.top_n = top_n
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.duration_s = 0.0
+        self.path: Optional[str] = None
+
+    def add(self, thread_name: str, frame):
+        stack: List[str] = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            frame = frame.f_back
+        stack.append(f"thread:{thread_name}")
+        self.stacks[tuple(reversed(stack))] += 1
+
+    @property
+    def active_samples(self) -> int:
+        return sum(
+            count
+            for stack, count in self.stacks.items()
+            if stack[-1].split(":", 1)[1] not in IDLE_FUNCTIONS
+        )
+
+    def top_functions(self) -> List[Dict[str, Any]]:
+        """
+        Funções mais quentes, considerando apenas amostras fora de espera/I/O.
+
+        Returns:
+            Lista com função, amostras próprias (self), inclusivas e percentuais
+        """
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in self.stacks.items():
+            if stack[-1].split(":", 1)[1] in IDLE_FUNCTIONS:
+                continue
+            self_counts[stack[-1]] += count
+            for function in set(stack[1:]):
+                total_counts[function] += count
+
+        active = max(self.active_samples, 1)
+        ranking = sorted(
+            total_counts, key=lambda f: (self_counts[f], total_counts[f]), reverse=True
+        )
+        return [
+            {
+                "function": function,
+                "self": self_counts[function],
+                "total": total_counts[function],
+                "self_pct": round(100 * self_counts[function] / active, 1),
+                "total_pct": round(100 * total_counts[function] / active, 1),
+            }
+            for function in ranking[: self.top_n]
+        ]
+
+    def collapsed(self) -> str:
+        """Pilhas no formato collapsed: `quadro;quadro;... contagem` por linha."""
+        return "\n".join(
+            f"{';'.join(stack)} {count}" for stack, count in self.stacks.most_common()
+        )
+
+    def summary(self) -> str:
+        """Resumo textual das funções mais quentes."""
+        lines = [
+            f"{self.samples} amostras em {self.duration_s:.2f}s "
+            f"({self.active_samples} ativas, intervalo {self.interval_ms:g}ms)"
+        ]
+        for entry in self.top_functions():
+            lines.append(
+                f"{entry['self_pct']:5.1f}% self {entry['total_pct']:5.1f}% total  "
+                f"{entry['function']}"
+            )
+        return "\n".join(lines)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "active_samples": self.active_samples,
+            "duration_s": round(self.duration_s, 3),
+            "path": self.path,
+            "top": self.top_functions(),
+            "summary": self.summary(),
+        }
+
+
+class SamplingProfiler:
+    """Profiler por amostragem de pilhas, ativado apenas durante uma requisição."""
+
+    def __init__(
+        self,
+        interval_ms: float = 5.0,
+        output_dir: str = "logs/profiles",
+        top_n: int = 15,
+    ):
+        """
+        Args:
+            interval_ms: Intervalo entre amostras
+            output_dir: Diretório dos arquivos collapsed (um por requisição)
+            top_n: Número de funções no resumo
+        """
+        self.interval_ms = interval_ms
+        self.output_dir = output_dir
+        self.top_n = top_n
+
+    @classmethod
+    def from_env(cls) -> "SamplingProfiler":
+        """
+        Cria o profiler a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_PROFILE_INTERVAL_MS: intervalo entre amostras
+            AGENT_PROFILE_DIR: diretório dos arquivos collapsed
+            AGENT_PROFILE_TOP_N: número de funções no resumo
+
+        Returns:
+            Instância de SamplingProfiler
+        """
+        return cls(
+            interval_ms=float(os.getenv("AGENT_PROFILE_INTERVAL_MS", "5")),
+            output_dir=os.getenv("AGENT_PROFILE_DIR", "logs/profiles"),
+            top_n=int(os.getenv("AGENT_PROFILE_TOP_N", "15")),
+        )
+
+    def _sample_loop(
+        self, profile: RequestProfile, threads: Set[int], stop: threading.Event
+    ):
+        interval = self.interval_ms / 1000
+        own = threading.get_ident()
+        while not stop.wait(interval):
+            targets = set(threads)
+            names = {
+                thread.ident: thread.name
+                for thread in threading.enumerate()
+                if thread.ident in targets
+            }
+            frames = sys._current_frames()
+            for ident, name in names.items():
+                frame = frames.get(ident)
+                if frame is not None and ident != own:
+                    profile.add(name, frame)
+            profile.samples += 1
+
+    @contextmanager
+    def profile(self, label: str = "request") -> Iterator[RequestProfile]:
+        """
+        Amostra a thread atual (e as tarefas dela marcadas com `profiled`)
+        enquanto o bloco executa.
+
+        Args:
+            label: Identificação da requisição (usada no nome do arquivo)
+
+        Yields:
+            RequestProfile preenchido ao final do bloco
+        """
+        profile = RequestProfile(label, self.interval_ms, self.top_n)
+        threads = {threading.get_ident()}
+        token = _profiled_threads.set(threads)
+        stop = threading.Event()
+        sampler = threading.Thread(
+            target=self._sample_loop,
+            args=(profile, threads, stop),
+            name="request-profiler",
+            daemon=True,
+        )
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield profile
+        finally:
+            _profiled_threads.reset(token)
+            stop.set()
+            sampler.join()
+            profile.duration_s = time.perf_counter() - start
+            profile.path = self._write(profile)
+
+    def _write(self, profile: RequestProfile) -> Optional[str]:
+        """Grava o arquivo collapsed da requisição."""
+        try:
+            os.makedirs(self.output_dir, exist_ok=True)
+            safe_label = re.sub(r"[^A-Za-z0-9_-]", "_", profile.label)[:40]
+            path = os.path.join(
+                self.output_dir,
+                f"{datetime.now():%Y%m%d_%H%M%S_%f}_{safe_label}.collapsed",
+            )
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(profile.collapsed() + "\n")
+            return path
+        except OSError:
+            return None
@@ -0,0 +1,225 @@
+"""
+Módulo de exportação de resultados de consultas.
+Grava o resultado completo de uma consulta em CSV ou Parquet lendo lotes Arrow
+direto do DuckDB (sem DataFrame pandas), para que listas grandes cheguem ao
+usuário como arquivo para download sem passar pelo contexto do modelo.
+Os arquivos expiram por idade e por quantidade, e os de uma sessão são apagados
+quando ela é encerrada.
+"""
+
+import os
+import re
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional
+
+EXPORT_FORMATS = ("csv", "parquet")
+
+
+class ExportResult:
+    """Arquivo exportado e seus metadados."""
+
+    def __init__(
+        self, path: str, file_format: str, rows: int, columns: int, elapsed_s: float
+    ):
+        self.path = path
+        self.format = file_format
+        self.rows = rows
+        self.columns = columns
+        self.elapsed_s = elapsed_s
+
+    @property
+    def file_name(self) -> str:
+        return os.path.basename(self.path)
+
+    @property
+    def size_bytes(self) -> int:
+        return os.path.getsize(self.path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "file_name": self.file_name,
+            "format": self.format,
+            "rows": self.rows,
+            "columns": self.columns,
+            "size_bytes": self.size_bytes,
+            "elapsed_s": round(self.elapsed_s, 3),
+        }
+
+
+class ResultExporter:
+    """Exporta resultados de consultas em lotes Arrow para CSV ou Parquet."""
+
+    def __init__(
+        self,
+        export_dir: str = "exports",
+        batch_rows: int = 100_000,
+        max_rows: Optional[int] = None,
+        timeout_s: float = 300.0,
+        ttl_s: float = 86400.0,
+        max_files: int = 200,
+    ):
+        """
+        Args:
+            export_dir: Diretório dos arquivos exportados
+            batch_rows: Linhas por lote lido do DuckDB
+            max_rows: Linhas máximas por exportação (None = sem limite)
+            timeout_s: Tempo máximo de uma exportação
+            ttl_s: Idade após a qual um arquivo exportado é apagado
+            max_files: Número máximo de arquivos mantidos (os mais antigos saem)
+        """
+        self.export_dir = export_dir
+        self.batch_rows = batch_rows
+        self.max_rows = max_rows
+        self.timeout_s = timeout_s
+        self.ttl_s = ttl_s
+        self.max_files = max_files
+
+    @classmethod
+    def from_env(cls) -> "ResultExporter":
+        """
+        Cria o exportador a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_EXPORT_DIR: diretório dos arquivos exportados
+            AGENT_EXPORT_BATCH_ROWS: linhas por lote lido do DuckDB
+            AGENT_EXPORT_MAX_ROWS: linhas máximas por exportação (0 = sem limite)
+            AGENT_EXPORT_TIMEOUT_S: tempo máximo de uma exportação
+            AGENT_EXPORT_TTL_S: idade (s) após a qual um arquivo é apagado
+            AGENT_EXPORT_MAX_FILES: número máximo de arquivos mantidos
+
+        Returns:
+            Instância de ResultExporter
+        """
+        max_rows = int(os.getenv("AGENT_EXPORT_MAX_ROWS", "0"))
+        return cls(
+            export_dir=os.getenv("AGENT_EXPORT_DIR", "exports"),
+            batch_rows=int(os.getenv("AGENT_EXPORT_BATCH_ROWS", "100000")),
+            max_rows=max_rows if max_rows > 0 else None,
+            timeout_s=float(os.getenv("AGENT_EXPORT_TIMEOUT_S", "300")),
+            ttl_s=float(os.getenv("AGENT_EXPORT_TTL_S", "86400")),
+            max_files=int(os.getenv("AGENT_EXPORT_MAX_FILES", "200")),
+        )
+
+    def export(
+        self, connection, query: str, file_format: str = "csv", label: str = "consulta"
+    ) -> ExportResult:
+        """
+        Executa a consulta e grava o resultado em lotes (arquivo publicado com rename atômico).
+
+        Args:
+            connection: Conexão (ou cursor) do DuckDB
+            query: Consulta SQL já validada
+            file_format: "csv" ou "parquet"
+            label: Nome base do arquivo
+
+        Returns:
+            ExportResult com o caminho e o número de linhas
+        """
+        import pyarrow.csv as pa_csv
+        import pyarrow.parquet as pq
+
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(
+                f"Formato '{file_format}' não suportado; use {', '.join(EXPORT_FORMATS)}"
+            )
+
+        start = time.perf_counter()
+        reader = connection.execute(query).fetch_record_batch(self.batch_rows)
+        schema = reader.schema
+
+        os.makedirs(self.export_dir, exist_ok=True)
+        safe_label = re.sub(r"[^A-Za-z0-9_-]", "_", label)[:40] or "consulta"
+        path = os.path.join(
+            self.export_dir,
+            f"{safe_label}_{datetime.now():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:6]}.{file_format}",
+        )
+        fd, tmp_path = tempfile.mkstemp(
+            prefix=".export-", suffix=f".{file_format}", dir=self.export_dir
+        )
+        os.close(fd)
+
+        rows = 0
+        try:
+            writer = (
+                pa_csv.CSVWriter(tmp_path, schema)
+                if file_format == "csv"
+                else pq.ParquetWriter(tmp_path, schema, compression="zstd")
+            )
+            try:
+                for batch in reader:
+                    if (
+                        self.max_rows is not None
+                        and rows + batch.num_rows > self.max_rows
+                    ):
+                        batch = batch.slice(0, self.max_rows - rows)
+                    writer.write_batch(batch)
+                    rows += batch.num_rows
+                    if self.max_rows is not None and rows >= self.max_rows:
+                        break
+            finally:
+                writer.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        return ExportResult(
+            path, file_format, rows, len(schema), time.perf_counter() - start
+        )
+
+    def resolve(self, file_name: str) -> Optional[str]:
+        """Caminho de um arquivo exportado a partir do nome (sem sair do diretório)."""
+        path = os.path.join(self.export_dir, os.path.basename(file_name))
+        return path if os.path.isfile(path) else None
+
+    def remove(self, paths: Iterable[str]) -> int:
+        """
+        Apaga arquivos exportados (ex: os de uma sessão encerrada).
+
+        Returns:
+            Número de arquivos removidos
+        """
+        removed = 0
+        for path in paths:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                continue
+        return removed
+
+    def remove_expired(self) -> int:
+        """
+        Apaga os arquivos mais antigos que o TTL e, acima do limite de quantidade,
+        os mais antigos primeiro.
+
+        Returns:
+            Número de arquivos removidos
+        """
+        if not os.path.isdir(self.export_dir):
+            return 0
+        files = []
+        for name in os.listdir(self.export_dir):
+            path = os.path.join(self.export_dir, name)
+            try:
+                files.append((os.path.getmtime(path), name, path))
+            except OSError:
+                continue
+
+        cutoff = time.time() - self.ttl_s
+        # Temporários ".export-*" recentes são exportações em andamento
+        expired = [path for mtime, _, path in files if mtime < cutoff]
+        kept = sorted(
+            (mtime, path)
+            for mtime, name, path in files
+            if mtime >= cutoff and not name.startswith(".export-")
+        )
+        excess = len(kept) - self.max_files
+        if excess > 0:
+            expired += [path for _, path in kept[:excess]]
+        return self.remove(expired)
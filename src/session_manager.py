@@ -0,0 +1,348 @@
+"""
+Módulo de ciclo de vida das sessões.
+Mantém os recursos de cada sessão (agente, banco de memória SQLite, conexão
+DuckDB, caches e estado de debug) com expiração por inatividade (TTL), despejo
+LRU acima do limite de sessões, limpeza em segundo plano dos arquivos
+temp_memory_*.db órfãos e das exportações expiradas e métricas de sessões ativas
+e memória ocupada.
+"""
+
+import glob
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+MEMORY_DB_PREFIX = "temp_memory_"
+
+
+def memory_db_path(session_id: Optional[str]) -> str:
+    """Caminho do banco de memória SQLite de uma sessão."""
+    return os.path.join(
+        tempfile.gettempdir(), f"{MEMORY_DB_PREFIX}{session_id or 'default'}.db"
+    )
+
+
+class SessionEntry:
+    """Recursos de uma sessão e seus instantes de criação e último uso."""
+
+    def __init__(self, session_id: str, agent: Any, extra: Any = None):
+        self.session_id = session_id
+        self.agent = agent
+        self.extra = extra
+        self.created_at = time.time()
+        self.last_used = time.monotonic()
+        self.requests = 0
+        # Requisições em andamento: a sessão só é liberada quando chega a zero
+        self.in_use = 0
+        self.closing = False
+
+    def resource_usage(self) -> Dict[str, int]:
+        """Memória estimada dos recursos da sessão (bytes por componente)."""
+        usage = getattr(self.agent, "resource_usage", None)
+        return usage() if callable(usage) else {}
+
+
+class SessionManager:
+    """Sessões com TTL de inatividade, limite LRU e limpeza em segundo plano."""
+
+    def __init__(
+        self,
+        factory: Callable[..., Any],
+        ttl_s: float = 1800.0,
+        max_sessions: int = 8,
+        cleanup_interval_s: float = 60.0,
+    ):
+        """
+        Args:
+            factory: Função que cria os recursos da sessão a partir do id; pode
+                devolver o agente ou uma tupla (agente, extra)
+            ttl_s: Tempo de inatividade após o qual a sessão é encerrada
+            max_sessions: Número máximo de sessões vivas (as menos usadas saem)
+            cleanup_interval_s: Intervalo da limpeza em segundo plano
+        """
+        self.factory = factory
+        self.ttl_s = ttl_s
+        self.max_sessions = max_sessions
+        self.cleanup_interval_s = cleanup_interval_s
+        self.sessions: "OrderedDict[str, SessionEntry]" = OrderedDict()
+        self.evictions: Dict[str, int] = {"ttl": 0, "lru": 0, "closed": 0}
+        self.orphan_files_removed = 0
+        self._lock = threading.Lock()
+        self._creating: Dict[str, threading.Lock] = {}
+        self._stop = threading.Event()
+        self._cleanup_thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, factory: Callable[..., Any]) -> "SessionManager":
+        """
+        Cria o gerenciador a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_SESSION_TTL_S: inatividade (s) até encerrar a sessão
+            AGENT_MAX_SESSIONS: número máximo de sessões vivas por processo
+            AGENT_SESSION_CLEANUP_S: intervalo da limpeza em segundo plano
+
+        Returns:
+            Instância de SessionManager (limpeza em segundo plano iniciada)
+        """
+        manager = cls(
+            factory,
+            ttl_s=float(os.getenv("AGENT_SESSION_TTL_S", "1800")),
+            max_sessions=int(os.getenv("AGENT_MAX_SESSIONS", "8")),
+            cleanup_interval_s=float(os.getenv("AGENT_SESSION_CLEANUP_S", "60")),
+        )
+        manager.start_cleanup()
+        return manager
+
+    def get(self, session_id: str, **factory_kwargs) -> SessionEntry:
+        """
+        Recursos da sessão, criados no primeiro uso (marca a sessão como em uso).
+
+        Cada chamada deve ter um `release` correspondente quando a requisição
+        terminar; enquanto houver uso, a sessão não é despejada. Prefira `use`.
+
+        Args:
+            session_id: Identificador da sessão
+            **factory_kwargs: Argumentos extras da factory (usados só na criação)
+
+        Returns:
+            SessionEntry da sessão
+        """
+        with self._lock:
+            entry = self.sessions.get(session_id)
+            if entry is not None:
+                self.sessions.move_to_end(session_id)
+                entry.last_used = time.monotonic()
+                entry.requests += 1
+                entry.in_use += 1
+                return entry
+            creating = self._creating.setdefault(session_id, threading.Lock())
+
+        # Criação fora do lock global: outras sessões não esperam o agente novo
+        with creating:
+            with self._lock:
+                entry = self.sessions.get(session_id)
+                if entry is not None:
+                    # Criada por outra requisição enquanto esta esperava
+                    self.sessions.move_to_end(session_id)
+                    entry.last_used = time.monotonic()
+                    entry.requests += 1
+                    entry.in_use += 1
+                    return entry
+
+            created = self.factory(session_id, **factory_kwargs)
+            agent, extra = created if isinstance(created, tuple) else (created, None)
+            entry = SessionEntry(session_id, agent, extra)
+            with self._lock:
+                entry.requests += 1
+                entry.in_use += 1
+                self.sessions[session_id] = entry
+                self._creating.pop(session_id, None)
+                evicted = self._pop_lru()
+            for old in evicted:
+                self._release(old)
+            return entry
+
+    def release(self, entry: SessionEntry):
+        """
+        Marca o fim de uma requisição da sessão (par de `get`).
+
+        Sessões encerradas enquanto estavam em uso são liberadas aqui, pelo último
+        usuário; o limite LRU volta a ser aplicado quando a sessão fica ociosa.
+        """
+        with self._lock:
+            entry.in_use = max(0, entry.in_use - 1)
+            entry.last_used = time.monotonic()
+            idle = entry.in_use == 0
+            release_now = idle and entry.closing
+            evicted = self._pop_lru() if idle else []
+        if release_now:
+            self._release(entry)
+        for old in evicted:
+            self._release(old)
+
+    @contextmanager
+    def use(self, session_id: str, **factory_kwargs):
+        """
+        Recursos da sessão durante uma requisição (`get` + `release`).
+
+        Args:
+            session_id: Identificador da sessão
+            **factory_kwargs: Argumentos extras da factory (usados só na criação)
+
+        Yields:
+            SessionEntry da sessão
+        """
+        entry = self.get(session_id, **factory_kwargs)
+        try:
+            yield entry
+        finally:
+            self.release(entry)
+
+    def _pop_lru(self):
+        """
+        Remove (sob o lock) as sessões ociosas menos usadas acima do limite.
+        Sessões em uso nunca são despejadas: o limite pode ser excedido até elas
+        terminarem.
+        """
+        evicted = []
+        excess = len(self.sessions) - self.max_sessions
+        for session_id in list(self.sessions):
+            if excess <= 0:
+                break
+            if self.sessions[session_id].in_use:
+                continue
+            evicted.append(self.sessions.pop(session_id))
+            self.evictions["lru"] += 1
+            excess -= 1
+        return evicted
+
+    def clear_session(self, session_id: str):
+        """Descarta memória, caches e debug da sessão mantendo o agente carregado."""
+        with self._lock:
+            entry = self.sessions.get(session_id)
+        if entry is not None and hasattr(entry.agent, "clear_session"):
+            entry.agent.clear_session()
+
+    def close(self, session_id: str) -> bool:
+        """
+        Encerra uma sessão e libera seus recursos.
+
+        Returns:
+            True se a sessão existia
+        """
+        with self._lock:
+            entry = self.sessions.pop(session_id, None)
+            if entry is not None:
+                self.evictions["closed"] += 1
+                # Em uso: liberada pelo último `release`
+                entry.closing = entry.in_use > 0
+        if entry is None:
+            return False
+        if not entry.closing:
+            self._release(entry)
+        return True
+
+    def evict_expired(self) -> int:
+        """
+        Encerra as sessões inativas há mais que o TTL.
+
+        Returns:
+            Número de sessões encerradas
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [
+                session_id
+                for session_id, entry in self.sessions.items()
+                if not entry.in_use and now - entry.last_used > self.ttl_s
+            ]
+            entries = [self.sessions.pop(session_id) for session_id in expired]
+            self.evictions["ttl"] += len(entries)
+        for entry in entries:
+            self._release(entry)
+        return len(entries)
+
+    def remove_orphan_files(self) -> int:
+        """
+        Remove bancos de memória de sessões que não estão vivas neste processo
+        (execuções anteriores, sessões encerradas por outro caminho) e arquivos
+        exportados expirados (por idade ou acima do limite de quantidade).
+
+        Returns:
+            Número de arquivos removidos
+        """
+        from result_export import ResultExporter
+
+        with self._lock:
+            live = {memory_db_path(session_id) for session_id in self.sessions}
+        pattern = os.path.join(tempfile.gettempdir(), f"{MEMORY_DB_PREFIX}*.db")
+        # Margem de 2x o TTL: outro processo (ex: worker do pool) pode usar o arquivo
+        cutoff = time.time() - 2 * self.ttl_s
+        removed = 0
+        for path in glob.glob(pattern):
+            try:
+                if path not in live and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        removed += ResultExporter.from_env().remove_expired()
+        self.orphan_files_removed += removed
+        return removed
+
+    def _release(self, entry: SessionEntry):
+        """Libera os recursos de uma sessão encerrada."""
+        close = getattr(entry.agent, "close", None)
+        try:
+            if callable(close):
+                close()
+        finally:
+            entry.agent = None
+            entry.extra = None
+
+    def start_cleanup(self):
+        """Inicia a thread de limpeza periódica (idempotente)."""
+        if self._cleanup_thread is not None or self.cleanup_interval_s <= 0:
+            return
+
+        def loop():
+            self.remove_orphan_files()
+            while not self._stop.wait(self.cleanup_interval_s):
+                try:
+                    self.evict_expired()
+                    self.remove_orphan_files()
+                except Exception:
+                    # A limpeza nunca deve derrubar o processo
+                    continue
+
+        self._cleanup_thread = threading.Thread(
+            target=loop, name="session-cleanup", daemon=True
+        )
+        self._cleanup_thread.start()
+
+    def shutdown(self):
+        """Para a limpeza e encerra todas as sessões."""
+        self._stop.set()
+        with self._lock:
+            entries = list(self.sessions.values())
+            self.sessions.clear()
+            for entry in entries:
+                entry.closing = entry.in_use > 0
+        for entry in entries:
+            if not entry.closing:
+                self._release(entry)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Sessões vivas, despejos e memória estimada por sessão."""
+        with self._lock:
+            entries = list(self.sessions.values())
+            evictions = dict(self.evictions)
+        now = time.monotonic()
+        sessions = []
+        total_bytes = 0
+        for entry in entries:
+            usage = entry.resource_usage()
+            total_bytes += sum(usage.values())
+            sessions.append(
+                {
+                    "session_id": entry.session_id,
+                    "idle_s": round(now - entry.last_used, 1),
+                    "requests": entry.requests,
+                    "in_use": entry.in_use,
+                    "memory_bytes": usage,
+                }
+            )
+        return {
+            "live_sessions": len(entries),
+            "max_sessions": self.max_sessions,
+            "ttl_s": self.ttl_s,
+            "evictions": evictions,
+            "orphan_files_removed": self.orphan_files_removed,
+            "total_memory_bytes": total_bytes,
+            "sessions": sessions,
+        }
@@ -0,0 +1,376 @@
+"""
+Módulo de proteção (guard) para as consultas SQL geradas pelo modelo.
+Valida cada consulta antes da execução: apenas leitura, uma instrução por vez,
+plano verificado com EXPLAIN, limite de linhas e tempo máximo de execução.
+"""
+
+import json
+import os
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+import duckdb
+
+# Tipos de instrução permitidos (somente leitura); EXPLAIN só sobre SELECT e sem ANALYZE
+READ_ONLY_STATEMENTS = {duckdb.StatementType.SELECT, duckdb.StatementType.EXPLAIN}
+
+# Prefixo de um EXPLAIN: opções entre parênteses e ANALYZE (que executa a instrução)
+EXPLAIN_PREFIX = re.compile(
+    r"^\s*EXPLAIN\b\s*(?:\((?P<options>[^)]*)\)\s*)?(?P<analyze>ANALY[SZ]E\b)?",
+    re.IGNORECASE,
+)
+
+# Ferramentas herdadas do DuckDbTools que criam tabelas, carregam arquivos ou índices
+WRITE_TOOLS = [
+    "create_table_from_path",
+    "load_local_path_to_table",
+    "load_local_csv_to_table",
+    "load_s3_path_to_table",
+    "load_s3_csv_to_table",
+    "create_fts_index",
+]
+
+# Operadores que já limitam o número de linhas do resultado
+LIMIT_OPERATORS = {"LIMIT", "STREAMING_LIMIT", "TOP_N", "LIMIT_PERCENT"}
+
+# Operadores que combinam todas as linhas de um lado com todas do outro
+CROSS_JOIN_OPERATORS = {"CROSS_PRODUCT", "NESTED_LOOP_JOIN", "BLOCKWISE_NL_JOIN"}
+
+
+def guard_error(code: str, message: str, suggestion: str = "") -> str:
+    """
+    Monta a mensagem de erro estruturada devolvida ao modelo.
+
+    Args:
+        code: Código do erro (ex: READ_ONLY_VIOLATION)
+        message: Descrição do problema
+        suggestion: Sugestão de correção para o modelo
+
+    Returns:
+        Erro serializado em JSON
+    """
+    return json.dumps(
+        {
+            "status": "error",
+            "code": code,
+            "message": message,
+            "suggestion": suggestion,
+        },
+        ensure_ascii=False,
+    )
+
+
+class GuardResult:
+    """Resultado da validação de uma consulta pelo SqlGuard."""
+
+    def __init__(
+        self,
+        allowed: bool,
+        sql: str = "",
+        error: Optional[str] = None,
+        notes: Optional[List[str]] = None,
+    ):
+        self.allowed = allowed
+        self.sql = sql
+        self.error = error
+        self.notes = notes or []
+
+
+class SqlGuard:
+    """Valida, reescreve e executa consultas SQL com limites de segurança."""
+
+    def __init__(
+        self,
+        timeout_seconds: float = 30.0,
+        max_result_rows: int = 1000,
+        max_join_rows: int = 20_000_000,
+        max_batch_queries: int = 8,
+    ):
+        """
+        Inicializa o guard.
+
+        Args:
+            timeout_seconds: Tempo máximo de execução por consulta
+            max_result_rows: Linhas máximas de uma consulta sem LIMIT antes da reescrita
+            max_join_rows: Cardinalidade máxima estimada para junções sem condição
+            max_batch_queries: Número máximo de consultas por lote (run_queries)
+        """
+        self.timeout_seconds = timeout_seconds
+        self.max_result_rows = max_result_rows
+        self.max_join_rows = max_join_rows
+        self.max_batch_queries = max_batch_queries
+
+    @classmethod
+    def from_env(cls) -> "SqlGuard":
+        """
+        Cria o guard a partir das variáveis de ambiente.
+
+        Variáveis suportadas:
+            AGENT_SQL_TIMEOUT_S: tempo máximo por consulta em segundos
+            AGENT_SQL_MAX_RESULT_ROWS: linhas máximas sem LIMIT explícito
+            AGENT_SQL_MAX_JOIN_ROWS: cardinalidade máxima de junções sem condição
+            AGENT_SQL_MAX_BATCH: número máximo de consultas por lote
+
+        Returns:
+            Instância de SqlGuard
+        """
+        return cls(
+            timeout_seconds=float(os.getenv("AGENT_SQL_TIMEOUT_S", "30")),
+            max_result_rows=int(os.getenv("AGENT_SQL_MAX_RESULT_ROWS", "1000")),
+            max_join_rows=int(os.getenv("AGENT_SQL_MAX_JOIN_ROWS", "20000000")),
+            max_batch_queries=int(os.getenv("AGENT_SQL_MAX_BATCH", "8")),
+        )
+
+    def validate(self, connection, query: str, add_limit: bool = True) -> GuardResult:
+        """
+        Valida uma consulta: parsing, tipo de instrução e plano via EXPLAIN.
+
+        Args:
+            connection: Conexão do DuckDB usada para o EXPLAIN
+            query: Consulta SQL gerada pelo modelo
+            add_limit: Limita consultas com muitas linhas estimadas (desligado na exportação)
+
+        Returns:
+            GuardResult com a consulta (possivelmente reescrita) ou o erro
+        """
+        sql = query.replace("`", "").strip().rstrip(";").strip()
+        if not sql:
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "EMPTY_QUERY",
+                    "A consulta está vazia.",
+                    "Envie uma instrução SELECT completa.",
+                ),
+            )
+
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "SQL_SYNTAX_ERROR",
+                    str(e),
+                    "Corrija a sintaxe SQL e tente novamente.",
+                ),
+            )
+
+        if len(statements) != 1:
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "MULTIPLE_STATEMENTS",
+                    f"Foram enviadas {len(statements)} instruções em uma única chamada.",
+                    "Envie uma instrução SELECT por chamada.",
+                ),
+            )
+
+        statement_type = statements[0].type
+        if statement_type not in READ_ONLY_STATEMENTS:
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "READ_ONLY_VIOLATION",
+                    f"Instruções do tipo {statement_type.name} não são permitidas.",
+                    "Use apenas consultas SELECT de leitura sobre os dados.",
+                ),
+            )
+
+        if statement_type == duckdb.StatementType.EXPLAIN:
+            return self._validate_explain(sql)
+
+        try:
+            plan_json = connection.execute(f"EXPLAIN (FORMAT JSON) {sql}").fetchall()
+            plan = json.loads(plan_json[0][1])[0]
+        except duckdb.Error as e:
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "SQL_VALIDATION_ERROR",
+                    str(e),
+                    "Verifique nomes de tabelas e colunas e tente novamente.",
+                ),
+            )
+
+        cross_join_rows = self._max_cross_join_rows(plan)
+        if cross_join_rows > self.max_join_rows:
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "CROSS_JOIN",
+                    f"A consulta combina todas as linhas das tabelas (~{cross_join_rows:,} linhas estimadas).",
+                    "Adicione uma condição de junção (JOIN ... ON) ou agregue antes de combinar.",
+                ),
+            )
+
+        notes = []
+        # Um LIMIT explícito prevalece sobre a estimativa do plano (que pode
+        # refletir a tabela inteira, ex: TOP_N com materialização tardia)
+        explicit_limit = self._explicit_limit(connection, sql) if add_limit else None
+        if explicit_limit is not None:
+            if explicit_limit > self.max_result_rows:
+                sql = self._add_limit(sql)
+                notes.append(
+                    f"LIMIT {explicit_limit:,} acima do máximo: resultado limitado a "
+                    f"{self.max_result_rows} linhas. "
+                    "Use agregações ou filtros para respostas completas."
+                )
+        elif add_limit:
+            estimated_rows = self._estimated_rows(plan)
+            if estimated_rows is not None and estimated_rows > self.max_result_rows:
+                sql = self._add_limit(sql)
+                notes.append(
+                    f"Consulta sem LIMIT com ~{estimated_rows:,} linhas estimadas: "
+                    f"resultado limitado a {self.max_result_rows} linhas. "
+                    "Use agregações ou filtros para respostas completas."
+                )
+
+        return GuardResult(True, sql=sql, notes=notes)
+
+    def _validate_explain(self, sql: str) -> GuardResult:
+        """Aceita EXPLAIN apenas de uma consulta SELECT e sem ANALYZE."""
+        match = EXPLAIN_PREFIX.match(sql)
+        options = (match.group("options") or "") if match else ""
+        if match is None or match.group("analyze") or "ANALY" in options.upper():
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "READ_ONLY_VIOLATION",
+                    "EXPLAIN ANALYZE executa a instrução e não é permitido.",
+                    "Use EXPLAIN sem ANALYZE, ou execute a consulta SELECT diretamente.",
+                ),
+            )
+
+        try:
+            inner = duckdb.extract_statements(sql[match.end() :])
+        except duckdb.Error:
+            inner = []
+        if len(inner) != 1 or inner[0].type != duckdb.StatementType.SELECT:
+            return GuardResult(
+                False,
+                error=guard_error(
+                    "READ_ONLY_VIOLATION",
+                    "EXPLAIN é permitido apenas sobre consultas SELECT.",
+                    "Use apenas consultas SELECT de leitura sobre os dados.",
+                ),
+            )
+        return GuardResult(True, sql=sql)
+
+    def _explicit_limit(self, connection, sql: str) -> Optional[int]:
+        """LIMIT constante do nível externo da consulta, se houver."""
+        try:
+            tree = json.loads(
+                connection.execute("SELECT json_serialize_sql(?)", [sql]).fetchone()[0]
+            )
+            modifiers = tree["statements"][0]["node"].get("modifiers", [])
+        except (duckdb.Error, KeyError, IndexError, TypeError, ValueError):
+            return None
+        for modifier in modifiers:
+            if modifier.get("type") != "LIMIT_MODIFIER":
+                continue
+            value = (modifier.get("limit") or {}).get("value", {})
+            if not value.get("is_null", True):
+                try:
+                    return int(value.get("value"))
+                except (TypeError, ValueError):
+                    return None
+        return None
+
+    def execute(
+        self,
+        connection,
+        run: Callable[[], Any],
+        timeout_seconds: Optional[float] = None,
+    ) -> Any:
+        """
+        Executa uma função de consulta com limite de tempo via interrupt da conexão.
+
+        Args:
+            connection: Conexão do DuckDB que será interrompida em caso de timeout
+            run: Função sem argumentos que executa a consulta
+            timeout_seconds: Tempo máximo (padrão: o do guard)
+
+        Returns:
+            Retorno de `run` ou erro estruturado de timeout
+        """
+        timed_out = threading.Event()
+
+        def interrupt():
+            timed_out.set()
+            connection.interrupt()
+
+        timeout_seconds = timeout_seconds or self.timeout_seconds
+        timer = threading.Timer(timeout_seconds, interrupt)
+        timer.daemon = True
+        timer.start()
+        try:
+            result = run()
+        except duckdb.InterruptException:
+            result = None
+        except Exception:
+            # Lida por um RecordBatchReader (ex: exportação), a interrupção chega
+            # como erro do pyarrow ou RuntimeError em vez de InterruptException
+            if not timed_out.is_set():
+                raise
+            result = None
+        finally:
+            timer.cancel()
+
+        if timed_out.is_set():
+            return guard_error(
+                "QUERY_TIMEOUT",
+                f"A consulta excedeu o tempo máximo de {timeout_seconds:g}s e foi cancelada.",
+                "Simplifique a consulta: filtre períodos, agregue antes de juntar ou use LIMIT.",
+            )
+        return result
+
+    def _estimated_rows(self, node: Dict[str, Any]) -> Optional[int]:
+        """Estima o número de linhas produzidas por um nó do plano."""
+        name = node.get("name", "").strip()
+        if name in LIMIT_OPERATORS:
+            return None
+
+        # Estimativas ausentes ou zeradas (ex: projeção sobre ORDER BY) não são confiáveis
+        estimate = node.get("extra_info", {}).get("Estimated Cardinality")
+        try:
+            if estimate is not None and int(estimate) > 0:
+                return int(estimate)
+        except (TypeError, ValueError):
+            pass
+
+        if name == "UNGROUPED_AGGREGATE":
+            return 1
+
+        children = node.get("children", [])
+        if name in CROSS_JOIN_OPERATORS and len(children) == 2:
+            left = self._estimated_rows(children[0]) or 1
+            right = self._estimated_rows(children[1]) or 1
+            return left * right
+        if children:
+            return self._estimated_rows(children[0])
+        return None
+
+    def _max_cross_join_rows(self, node: Dict[str, Any]) -> int:
+        """Retorna a maior cardinalidade estimada entre as junções sem condição do plano."""
+        largest = 0
+        if node.get("name", "").strip() in CROSS_JOIN_OPERATORS:
+            largest = self._estimated_rows(node) or 0
+        for child in node.get("children", []):
+            largest = max(largest, self._max_cross_join_rows(child))
+        return largest
+
+    def _add_limit(self, sql: str) -> str:
+        """Acrescenta um LIMIT à consulta, envolvendo-a em subconsulta se necessário."""
+        candidate = f"{sql}\nLIMIT {self.max_result_rows}"
+        try:
+            if len(duckdb.extract_statements(candidate)) == 1:
+                return candidate
+        except duckdb.Error:
+            pass
+        # Quebra de linha antes do parêntese: um comentário "--" no fim da consulta
+        # não pode engolir o fechamento da subconsulta
+        return (
+            f"SELECT * FROM (\n{sql}\n) AS guarded_query LIMIT {self.max_result_rows}"
+        )
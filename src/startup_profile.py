@@ -0,0 +1,171 @@
+"""
+Módulo de inicialização rápida (cold start) do agente.
+Aquece em segundo plano os módulos pesados enquanto a interface é renderizada
+e gera um relatório do tempo de import por módulo, com verificação de orçamento.
+
+Uso:
+    python src/startup_profile.py [orçamento_ms]
+"""
+
+import importlib
+import os
+import subprocess
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, Tuple, Union
+
+# Módulos importados sob demanda por create_agent, na ordem de aquecimento
+HEAVY_MODULES = [
+    "pandas",
+    "numpy",
+    "pyarrow.parquet",
+    "duckdb",
+    "openai",
+    "agno.agent",
+    "agno.models.openai",
+    "agno.tools.duckdb",
+    "agno.tools.reasoning",
+    "agno.knowledge",
+    "agno.memory.v2.memory",
+    "agno.memory.v2.db.sqlite",
+    "expression_tools",
+    "sql_guard",
+    "dataset_profile",
+    "dataset_refresh",
+]
+
+# Módulos do projeto importados por app.py no carregamento da página
+APP_MODULES = [
+    "chatbot_agents",
+    "memory_budget",
+    "execution_backend",
+    "session_manager",
+    "startup_profile",
+]
+
+_warm_up_thread: Optional[threading.Thread] = None
+warm_up_timings: Dict[str, float] = {}
+
+
+def start_warm_up(modules: Optional[List[str]] = None) -> threading.Thread:
+    """
+    Importa os módulos pesados em uma thread de segundo plano (apenas uma vez).
+
+    Args:
+        modules: Módulos a importar (padrão: HEAVY_MODULES)
+
+    Returns:
+        Thread de aquecimento
+    """
+    global _warm_up_thread
+    if _warm_up_thread is None:
+
+        def warm_up():
+            for module in modules or HEAVY_MODULES:
+                start_time = time.perf_counter()
+                try:
+                    importlib.import_module(module)
+                except ImportError:
+                    continue
+                warm_up_timings[module] = (time.perf_counter() - start_time) * 1000
+
+        _warm_up_thread = threading.Thread(
+            target=warm_up, name="startup-warm-up", daemon=True
+        )
+        _warm_up_thread.start()
+    return _warm_up_thread
+
+
+def wait_for_warm_up(timeout: Optional[float] = None) -> bool:
+    """
+    Aguarda o fim do aquecimento.
+
+    Args:
+        timeout: Tempo máximo de espera em segundos
+
+    Returns:
+        True se o aquecimento terminou
+    """
+    if _warm_up_thread is None:
+        return False
+    _warm_up_thread.join(timeout)
+    return not _warm_up_thread.is_alive()
+
+
+def import_time_report(
+    modules: Union[str, List[str]] = "chatbot_agents", src_dir: Optional[str] = None
+) -> Tuple[float, List[Tuple[str, float]]]:
+    """
+    Mede o import de um ou mais módulos em um processo novo com `python -X importtime`.
+
+    Args:
+        modules: Módulo ou lista de módulos a importar (ex: APP_MODULES)
+        src_dir: Diretório adicionado ao sys.path (padrão: o diretório deste arquivo)
+
+    Returns:
+        Tupla (tempo total em ms, lista de (pacote de topo, ms) em ordem decrescente)
+    """
+    if isinstance(modules, str):
+        modules = [modules]
+    src_dir = src_dir or os.path.dirname(os.path.abspath(__file__))
+    completed = subprocess.run(
+        [
+            sys.executable,
+            "-X",
+            "importtime",
+            "-c",
+            f"import sys; sys.path.insert(0, {src_dir!r}); import {', '.join(modules)}",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    total_ms = 0.0
+    by_package: Dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_part, cumulative_us, name = line.split("|")
+        self_us = self_part.split(":")[1]
+        # Tempo "self" somado por pacote de topo (ex: agno.tools.duckdb -> agno)
+        package = name.strip().split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + int(self_us) / 1000
+        # Só imports de primeiro nível: um módulo importado por outro já está no
+        # tempo acumulado de quem o importou
+        if name.strip() in modules and name[1:2] != " ":
+            total_ms += int(cumulative_us) / 1000
+
+    return total_ms, sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+
+
+# Verificação do orçamento de inicialização: falha se o import exceder o limite
+if __name__ == "__main__":
+    budget_ms = (
+        float(sys.argv[1])
+        if len(sys.argv) > 1
+        else float(os.getenv("AGENT_STARTUP_BUDGET_MS", "300"))
+    )
+
+    total_ms, packages = import_time_report(APP_MODULES)
+    print("Tempo de import por pacote (self):")
+    for package, package_ms in packages[:15]:
+        print(f"  {package:<30} {package_ms:8.1f} ms")
+    print(f"import de app.py: {total_ms:.1f} ms | orçamento: {budget_ms:.0f} ms")
+
+    start_time = time.perf_counter()
+    start_warm_up()
+    wait_for_warm_up()
+    print(
+        f"Aquecimento em segundo plano: {(time.perf_counter() - start_time) * 1000:.0f} ms"
+    )
+    for module, module_ms in sorted(
+        warm_up_timings.items(), key=lambda item: item[1], reverse=True
+    )[:5]:
+        print(f"  {module:<30} {module_ms:8.1f} ms")
+
+    if total_ms > budget_ms:
+        print("ERROR: orçamento de inicialização excedido")
+        sys.exit(1)
+    print("SUCCESS: import de app.py dentro do orçamento de inicialização")
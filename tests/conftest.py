@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Os módulos do agente são importados a partir de src/ (como em app.py)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
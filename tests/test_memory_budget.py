@@ -0,0 +1,87 @@
+"""Modo de memória limitada: GROUP BY pesado pela ferramenta DuckDB do agente."""
+
+import os
+
+import duckdb
+import pytest
+
+from memory_budget import MemoryBudget
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+N_ROWS = 2_000_000
+BUDGET_MB = 256
+
+
+@pytest.fixture
+def bounded_agent(tmp_path, monkeypatch):
+    """Agente criado no modo limitado sobre um dataset sintético."""
+    parquet_path = tmp_path / "dados_sinteticos.parquet"
+    duckdb.sql(f"""
+        COPY (
+            SELECT
+                range AS Cod_Cliente,
+                'UF' || (range % 27)::VARCHAR AS UF_Cliente,
+                'municipio ' || (range % 5000)::VARCHAR AS Municipio_Cliente,
+                (range % 819) AS Cod_Produto,
+                DATE '2024-01-01' + (range % 365)::INTEGER AS Data_Emissao,
+                (range % 1000)::DOUBLE AS Valor_Vendido
+            FROM range({N_ROWS})
+        ) TO '{parquet_path}' (FORMAT PARQUET)
+        """)
+    catalog_path = tmp_path / "catalog.yaml"
+    catalog_path.write_text(
+        "default: dados_comerciais\n"
+        "datasets:\n"
+        "  dados_comerciais:\n"
+        "    description: Vendas sintéticas\n"
+        f"    path: {parquet_path}\n"
+        f"    incremental_glob: {tmp_path / 'incremental' / '*.parquet'}\n",
+        encoding="utf-8",
+    )
+
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setenv("OPENAI_API_KEY", "sk-test")
+    monkeypatch.setenv("AGENT_DATASET_CATALOG", str(catalog_path))
+    monkeypatch.setenv("AGENT_MEMORY_MODE", "bounded")
+    monkeypatch.setenv("AGENT_RSS_BUDGET_MB", str(BUDGET_MB))
+    monkeypatch.setenv("AGENT_DUCKDB_THREADS", "2")
+    monkeypatch.setenv("AGENT_DUCKDB_TEMP_DIR", str(tmp_path / "spill"))
+
+    from chatbot_agents import create_agent
+
+    agent, df = create_agent(session_user_id="test-memory-budget")
+    try:
+        yield agent, df
+    finally:
+        agent.close()
+
+
+def test_bounded_agent_uses_duckdb_memory_limit(bounded_agent):
+    agent, df = bounded_agent
+    expected_mb = MemoryBudget.from_env().duckdb_memory_limit_mb
+
+    # Modo limitado não materializa o dataset no pandas
+    assert df is None
+    limit = agent.duckdb_tools.connection.execute(
+        "SELECT current_setting('memory_limit')"
+    ).fetchone()[0]
+    expected = duckdb.execute(
+        f"SELECT format_bytes({expected_mb} * 1000 * 1000)"
+    ).fetchone()[0]
+    assert limit == expected
+
+
+def test_heavy_group_by_completes_under_memory_limit(bounded_agent):
+    agent, _ = bounded_agent
+    result = agent.duckdb_tools.run_query(
+        "SELECT Cod_Cliente, SUM(Valor_Vendido) AS total FROM dados_comerciais "
+        "GROUP BY Cod_Cliente ORDER BY total DESC, Cod_Cliente"
+    )
+
+    assert "Error" not in result and "Erro" not in result
+    # Resultado de N_ROWS grupos truncado em AGENT_MAX_RESULT_ROWS linhas
+    max_rows = MemoryBudget.from_env().max_result_rows
+    lines = result.splitlines()
+    assert lines[0] == "Cod_Cliente,total"
+    assert lines[1] == "999,999.0"
+    assert f"resultado truncado em {max_rows} linhas" in result
@@ -0,0 +1,44 @@
+"""Roteamento por complexidade: perguntas de valor único na rota leve, rankings no agente completo."""
+
+import pytest
+
+from question_router import FULL, LIGHT, QuestionRouter
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Quais os 5 clientes que mais compraram?",
+        "Qual estado vendeu mais?",
+        "Qual vendedor tem o menor ticket médio?",
+        "Quais são os 10 produtos mais caros?",
+        "Qual o cliente com maior faturamento?",
+        "Quais produtos venderam menos?",
+    ],
+)
+def test_ranking_questions_go_to_full_route(question):
+    decision = QuestionRouter().classify(question)
+
+    assert decision.route == FULL
+    assert "ranking ou top-N" in decision.reasons
+
+
+@pytest.mark.parametrize(
+    "question",
+    [
+        "Qual é a soma total da coluna Valor_Vendido?",
+        "Qual é o valor máximo em Valor_Vendido?",
+        "Qual a menor Qtd_Vendida?",
+        "Quantos clientes compraram?",
+        "Quantas compras foram feitas no estado de São Paulo (UF_Cliente = 'SP')?",
+    ],
+)
+def test_single_value_questions_go_to_light_route(question):
+    assert QuestionRouter().classify(question).route == LIGHT
+
+
+def test_disabled_router_always_uses_full_route():
+    decision = QuestionRouter(enabled=False).classify("Qual a menor Qtd_Vendida?")
+
+    assert decision.route == FULL
+    assert decision.reasons == ["roteamento desativado"]
@@ -0,0 +1,78 @@
+"""Reescrita de LIMIT do SqlGuard: LIMIT explícito, estimativa do plano e comentários."""
+
+import duckdb
+import pytest
+
+from sql_guard import SqlGuard
+
+
+@pytest.fixture
+def connection():
+    connection = duckdb.connect()
+    connection.execute("CREATE TABLE t AS SELECT range AS i FROM range(100000)")
+    try:
+        yield connection
+    finally:
+        connection.close()
+
+
+@pytest.mark.parametrize(
+    "query, rows",
+    [
+        ("SELECT * FROM t ORDER BY i LIMIT 5", 5),
+        ("SELECT * FROM t ORDER BY i LIMIT 10 OFFSET 5", 10),
+    ],
+)
+def test_top_n_query_is_not_rewritten(connection, query, rows):
+    result = SqlGuard(max_result_rows=1000).validate(connection, query)
+
+    assert result.allowed
+    assert result.sql == query
+    assert result.notes == []
+    assert len(connection.execute(result.sql).fetchall()) == rows
+
+
+def test_limit_above_maximum_gets_single_note(connection):
+    result = SqlGuard(max_result_rows=1000).validate(
+        connection, "SELECT * FROM t ORDER BY i LIMIT 5000"
+    )
+
+    assert len(result.notes) == 1
+    assert result.notes[0].startswith("LIMIT 5,000 acima do máximo")
+    assert len(connection.execute(result.sql).fetchall()) == 1000
+
+
+def test_query_without_limit_is_capped_by_estimate(connection):
+    result = SqlGuard(max_result_rows=1000).validate(connection, "SELECT * FROM t")
+
+    assert len(result.notes) == 1
+    assert result.notes[0].startswith("Consulta sem LIMIT")
+    assert len(connection.execute(result.sql).fetchall()) == 1000
+
+
+def test_trailing_comment_survives_rewrite(connection):
+    result = SqlGuard(max_result_rows=1000).validate(
+        connection, "select i from t limit 2000 -- total"
+    )
+
+    assert result.allowed
+    assert len(connection.execute(result.sql).fetchall()) == 1000
+
+
+def test_export_timeout_returns_structured_error(connection, tmp_path):
+    from result_export import ResultExporter
+
+    exporter = ResultExporter(export_dir=str(tmp_path), batch_rows=1000)
+    query = (
+        "SELECT a.range AS x, b.range AS y FROM range(100000) a, range(20000) b "
+        "WHERE (a.range * b.range) % 7 = 3"
+    )
+
+    result = SqlGuard().execute(
+        connection,
+        lambda: exporter.export(connection, query, "csv"),
+        timeout_seconds=0.5,
+    )
+
+    assert '"code": "QUERY_TIMEOUT"' in result
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,40 @@
+"""Orçamento de inicialização: imports feitos por app.py em um processo novo."""
+
+import os
+
+from startup_profile import APP_MODULES, HEAVY_MODULES, import_time_report
+
+# Pacotes que só podem ser importados sob demanda (create_agent ou aquecimento)
+LAZY_PACKAGES = {"pandas", "numpy", "pyarrow", "duckdb", "openai", "agno"}
+
+
+def test_app_imports_within_startup_budget():
+    budget_ms = float(os.getenv("AGENT_STARTUP_BUDGET_MS", "300"))
+
+    total_ms, packages = import_time_report(APP_MODULES)
+
+    assert 0 < total_ms <= budget_ms, dict(packages[:10])
+
+
+def test_app_imports_skip_heavy_packages():
+    _, packages = import_time_report(APP_MODULES)
+
+    imported = {package for package, _ in packages}
+    assert not imported & LAZY_PACKAGES
+    assert {module.split(".")[0] for module in HEAVY_MODULES} >= LAZY_PACKAGES
+
+
+def test_app_modules_match_app_imports():
+    import ast
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(root, "app.py"), encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    src_modules = {name[:-3] for name in os.listdir(os.path.join(root, "src"))}
+    # Apenas os imports de módulo do app (os de dentro de funções são sob demanda)
+    imported = {
+        node.module
+        for node in tree.body
+        if isinstance(node, ast.ImportFrom) and node.module in src_modules
+    }
+    assert imported == set(APP_MODULES)